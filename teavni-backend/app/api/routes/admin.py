@@ -7,8 +7,18 @@ from app.models.invoice import Invoice, InvoiceStatus, RiskTier
 from app.services.user_service import get_current_user
 from app.services.invoice_service import invoice_service
 from app.services.validation_service import validation_service
+from app.services.settings_service import settings_service, merge_rules, DEFAULT_SYSTEM_SETTINGS
+from app.services.consent_scheduler import consent_sweep_scheduler
+from app.services.ledger_service import ledger_service
+from app.services.revalidation_service import revalidation_service
+from app.services.rule_engine import rule_engine, compile_rules
+from app.services.buyer_service import buyer_service
+from app.services.anomaly_engine import anomaly_engine
+from app.services.scoring_service import scoring_service, REVIEW_CHECK_CATEGORIES
+from app.services.event_bus import event_bus
 from app.core.database import get_collection
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime, timedelta
 
 
@@ -410,13 +420,14 @@ async def get_all_invoices(
        query["seller_id"] = ObjectId(seller_id)
   
    # Execute query
-   cursor = invoices_collection.find(query).skip(skip).limit(limit)
+   cursor = invoices_collection.find(query, {"reservations": 0}).skip(skip).limit(limit)
    invoices = []
   
    async for invoice in cursor:
        invoice["id"] = str(invoice["_id"])
        del invoice["_id"]
        invoice["seller_id"] = str(invoice["seller_id"])
+       invoice["buyer_id"] = str(invoice["buyer_id"]) if invoice.get("buyer_id") else None
        invoices.append(invoice)
   
    return invoices
@@ -431,7 +442,7 @@ async def get_invoice(
    Get a specific invoice by ID
    """
    invoices_collection = get_collection("invoices")
-   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
+   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)}, {"reservations": 0})
   
    if not invoice:
        raise HTTPException(
@@ -442,6 +453,7 @@ async def get_invoice(
    invoice["id"] = str(invoice["_id"])
    del invoice["_id"]
    invoice["seller_id"] = str(invoice["seller_id"])
+   invoice["buyer_id"] = str(invoice["buyer_id"]) if invoice.get("buyer_id") else None
   
    # Get seller details
    users_collection = get_collection("users")
@@ -474,29 +486,30 @@ async def update_invoice_status(
        )
   
    # Update invoice
-   result = await invoices_collection.update_one(
+   update_data = {
+       "status": status_value,
+       "admin_notes": data.get("notes"),
+       "updated_at": datetime.utcnow(),
+       "updated_by": current_user["id"]
+   }
+   updated_invoice = await invoices_collection.find_one_and_update(
        {"_id": ObjectId(invoice_id)},
-       {
-           "$set": {
-               "status": status_value,
-               "admin_notes": data.get("notes"),
-               "updated_at": datetime.utcnow(),
-               "updated_by": current_user["id"]
-           }
-       }
+       {"$set": update_data},
+       projection={"reservations": 0},
+       return_document=ReturnDocument.AFTER
    )
   
-   if result.matched_count == 0:
+   if updated_invoice is None:
        raise HTTPException(
            status_code=status.HTTP_404_NOT_FOUND,
            detail="Invoice not found"
        )
+   await event_bus.emit_change("invoices", updated_invoice, update_data)
   
-   # Get updated invoice
-   updated_invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
    updated_invoice["id"] = str(updated_invoice["_id"])
    del updated_invoice["_id"]
    updated_invoice["seller_id"] = str(updated_invoice["seller_id"])
+   updated_invoice["buyer_id"] = str(updated_invoice["buyer_id"]) if updated_invoice.get("buyer_id") else None
   
    return updated_invoice
 
@@ -521,6 +534,7 @@ async def get_pending_validations(
        invoice["id"] = str(invoice["_id"])
        del invoice["_id"]
        invoice["seller_id"] = str(invoice["seller_id"])
+       invoice["buyer_id"] = str(invoice["buyer_id"]) if invoice.get("buyer_id") else None
       
        # Get seller details
        users_collection = get_collection("users")
@@ -546,7 +560,7 @@ async def validate_invoice(
    """
    # Get the invoice
    invoices_collection = get_collection("invoices")
-   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
+   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)}, {"reservations": 0})
   
    if not invoice:
        raise HTTPException(
@@ -560,12 +574,31 @@ async def validate_invoice(
            detail="Invoice is not pending validation"
        )
   
-   # Process validation
-   validation_checks = validation_data.get("validation_checks", [])
-   validation_notes = validation_data.get("validation_notes", "")
+   # Process validation; the admin validation page sends its checks as
+   # validation_results (check_name/result/message)
+   validation_checks = validation_data.get("validation_checks")
+   if validation_checks is not None:
+       validation_results = [
+           {
+               "check_name": check["name"],
+               "result": check["status"],
+               "message": check["details"] or check["description"]
+           }
+           for check in validation_checks
+       ]
+   else:
+       validation_results = [
+           {
+               "check_name": result["check_name"],
+               "result": result["result"],
+               "message": result.get("message")
+           }
+           for result in validation_data.get("validation_results", [])
+       ]
+   validation_notes = validation_data.get("validation_notes", validation_data.get("notes", ""))
   
    # Check if any validation check failed
-   has_failures = any(check["status"] == "fail" for check in validation_checks)
+   has_failures = any(result["result"] == "fail" for result in validation_results)
   
    # Calculate trust score based on validation checks
    if has_failures:
@@ -573,60 +606,34 @@ async def validate_invoice(
        risk_tier = None
        new_status = InvoiceStatus.REJECTED
    else:
-       # Simple trust score calculation
-       pass_count = sum(1 for check in validation_checks if check["status"] == "pass")
-       warning_count = sum(1 for check in validation_checks if check["status"] == "warning")
-       total_checks = len(validation_checks)
-      
-       if total_checks > 0:
-           trust_score = int(((pass_count * 100) + (warning_count * 50)) / total_checks)
-       else:
-           trust_score = 0
-      
-       # Determine risk tier
-       if trust_score >= 90:
-           risk_tier = RiskTier.A
-       elif trust_score >= 80:
-           risk_tier = RiskTier.B
-       elif trust_score >= 70:
-           risk_tier = RiskTier.C
-       else:
-           risk_tier = RiskTier.D
-      
+       [(trust_score, risk_tier)] = await scoring_service.score_results(
+           [validation_results], REVIEW_CHECK_CATEGORIES
+       )
        new_status = InvoiceStatus.VALIDATED
   
-   # Create validation results
-   validation_results = [
-       {
-           "check_name": check["name"],
-           "result": check["status"],
-           "message": check["details"] or check["description"]
-       }
-       for check in validation_checks
-   ]
-  
    # Update invoice
-   await invoices_collection.update_one(
+   update_data = {
+       "status": new_status,
+       "trust_score": trust_score,
+       "risk_tier": risk_tier,
+       "validation_results": validation_results,
+       "validation_notes": validation_notes,
+       "validated_at": datetime.utcnow(),
+       "validated_by": current_user["id"],
+       "updated_at": datetime.utcnow()
+   }
+   updated_invoice = await invoices_collection.find_one_and_update(
        {"_id": ObjectId(invoice_id)},
-       {
-           "$set": {
-               "status": new_status,
-               "trust_score": trust_score,
-               "risk_tier": risk_tier,
-               "validation_results": validation_results,
-               "validation_notes": validation_notes,
-               "validated_at": datetime.utcnow(),
-               "validated_by": current_user["id"],
-               "updated_at": datetime.utcnow()
-           }
-       }
+       {"$set": update_data},
+       projection={"reservations": 0},
+       return_document=ReturnDocument.AFTER
    )
+   await event_bus.emit_change("invoices", updated_invoice, update_data)
   
-   # Get updated invoice
-   updated_invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
    updated_invoice["id"] = str(updated_invoice["_id"])
    del updated_invoice["_id"]
    updated_invoice["seller_id"] = str(updated_invoice["seller_id"])
+   updated_invoice["buyer_id"] = str(updated_invoice["buyer_id"]) if updated_invoice.get("buyer_id") else None
   
    return updated_invoice
 
@@ -642,7 +649,7 @@ async def reject_invoice(
    """
    # Get the invoice
    invoices_collection = get_collection("invoices")
-   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
+   invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)}, {"reservations": 0})
   
    if not invoice:
        raise HTTPException(
@@ -659,35 +666,159 @@ async def reject_invoice(
    reason = data.get("reason", "Rejected by admin")
   
    # Update invoice
-   await invoices_collection.update_one(
-       {"_id": ObjectId(invoice_id)},
-       {
-           "$set": {
-               "status": InvoiceStatus.REJECTED,
-               "validation_results": [
-                   {
-                       "check_name": "Admin Review",
-                       "result": "fail",
-                       "message": reason
-                   }
-               ],
-               "validation_notes": reason,
-               "validated_at": datetime.utcnow(),
-               "validated_by": current_user["id"],
-               "updated_at": datetime.utcnow()
+   update_data = {
+       "status": InvoiceStatus.REJECTED,
+       "validation_results": [
+           {
+               "check_name": "Admin Review",
+               "result": "fail",
+               "message": reason
            }
-       }
+       ],
+       "validation_notes": reason,
+       "validated_at": datetime.utcnow(),
+       "validated_by": current_user["id"],
+       "updated_at": datetime.utcnow()
+   }
+   updated_invoice = await invoices_collection.find_one_and_update(
+       {"_id": ObjectId(invoice_id)},
+       {"$set": update_data},
+       projection={"reservations": 0},
+       return_document=ReturnDocument.AFTER
    )
+   await event_bus.emit_change("invoices", updated_invoice, update_data)
   
-   # Get updated invoice
-   updated_invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
    updated_invoice["id"] = str(updated_invoice["_id"])
    del updated_invoice["_id"]
    updated_invoice["seller_id"] = str(updated_invoice["seller_id"])
+   updated_invoice["buyer_id"] = str(updated_invoice["buyer_id"]) if updated_invoice.get("buyer_id") else None
   
    return updated_invoice
 
 
+# Bulk revalidation endpoints
+@router.post("/revalidation", status_code=status.HTTP_202_ACCEPTED)
+async def start_revalidation(current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Start a background job re-validating every invoice
+   """
+   try:
+       return await revalidation_service.start_job(current_user["id"])
+   except ValueError as e:
+       raise HTTPException(
+           status_code=status.HTTP_409_CONFLICT,
+           detail=str(e)
+       )
+
+
+@router.get("/revalidation")
+async def list_revalidation_jobs(
+   skip: int = 0,
+   limit: int = 20,
+   current_user: Dict[str, Any] = Depends(get_admin_user)
+):
+   """
+   List revalidation jobs, newest first
+   """
+   return await revalidation_service.list_jobs(skip, limit)
+
+
+@router.get("/revalidation/{job_id}")
+async def get_revalidation_job(job_id: str, current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Get a revalidation job's progress, throughput and ETA
+   """
+   job = await revalidation_service.get_job(job_id)
+   if not job:
+       raise HTTPException(
+           status_code=status.HTTP_404_NOT_FOUND,
+           detail="Revalidation job not found"
+       )
+   return job
+
+
+@router.post("/revalidation/{job_id}/cancel")
+async def cancel_revalidation_job(job_id: str, current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Stop a running revalidation job at its next checkpoint
+   """
+   try:
+       return await revalidation_service.cancel_job(job_id)
+   except ValueError as e:
+       raise HTTPException(
+           status_code=status.HTTP_400_BAD_REQUEST,
+           detail=str(e)
+       )
+
+
+@router.post("/revalidation/{job_id}/resume")
+async def resume_revalidation_job(job_id: str, current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Resume a failed or interrupted revalidation job from its last checkpoint
+   """
+   try:
+       return await revalidation_service.resume_job(job_id)
+   except ValueError as e:
+       raise HTTPException(
+           status_code=status.HTTP_400_BAD_REQUEST,
+           detail=str(e)
+       )
+
+
+@router.get("/validation/rules")
+async def get_validation_rules(current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Get the compiled validation rules with this worker's per-rule
+   evaluation counts, hit rates and time
+   """
+   try:
+       plan = await rule_engine.get_plan()
+   except ValueError as e:
+       raise HTTPException(
+           status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+           detail=f"Validation rules do not compile: {str(e)}"
+       )
+   return {
+       "compiled_at": plan.compiled_at,
+       "rules": plan.get_stats()
+   }
+
+
+@router.get("/validation/anomaly-tables")
+async def get_anomaly_tables_status(current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Get the summary of the population anomaly fit in use and the node refitting it
+   """
+   return await anomaly_engine.get_status()
+
+
+# Buyer registry endpoints
+@router.get("/buyers/concentration")
+async def get_buyer_concentration(
+   limit: int = Query(20, ge=1, le=100),
+   current_user: Dict[str, Any] = Depends(get_admin_user)
+):
+   """
+   Get the buyers with the largest funded exposure, their share of the
+   book and its Herfindahl-Hirschman index
+   """
+   return await buyer_service.get_concentration(limit)
+
+
+@router.get("/buyers/{buyer_id}")
+async def get_buyer(buyer_id: str, current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Get a buyer with its invoice history aggregates and current exposure
+   """
+   buyer = await buyer_service.get_buyer(buyer_id)
+   if not buyer:
+       raise HTTPException(
+           status_code=status.HTTP_404_NOT_FOUND,
+           detail="Buyer not found"
+       )
+   return buyer
+
+
 # Investment management endpoints
 @router.get("/investments")
 async def get_all_investments(
@@ -1049,6 +1180,25 @@ async def send_consent_reminder(
    return {"success": True, "message": "Reminder sent successfully"}
 
 
+@router.get("/compliance/consent-sweep")
+async def get_consent_sweep_status(current_user: Dict[str, Any] = Depends(get_admin_user)):
+   """
+   Get the passive consent sweep leader and its latest metrics
+   """
+   return await consent_sweep_scheduler.get_metrics()
+
+
+@router.post("/compliance/ledger/verify")
+async def verify_all_ledgers(
+   full: bool = False,
+   current_user: Dict[str, Any] = Depends(get_admin_user)
+):
+   """
+   Verify the hash chains of all consent ledgers
+   """
+   return await ledger_service.verify_all(full=full)
+
+
 @router.get("/compliance/audit-logs")
 async def get_audit_logs(
    skip: int = 0,
@@ -1198,62 +1348,16 @@ async def get_system_settings(current_user: Dict[str, Any] = Depends(get_admin_u
    """
    Get all system settings
    """
-   settings_collection = get_collection("system_settings")
-   settings_doc = await settings_collection.find_one({"_id": "main"})
-  
-   if not settings_doc:
-       # Create default settings if they don't exist
-       settings_doc = {
-           "_id": "main",
-           "general": {
-               "platformName": "TEVANI",
-               "supportEmail": "support@tevani.com",
-               "supportPhone": "+91 9876543210",
-               "maintenanceMode": False
-           },
-           "security": {
-               "passwordMinLength": 8,
-               "passwordRequireSpecialChar": True,
-               "passwordRequireNumber": True,
-               "passwordRequireUppercase": True,
-               "twoFactorAuthRequired": True,
-               "sessionTimeout": 30,
-               "maxLoginAttempts": 5
-           },
-           "riskTier": {
-               "tierAThreshold": 90,
-               "tierBThreshold": 80,
-               "tierCThreshold": 70,
-               "tierDThreshold": 0,
-               "gstVerificationWeight": 30,
-               "buyerHistoryWeight": 25,
-               "sellerHistoryWeight": 25,
-               "documentQualityWeight": 20
-           },
-           "trrf": {
-               "defaultCoveragePercent": 20,
-               "maxCoveragePercent": 40,
-               "tierAMultiplier": 0.5,
-               "tierBMultiplier": 1.0,
-               "tierCMultiplier": 1.5,
-               "tierDMultiplier": 2.0
-           },
-           "notifications": {
-               "emailEnabled": True,
-               "whatsappEnabled": True,
-               "smsEnabled": False,
-               "reminderFrequency": 3,
-               "maxReminders": 3
-           },
-           "created_at": datetime.utcnow(),
-           "updated_at": datetime.utcnow()
-       }
-       await settings_collection.insert_one(settings_doc)
+   settings_doc = dict(await settings_service.get_settings(use_cache=False))
   
    # Remove _id field
    if "_id" in settings_doc:
        del settings_doc["_id"]
   
+   # Show the settings in effect, with the defaults the document does not override
+   for category in DEFAULT_SYSTEM_SETTINGS:
+       settings_doc[category] = settings_service.get_cached_category(category)
+  
    return settings_doc
 
 
@@ -1266,7 +1370,7 @@ async def update_system_settings(
    """
    Update system settings for a specific category
    """
-   valid_categories = ["general", "security", "riskTier", "trrf", "notifications"]
+   valid_categories = ["general", "security", "riskTier", "trrf", "notifications", "validationRules"]
   
    if category not in valid_categories:
        raise HTTPException(
@@ -1274,6 +1378,16 @@ async def update_system_settings(
            detail=f"Invalid settings category. Must be one of: {', '.join(valid_categories)}"
        )
   
+   if category == "validationRules":
+       # Reject rules that would not compile before they reach the workers
+       try:
+           compile_rules(merge_rules(DEFAULT_SYSTEM_SETTINGS["validationRules"]["rules"], settings.get("rules") or []))
+       except (ValueError, KeyError, TypeError, AttributeError) as e:
+           raise HTTPException(
+               status_code=status.HTTP_400_BAD_REQUEST,
+               detail=f"Invalid validation rules: {str(e)}"
+           )
+  
    settings_collection = get_collection("system_settings")
   
    # Update settings
@@ -1284,10 +1398,13 @@ async def update_system_settings(
                category: settings,
                "updated_at": datetime.utcnow(),
                "updated_by": current_user["id"]
-           }
+           },
+           # Workers reload their cached settings when the version moves
+           "$inc": {"version": 1}
        },
        upsert=True
    )
+   settings_service.invalidate()
   
    # Log the settings change
    audit_logs_collection = get_collection("audit_logs")
@@ -1,5 +1,5 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pymongo.errors import DuplicateKeyError
 from app.core.config import settings
@@ -11,6 +11,8 @@ from app.services.user_service import (
    authenticate_user,
    get_current_user,
 )
+from app.services.login_throttle_service import login_throttle_service
+from app.utils.request_utils import get_client_ip
 
 
 router = APIRouter()
@@ -46,18 +48,32 @@ async def register(user_in: UserCreate):
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
    """
    OAuth2 compatible token login, get an access token for future requests
    """
+   client_ip = get_client_ip(request)
+  
+   # Reserve the attempt (rejecting throttled emails/IPs) before any user lookup or bcrypt work
+   retry_after, attempt_id = await login_throttle_service.reserve(form_data.username, client_ip)
+   if retry_after:
+       raise HTTPException(
+           status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+           detail="Too many failed login attempts. Please try again later.",
+           headers={"Retry-After": str(retry_after)},
+       )
+  
    user = await authenticate_user(form_data.username, form_data.password)
    if not user:
+       # The reserved attempt stays counted as a failure
        raise HTTPException(
            status_code=status.HTTP_401_UNAUTHORIZED,
            detail="Incorrect email or password",
            headers={"WWW-Authenticate": "Bearer"},
        )
   
+   await login_throttle_service.reset(form_data.username, client_ip, attempt_id)
+  
    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
    access_token = create_access_token(
        subject=str(user["_id"]), expires_delta=access_token_expires
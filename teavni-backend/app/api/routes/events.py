@@ -0,0 +1,107 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.database import get_collection
+from app.core.security import EVENT_STREAM_SCOPE, create_stream_ticket
+from app.models.user import UserType
+from app.services.event_stream import event_stream_hub
+from app.services.user_service import get_current_user, get_user_from_token
+
+router = APIRouter()
+
+
+async def get_stream_user(request: Request, ticket: Optional[str] = Query(None)) -> Dict[str, Any]:
+    """
+    Authenticate a stream request from the Authorization header or, since
+    EventSource cannot set headers, a short-lived `ticket` query parameter
+    issued by POST /ticket
+    """
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return await get_user_from_token(authorization[len("Bearer "):])
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_user_from_token(ticket, EVENT_STREAM_SCOPE)
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _format_message(message: Dict[str, Any]) -> str:
+    data = json.dumps(message, default=_json_default)
+    return f"event: {message['type']}\ndata: {data}\n\n"
+
+
+@router.post("/ticket")
+async def create_ticket(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Issue a short-lived ticket for opening the event stream with EventSource
+    """
+    return {
+        "ticket": create_stream_ticket(current_user["id"]),
+        "expires_in": settings.EVENT_STREAM_TICKET_SECONDS
+    }
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    invoice_id: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_stream_user)
+):
+    """
+    Stream invoice and consent status updates as server-sent events
+
+    Sellers receive updates for their own invoices, investors for invoices
+    on the marketplace and admins for all invoices. Pass `invoice_id` to
+    follow a single invoice.
+    """
+    if invoice_id and current_user.get("type") != UserType.ADMIN:
+        try:
+            invoice = await get_collection("invoices").find_one({"_id": ObjectId(invoice_id)}, {"seller_id": 1})
+        except InvalidId:
+            invoice = None
+        if not invoice or (
+            current_user.get("type") != UserType.INVESTOR and str(invoice["seller_id"]) != current_user["id"]
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Invoice not found"
+            )
+
+    connection = event_stream_hub.connect(current_user, invoice_id)
+
+    async def events():
+        try:
+            yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+            while not connection.overflowed:
+                try:
+                    event = await asyncio.wait_for(
+                        connection.queue.get(), timeout=settings.EVENT_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format_message(event_stream_hub.to_message(event))
+        finally:
+            event_stream_hub.disconnect(connection)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
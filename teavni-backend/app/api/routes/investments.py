@@ -0,0 +1,63 @@
+from typing import List, Dict, Any, Optional
+import uuid
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from app.models.investment import InvestmentCreate
+from app.services.funding_service import funding_service
+from app.services.user_service import get_investor_user
+
+router = APIRouter()
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def create_investment(
+    investment: InvestmentCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    current_user: Dict[str, Any] = Depends(get_investor_user)
+):
+    """
+    Invest in an invoice
+
+    Retrying a request with the same Idempotency-Key header returns the
+    investment the first request made instead of investing again.
+    """
+    if not ObjectId.is_valid(investment.invoice_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invoice not found"
+        )
+
+    try:
+        return await funding_service.fund(
+            current_user["id"],
+            investment.invoice_id,
+            investment.amount,
+            idempotency_key or str(uuid.uuid4()),
+            allow_partial=investment.allow_partial
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@router.get("", response_model=List[Dict[str, Any]])
+async def list_investments(current_user: Dict[str, Any] = Depends(get_investor_user)):
+    """
+    List the current investor's investments
+    """
+    return await funding_service.list_investments(current_user["id"])
+
+@router.get("/{investment_id}")
+async def get_investment(investment_id: str, current_user: Dict[str, Any] = Depends(get_investor_user)):
+    """
+    Get one of the current investor's investments
+    """
+    investment = None
+    if ObjectId.is_valid(investment_id):
+        investment = await funding_service.get_investment(current_user["id"], investment_id)
+    if not investment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Investment not found"
+        )
+    return investment
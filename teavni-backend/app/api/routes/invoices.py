@@ -1,9 +1,12 @@
 from typing import List, Dict, Any, Optional
 import os
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
 from app.models.invoice import InvoiceCreate, Invoice, InvoiceUpdate, InvoiceStatus, RiskTier
 from app.services.invoice_service import invoice_service
-from app.services.user_service import get_current_user
+from app.services.marketplace_service import marketplace_service
+from app.services.dedup_service import DuplicateInvoiceError
+from app.services.user_service import get_current_user, get_investor_user
 from app.services.ocr_service import ocr_service
 
 router = APIRouter()
@@ -97,6 +100,11 @@ async def create_invoice(
             supporting_docs=supporting_docs
         )
         return invoice
+    except DuplicateInvoiceError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -139,6 +147,97 @@ async def list_invoices(
     
     return invoices
 
+@router.get("/marketplace")
+async def list_marketplace_invoices(
+    request: Request,
+    response: Response,
+    risk_tier: Optional[List[RiskTier]] = Query(None),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    min_tenor_days: Optional[int] = Query(None, ge=0),
+    max_tenor_days: Optional[int] = Query(None, ge=0),
+    min_return: Optional[float] = None,
+    max_return: Optional[float] = None,
+    sort: str = "return_desc",
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Dict[str, Any] = Depends(get_investor_user)
+):
+    """
+    List the validated invoices open for funding, filtered by risk tier,
+    amount, tenor (days to the due date) and return, with the investor's stars
+
+    Served from the in-memory marketplace snapshot once loaded. The ETag
+    changes with the page, so revalidating an unchanged page returns 304.
+    """
+    try:
+        result = await marketplace_service.list_invoices(
+            investor_id=current_user["id"],
+            risk_tiers=risk_tier,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            min_tenor_days=min_tenor_days,
+            max_tenor_days=max_tenor_days,
+            min_return=min_return,
+            max_return=max_return,
+            sort=sort,
+            skip=skip,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    etag = marketplace_service.etag(result)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return result
+
+@router.get("/starred")
+async def list_starred_invoices(current_user: Dict[str, Any] = Depends(get_investor_user)):
+    """
+    List the invoices the current investor has starred
+    """
+    return await marketplace_service.list_starred(current_user["id"])
+
+@router.post("/{invoice_id}/star")
+async def star_invoice(invoice_id: str, current_user: Dict[str, Any] = Depends(get_investor_user)):
+    """
+    Star an invoice for the current investor
+    """
+    if not ObjectId.is_valid(invoice_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invoice not found"
+        )
+
+    try:
+        await marketplace_service.star(current_user["id"], invoice_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    return {"id": invoice_id, "starred": True}
+
+@router.delete("/{invoice_id}/star")
+async def unstar_invoice(invoice_id: str, current_user: Dict[str, Any] = Depends(get_investor_user)):
+    """
+    Remove the current investor's star from an invoice
+    """
+    if not ObjectId.is_valid(invoice_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invoice not found"
+        )
+
+    await marketplace_service.unstar(current_user["id"], invoice_id)
+    return {"id": invoice_id, "starred": False}
+
 @router.get("/{invoice_id}", response_model=Invoice)
 async def get_invoice(
     invoice_id: str,
@@ -182,8 +281,11 @@ async def update_invoice(
             detail="Invoice not found"
         )
     
-    # Check if user has permission to update this invoice
-    if current_user["type"] == "business" and str(invoice["seller_id"]) != current_user["id"]:
+    # Check if user has permission to update this invoice; investors only
+    # change invoices by investing, through the funding service
+    if current_user["type"] == "investor" or (
+        current_user["type"] == "business" and str(invoice["seller_id"]) != current_user["id"]
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to update this invoice"
@@ -194,7 +296,8 @@ async def update_invoice(
         allowed_fields = ["description"]
         update_data = {k: v for k, v in invoice_update.dict(exclude_unset=True).items() if k in allowed_fields}
     else:
-        # Admin/investor users can update all fields
+        # Admin users can update all fields; funded and available amounts are not
+        # among them, so they only move with investments
         update_data = invoice_update.dict(exclude_unset=True)
     
     updated_invoice = await invoice_service.update_invoice(invoice_id, update_data)
@@ -10,6 +10,7 @@ from app.models.legalbot import (
     ConsentEvent
 )
 from app.services.legalbot_service import legalbot_service
+from app.services.ledger_service import ledger_service
 from app.services.user_service import get_current_user
 
 router = APIRouter()
@@ -49,6 +50,18 @@ async def get_consent(
     
     return consent_record
 
+@router.get("/consent/{consent_id}/logs")
+async def list_consent_logs(
+    consent_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get the full event history of a consent record, newest first
+    """
+    return await legalbot_service.list_consent_logs(consent_id, skip=skip, limit=limit)
+
 @router.get("/consent/invoice/{invoice_id}")
 async def get_consent_by_invoice(
     invoice_id: str,
@@ -174,3 +187,26 @@ async def check_passive_consent(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to check passive consent: {str(e)}"
         )
+
+@router.get("/ledger/{invoice_id}")
+async def get_ledger(
+    invoice_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get the consent ledger of an invoice in chain order
+    """
+    return await ledger_service.get_ledger(invoice_id, skip=skip, limit=limit)
+
+@router.get("/ledger/{invoice_id}/verify")
+async def verify_ledger(
+    invoice_id: str,
+    full: bool = False,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Verify the hash chain of an invoice's consent ledger
+    """
+    return await ledger_service.verify_ledger(invoice_id, full=full)
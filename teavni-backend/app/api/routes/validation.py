@@ -2,6 +2,8 @@ from typing import Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.models.invoice import Invoice
 from app.services.validation_service import validation_service
+from app.services.gstin_validator import gstin_validator, normalize_gstin
+from app.services.field_correction import field_corrector
 from app.services.user_service import get_current_user
 
 router = APIRouter()
@@ -30,3 +32,16 @@ async def validate_invoice(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Validation failed: {str(e)}"
         )
+
+@router.get("/gstin/{gstin}")
+async def check_gstin(
+    gstin: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Check a GSTIN locally: state code, PAN, check digit and, if invalid,
+    the valid GSTINs it may be a misreading of
+    """
+    decoded = gstin_validator.decode(normalize_gstin(gstin))
+    decoded["candidates"] = [] if decoded["valid"] else field_corrector.gstin_candidates(gstin)
+    return decoded
@@ -1,6 +1,7 @@
+import ipaddress
 import os
-from typing import List
-from pydantic import BaseModel, field_validator
+from typing import Dict, List, Union
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 
 
@@ -23,14 +24,139 @@ class Settings(BaseModel):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-jwt-please-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
-   
+
+    # Login throttling settings
+    # Failed attempts per email are capped by security.maxLoginAttempts in the admin settings
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = int(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "900"))
+    # Failed attempts allowed per client IP, as a multiple of maxLoginAttempts (shared NATs, offices)
+    LOGIN_THROTTLE_IP_MULTIPLIER: int = int(os.getenv("LOGIN_THROTTLE_IP_MULTIPLIER", "10"))
+    # "memory" keeps attempts per worker, "mongo" shares them across workers via login_attempts
+    LOGIN_THROTTLE_BACKEND: str = os.getenv("LOGIN_THROTTLE_BACKEND", "memory")
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    # Addresses or networks of reverse proxies whose X-Forwarded-For is trusted for the client IP
+    # Parsed when settings load, so a malformed entry fails startup instead of every login
+    TRUSTED_PROXIES: List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = Field(
+        default=[proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()],
+        validate_default=True
+    )
+
+    # System settings cache: kept until the settings version changes while the app runs
+    # (TTL only applies to scripts); the version is polled when no change stream is live
+    SETTINGS_CACHE_TTL_SECONDS: int = int(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "30"))
+    SETTINGS_VERSION_POLL_SECONDS: int = int(os.getenv("SETTINGS_VERSION_POLL_SECONDS", "5"))
+
+    # Bulk revalidation jobs: invoices per batch, concurrent batches, and how long
+    # a node's claim on a job lasts without a checkpoint before another node may resume it
+    REVALIDATION_BATCH_SIZE: int = int(os.getenv("REVALIDATION_BATCH_SIZE", "500"))
+    REVALIDATION_WORKERS: int = int(os.getenv("REVALIDATION_WORKERS", "4"))
+    REVALIDATION_LEASE_SECONDS: int = 120
+
+    # Event bus: domain events from MongoDB change streams (needs a replica set)
+    EVENT_BUS_ENABLED: bool = os.getenv("EVENT_BUS_ENABLED", "True").lower() == "true"
+    # Resume tokens are stored per consumer name in event_bus_offsets, by the one
+    # process holding the consumer's lease (renewed whenever it saves its token)
+    EVENT_BUS_CONSUMER: str = os.getenv("EVENT_BUS_CONSUMER", "api")
+    EVENT_BUS_LEASE_SECONDS: int = 30
+    EVENT_BUS_QUEUE_SIZE: int = 10000
+    EVENT_BUS_TOKEN_SAVE_SECONDS: int = 5
+    EVENT_BUS_RETRY_SECONDS: int = 5
+    # Server-sent event streams: events buffered per client before it is dropped (and reconnects)
+    EVENT_STREAM_QUEUE_SIZE: int = 100
+    EVENT_STREAM_HEARTBEAT_SECONDS: int = 15
+    EVENT_STREAM_RETRY_MS: int = 3000
+    EVENT_STREAM_SELLER_CACHE_SIZE: int = 10000
+    # Lifetime of the ticket a browser exchanges its session token for to open the stream
+    EVENT_STREAM_TICKET_SECONDS: int = 60
+
     # OCR settings
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
+    # Near-duplicate image search: page hashes within this many differing bits
+    # (of 64) count as the same image; the index is saved to IMAGE_INDEX_PATH
+    IMAGE_HASH_MAX_DISTANCE: int = int(os.getenv("IMAGE_HASH_MAX_DISTANCE", "6"))
+    IMAGE_INDEX_PATH: str = os.getenv("IMAGE_INDEX_PATH", "data/image_hash_index.npz")
+    IMAGE_INDEX_MERGE_SIZE: int = 10000
+    IMAGE_INDEX_OVERLAP_SECONDS: int = 60
+    # OCR field correction: at most this many confusable-character substitutions
+    # per field, searched within the time budget; corrections below the minimum
+    # confidence are recorded but not applied. Invoice numbers are checked
+    # against the shapes of the seller's last OCR_CORRECTION_PATTERN_SAMPLE ones.
+    OCR_CORRECTION_MAX_EDITS: int = 4
+    OCR_CORRECTION_TIME_BUDGET_MS: float = 20.0
+    OCR_CORRECTION_MIN_CONFIDENCE: float = float(os.getenv("OCR_CORRECTION_MIN_CONFIDENCE", "0.6"))
+    OCR_CORRECTION_PATTERN_SAMPLE: int = 200
+    OCR_CORRECTION_SELLER_CACHE_SIZE: int = 1000
+   
+    # Buyer registry: recent name/GSTIN resolutions kept in memory, and how similar
+    # (trigram Jaccard) a name must be to an existing buyer's to resolve to it; at most
+    # BUYER_NAME_SCAN_LIMIT buyers sharing a name's rarest trigrams are compared
+    BUYER_RESOLUTION_CACHE_SIZE: int = 10000
+    BUYER_NAME_MATCH_THRESHOLD: float = float(os.getenv("BUYER_NAME_MATCH_THRESHOLD", "0.6"))
+    BUYER_NAME_CANDIDATES: int = 10
+    BUYER_NAME_SCAN_LIMIT: int = 1000
+    # Seller features: new invoices are screened against the seller's last
+    # SELLER_FEATURES_WINDOW_MONTHS of invoices, once there are at least
+    # SELLER_FEATURES_MIN_HISTORY of them; each worker caches a seller's features for
+    # SELLER_FEATURES_CACHE_SECONDS, so invoices recorded elsewhere are seen within that time
+    SELLER_FEATURES_WINDOW_MONTHS: int = 6
+    SELLER_FEATURES_MIN_HISTORY: int = 10
+    SELLER_FEATURES_CACHE_SIZE: int = 10000
+    SELLER_FEATURES_CACHE_SECONDS: int = 60
+    # Marketplace: open invoices are served from an in-memory snapshot kept current by
+    # invoice events and reloaded in full every MARKETPLACE_SNAPSHOT_REFRESH_SECONDS;
+    # each investor's starred invoices are cached for MARKETPLACE_STARRED_CACHE_SECONDS
+    MARKETPLACE_SNAPSHOT_ENABLED: bool = os.getenv("MARKETPLACE_SNAPSHOT_ENABLED", "True").lower() == "true"
+    MARKETPLACE_SNAPSHOT_REFRESH_SECONDS: int = int(os.getenv("MARKETPLACE_SNAPSHOT_REFRESH_SECONDS", "60"))
+    MARKETPLACE_STARRED_CACHE_SECONDS: int = 30
+    MARKETPLACE_STARRED_CACHE_SIZE: int = 10000
+    # Funding: investments must be at least FUNDING_MIN_AMOUNT unless they take the
+    # rest of an invoice; a contended reservation is retried FUNDING_MAX_ATTEMPTS times,
+    # and an investment pending for FUNDING_PENDING_TIMEOUT_SECONDS is settled on startup
+    FUNDING_MIN_AMOUNT: float = float(os.getenv("FUNDING_MIN_AMOUNT", "1000"))
+    FUNDING_MAX_ATTEMPTS: int = 20
+    FUNDING_PENDING_TIMEOUT_SECONDS: int = 300
+    # Population anomaly tables: only the node holding the refit lease refits them,
+    # incrementally every interval and from every invoice every ANOMALY_FULL_REFIT_HOURS.
+    # Buyers and seller segments with fewer invoices fall back to a wider group.
+    ANOMALY_ENGINE_ENABLED: bool = os.getenv("ANOMALY_ENGINE_ENABLED", "True").lower() == "true"
+    ANOMALY_REFIT_INTERVAL_SECONDS: int = int(os.getenv("ANOMALY_REFIT_INTERVAL_SECONDS", "600"))
+    ANOMALY_FULL_REFIT_HOURS: int = 24
+    ANOMALY_LEADER_LEASE_SECONDS: int = 1800
+    ANOMALY_MIN_GROUP_SIZE: int = 30
+    ANOMALY_LOAD_BATCH_SIZE: int = 10000
    
     # LegalBot settings
     EMAIL_NOTIFICATION_ENABLED: bool = True
     WHATSAPP_NOTIFICATION_ENABLED: bool = False
     CONSENT_WINDOW_HOURS: int = 48
+    # Consent records keep only this many recent log/notification IDs, plus counters
+    CONSENT_RECENT_REFERENCES: int = 10
+    # Ledgers verified concurrently by the bulk ledger verifier, which reads their
+    # invoice IDs LEDGER_VERIFY_BATCH_SIZE ledger entries at a time
+    LEDGER_VERIFY_CONCURRENCY: int = 8
+    LEDGER_VERIFY_BATCH_SIZE: int = 1000
+    # Passive consent sweep: records per batch and how long a claimed batch is leased
+    CONSENT_SWEEP_BATCH_SIZE: int = int(os.getenv("CONSENT_SWEEP_BATCH_SIZE", "500"))
+    CONSENT_SWEEP_LEASE_SECONDS: int = 300
+    # Periodic sweep scheduler; only the node holding the scheduler lease sweeps
+    CONSENT_SWEEP_ENABLED: bool = os.getenv("CONSENT_SWEEP_ENABLED", "True").lower() == "true"
+    CONSENT_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("CONSENT_SWEEP_INTERVAL_SECONDS", "60"))
+    CONSENT_SWEEP_MAX_BATCHES_PER_RUN: int = 4
+    CONSENT_SWEEP_LEADER_LEASE_SECONDS: int = 180
+
+    # Notification dispatcher settings
+    NOTIFICATION_DISPATCHER_ENABLED: bool = os.getenv("NOTIFICATION_DISPATCHER_ENABLED", "True").lower() == "true"
+    NOTIFICATION_DISPATCH_CONCURRENCY: int = int(os.getenv("NOTIFICATION_DISPATCH_CONCURRENCY", "4"))
+    NOTIFICATION_POLL_SECONDS: int = 5
+    # How long a claimed notification stays hidden from other workers while being delivered
+    NOTIFICATION_LEASE_SECONDS: int = 120
+    NOTIFICATION_MAX_ATTEMPTS: int = 6
+    NOTIFICATION_RETRY_BASE_SECONDS: int = 30
+    NOTIFICATION_RETRY_MAX_SECONDS: int = 60 * 60
+    # Deliveries per second, per provider
+    NOTIFICATION_RATE_LIMITS: Dict[str, float] = {"email": 5.0, "whatsapp": 20.0, "sms": 20.0}
+    NOTIFICATION_DEFAULT_RATE_LIMIT: float = 5.0
+    # Due emails claimed together and sent over one mail connection
+    NOTIFICATION_EMAIL_BATCH_SIZE: int = 20
     
     # Email settings
     EMAIL_HOST: str = "smtp.gmail.com"
@@ -45,6 +171,12 @@ class Settings(BaseModel):
     EMAIL_USE_TLS: bool = True
     # Set to False to disable actual email sending during development/testing
     EMAIL_SENDING_ENABLED: bool = os.getenv("EMAIL_SENDING_ENABLED", "True").lower() == "true"
+    # "smtp" delivers through a pool of persistent SMTP connections, "local" keeps mail in memory
+    EMAIL_TRANSPORT: str = os.getenv("EMAIL_TRANSPORT", "smtp")
+    EMAIL_POOL_SIZE: int = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+    EMAIL_TIMEOUT_SECONDS: int = 30
+    # Pooled connections idle longer than this are checked with NOOP before reuse
+    EMAIL_POOL_IDLE_CHECK_SECONDS: int = 60
    
     @field_validator("MONGO_URL")
     def validate_mongo_url(cls, v):
@@ -52,6 +184,16 @@ class Settings(BaseModel):
             raise ValueError("MONGO_URL must be set")
         return v
    
+    @field_validator("TRUSTED_PROXIES", mode="before")
+    def parse_trusted_proxies(cls, v):
+        networks = []
+        for proxy in v:
+            try:
+                networks.append(ipaddress.ip_network(proxy, strict=False))
+            except ValueError:
+                raise ValueError(f"TRUSTED_PROXIES entry {proxy!r} is not an IP address or network")
+        return networks
+   
     @field_validator("SECRET_KEY")
     def validate_secret_key(cls, v):
         if v == "your-secret-key-for-jwt-please-change-in-production":
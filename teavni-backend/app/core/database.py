@@ -1,9 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
-from pymongo.errors import CollectionInvalid
+from pymongo.errors import CollectionInvalid, OperationFailure
 import logging
 from app.core.config import settings
-from app.core.schemas import collection_schemas
+from app.core.schemas import collection_schemas, superseded_indexes
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -45,8 +45,15 @@ async def setup_collections():
                 })
                 logger.info(f"Updated schema for collection: {collection_name}")
             
-            # Create indexes
+            # Drop superseded indexes, then create indexes
             collection = db.db[collection_name]
+            for index_name in superseded_indexes.get(collection_name, []):
+                try:
+                    await collection.drop_index(index_name)
+                    logger.info(f"Dropped superseded index {index_name} on {collection_name}")
+                except OperationFailure:
+                    # Already dropped
+                    pass
             for index in indexes:
                 await collection.create_indexes([index])
             
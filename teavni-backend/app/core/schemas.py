@@ -274,6 +274,14 @@ invoice_schema = {
                    "bsonType": "double",
                    "description": "Amount available for funding"
                },
+               "reservations": {
+                   "bsonType": ["array", "null"],
+                   "description": "Amounts reserved by investments still pending, removed once each is active"
+               },
+               "funded_at": {
+                   "bsonType": ["date", "null"],
+                   "description": "When the invoice was fully funded"
+               },
                "created_at": {
                    "bsonType": "date",
                    "description": "Timestamp when the invoice was created"
@@ -293,6 +301,30 @@ invoice_schema = {
                "hash": {
                    "bsonType": ["string", "null"],
                    "description": "SHA-256 hash of the invoice file for tamper detection"
+               },
+               "image_hash": {
+                   "bsonType": ["long", "null"],
+                   "description": "64-bit perceptual hash of the first page, for rescan detection"
+               },
+               "normalized_invoice_number": {
+                   "bsonType": ["string", "null"],
+                   "description": "Invoice number without case, separators or zero padding, for duplicate detection"
+               },
+               "possible_duplicates": {
+                   "bsonType": ["array", "null"],
+                   "description": "Earlier invoices this one resembles, with the reason for each match"
+               },
+               "buyer_id": {
+                   "bsonType": ["objectId", "null"],
+                   "description": "Canonical buyer the invoice was resolved to"
+               },
+               "near_duplicates": {
+                   "bsonType": ["array", "null"],
+                   "description": "Earlier invoices with a similar first page, with the Hamming distance of each"
+               },
+               "seller_profile": {
+                   "bsonType": ["object", "null"],
+                   "description": "How the invoice compared with the seller's history when it was created"
                }
            }
        }
@@ -308,6 +340,45 @@ invoice_indexes = [
    IndexModel([("buyer_name", TEXT)]),
    IndexModel([("due_date", ASCENDING)]),
    IndexModel([("created_at", DESCENDING)]),
+   # Per-buyer history and exposure
+   IndexModel([("buyer_id", ASCENDING), ("status", ASCENDING)]),
+   # Duplicate detection by normalized key (similar images use the in-memory image hash index)
+   IndexModel([
+       ("seller_id", ASCENDING),
+       ("normalized_invoice_number", ASCENDING),
+       ("amount", ASCENDING),
+       ("invoice_date", ASCENDING)
+   ]),
+   # Marketplace listing, one index per sort key over validated invoices only
+   # (see SORTS in app/services/marketplace_service.py)
+   IndexModel(
+       [("risk_tier", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)],
+       partialFilterExpression={"status": "validated"}
+   ),
+   IndexModel(
+       [("amount", ASCENDING), ("_id", ASCENDING)],
+       partialFilterExpression={"status": "validated"}
+   ),
+   IndexModel(
+       [("trust_score", ASCENDING), ("_id", ASCENDING)],
+       partialFilterExpression={"status": "validated"}
+   ),
+   # Reservations left behind by interrupted investments (see FundingService.recover_pending)
+   IndexModel([("reservations.at", ASCENDING)], sparse=True),
+   # One live invoice per file, so a rejected invoice's file can be corrected and
+   # resubmitted ($in in a partial index needs MongoDB 6.0); created last as it
+   # fails on existing duplicates
+   IndexModel(
+       [("hash", ASCENDING)],
+       name="hash_live",
+       unique=True,
+       partialFilterExpression={
+           "hash": {"$type": "string"},
+           "status": {"$in": [
+               "pending_validation", "pending_consent", "validated", "funded", "paid", "defaulted"
+           ]}
+       }
+   ),
 ]
 
 
@@ -392,18 +463,26 @@ consent_record_schema = {
                },
                "notifications": {
                    "bsonType": "array",
-                   "description": "References to Notification objects",
+                   "description": "References to the most recent Notification objects",
                    "items": {
                        "bsonType": "objectId"
                    }
                },
                "logs": {
                    "bsonType": "array",
-                   "description": "References to ConsentLog objects",
+                   "description": "References to the most recent ConsentLog objects",
                    "items": {
                        "bsonType": "objectId"
                    }
                },
+               "notification_count": {
+                   "bsonType": ["int", "long"],
+                   "description": "Total number of notifications sent for the consent"
+               },
+               "log_count": {
+                   "bsonType": ["int", "long"],
+                   "description": "Total number of logged consent events"
+               },
                "dispute_reason": {
                    "bsonType": ["string", "null"],
                    "description": "Reason for dispute"
@@ -415,6 +494,14 @@ consent_record_schema = {
                "ledger_entry": {
                    "bsonType": ["string", "null"],
                    "description": "Final ledger entry for record keeping"
+               },
+               "sweep_id": {
+                   "bsonType": ["string", "null"],
+                   "description": "Passive consent sweep that last claimed the record"
+               },
+               "sweep_lease_until": {
+                   "bsonType": ["date", "null"],
+                   "description": "Expiry of the passive consent sweep claim"
                }
            }
        }
@@ -428,6 +515,8 @@ consent_record_indexes = [
    IndexModel([("buyer_email", ASCENDING)]),
    IndexModel([("status", ASCENDING)]),
    IndexModel([("consent_window_end", ASCENDING)]),
+   # Passive consent sweep: expired PENDING records, oldest window first
+   IndexModel([("status", ASCENDING), ("consent_window_end", ASCENDING)]),
 ]
 
 
@@ -477,6 +566,26 @@ notification_schema = {
                "metadata": {
                    "bsonType": ["object", "null"],
                    "description": "Metadata of the notification"
+               },
+               "consent_id": {
+                   "bsonType": ["objectId", "null"],
+                   "description": "ID of the consent record the notification belongs to"
+               },
+               "attempts": {
+                   "bsonType": ["int", "long"],
+                   "description": "Number of delivery attempts"
+               },
+               "next_attempt_at": {
+                   "bsonType": ["date", "null"],
+                   "description": "Earliest time the dispatcher may (re)try delivery"
+               },
+               "last_error": {
+                   "bsonType": ["string", "null"],
+                   "description": "Error from the last failed delivery attempt"
+               },
+               "dead_lettered_at": {
+                   "bsonType": ["date", "null"],
+                   "description": "Timestamp when retries were exhausted"
                }
            }
        }
@@ -490,6 +599,9 @@ notification_indexes = [
    IndexModel([("type", ASCENDING)]),
    IndexModel([("recipient", ASCENDING)]),
    IndexModel([("status", ASCENDING)]),
+   # Dispatcher queue scan: due QUEUED notifications, oldest first
+   IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+   IndexModel([("consent_id", ASCENDING)]),
 ]
 
 
@@ -500,6 +612,10 @@ consent_log_schema = {
            "bsonType": "object",
            "required": ["invoice_id", "event", "timestamp"],
            "properties": {
+               "consent_id": {
+                   "bsonType": ["objectId", "null"],
+                   "description": "ID of the consent record"
+               },
                "invoice_id": {
                    "bsonType": "objectId",
                    "description": "ID of the invoice"
@@ -541,11 +657,442 @@ consent_log_schema = {
 # Consent log collection indexes
 consent_log_indexes = [
    IndexModel([("invoice_id", ASCENDING)]),
+   IndexModel([("consent_id", ASCENDING), ("timestamp", DESCENDING)]),
    IndexModel([("event", ASCENDING)]),
    IndexModel([("timestamp", DESCENDING)]),
 ]
 
 
+# Consent ledger collection schema
+consent_ledger_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["invoice_id", "height", "status", "entry", "timestamp", "prev_hash", "hash"],
+           "properties": {
+               "invoice_id": {
+                   "bsonType": "objectId",
+                   "description": "ID of the invoice the ledger belongs to"
+               },
+               "consent_id": {
+                   "bsonType": ["objectId", "null"],
+                   "description": "ID of the consent record"
+               },
+               "height": {
+                   "bsonType": ["int", "long"],
+                   "description": "Position of the entry in the invoice's chain, starting at 0"
+               },
+               "status": {
+                   "enum": ["pending", "acknowledged", "disputed", "expired"],
+                   "description": "Consent status recorded by the entry"
+               },
+               "entry": {
+                   "bsonType": "string",
+                   "description": "Ledger entry text"
+               },
+               "details": {
+                   "bsonType": ["object", "null"],
+                   "description": "Details of the status change"
+               },
+               "timestamp": {
+                   "bsonType": "date",
+                   "description": "Timestamp of the entry"
+               },
+               "prev_hash": {
+                   "bsonType": "string",
+                   "description": "SHA-256 of the previous entry (zeros for the first entry)"
+               },
+               "hash": {
+                   "bsonType": "string",
+                   "description": "SHA-256 of this entry"
+               }
+           }
+       }
+   }
+}
+
+
+# Consent ledger collection indexes
+consent_ledger_indexes = [
+   # One entry per height per invoice: concurrent appends cannot fork the chain
+   IndexModel([("invoice_id", ASCENDING), ("height", ASCENDING)], unique=True),
+]
+
+
+# Login attempt collection schema (used when LOGIN_THROTTLE_BACKEND is "mongo");
+# one document per throttle key (email:<address> or ip:<address>), keyed by _id
+login_attempt_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["attempts", "timestamp"],
+           "properties": {
+               "attempts": {
+                   "bsonType": "array",
+                   "description": "Attempts inside the throttle window, oldest first",
+                   "items": {
+                       "bsonType": "object",
+                       "required": ["id", "at"],
+                       "properties": {
+                           "id": {
+                               "bsonType": "string",
+                               "description": "Attempt ID, shared by the email and IP keys"
+                           },
+                           "at": {
+                               "bsonType": "date",
+                               "description": "Timestamp of the attempt"
+                           }
+                       }
+                   }
+               },
+               "timestamp": {
+                   "bsonType": "date",
+                   "description": "Timestamp of the latest login attempt"
+               }
+           }
+       }
+   }
+}
+
+
+# Login attempt collection indexes
+login_attempt_indexes = [
+   # Expire keys once their attempts can no longer fall inside any throttle window
+   IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=24 * 60 * 60),
+]
+
+
+# Revalidation job collection schema
+revalidation_job_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["status", "created_at", "total", "processed"],
+           "properties": {
+               "status": {
+                   "enum": ["running", "completed", "failed", "cancelled"],
+                   "description": "Status of the job"
+               },
+               "created_by": {
+                   "bsonType": "string",
+                   "description": "ID of the admin who started the job"
+               },
+               "total": {
+                   "bsonType": ["int", "long"],
+                   "description": "Estimated number of invoices when the job started"
+               },
+               "processed": {
+                   "bsonType": ["int", "long"],
+                   "description": "Invoices validated so far"
+               },
+               "checkpoint": {
+                   "bsonType": ["objectId", "null"],
+                   "description": "Every invoice up to this _id has been validated"
+               },
+               "owner": {
+                   "bsonType": "string",
+                   "description": "Node running the job"
+               },
+               "lease_until": {
+                   "bsonType": "date",
+                   "description": "The job can be resumed by another node after this time"
+               },
+               "created_at": {
+                   "bsonType": "date",
+                   "description": "Creation timestamp"
+               }
+           }
+       }
+   }
+}
+
+
+# Revalidation job collection indexes
+revalidation_job_indexes = [
+   # At most one running job
+   IndexModel([("status", ASCENDING)], unique=True, partialFilterExpression={"status": "running"}),
+   IndexModel([("created_at", DESCENDING)]),
+]
+
+
+# Buyer collection schema
+buyer_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["normalized_name", "trigrams", "invoice_count", "created_at"],
+           "properties": {
+               "gstin": {
+                   "bsonType": ["string", "null"],
+                   "description": "GSTIN of the buyer; buyers without one are matched by name"
+               },
+               "name": {
+                   "bsonType": ["string", "null"],
+                   "description": "Name of the buyer as first seen"
+               },
+               "normalized_name": {
+                   "bsonType": "string",
+                   "description": "Lowercase name without punctuation or legal-form words"
+               },
+               "trigrams": {
+                   "bsonType": "array",
+                   "description": "Character trigrams of the normalized name, for fuzzy matching",
+                   "items": {
+                       "bsonType": "string"
+                   }
+               },
+               "aliases": {
+                   "bsonType": ["array", "null"],
+                   "description": "Names the buyer appeared under on invoices"
+               },
+               "invoice_count": {
+                   "bsonType": ["int", "long"],
+                   "description": "Invoices raised on the buyer"
+               },
+               "total_invoiced": {
+                   "bsonType": "double",
+                   "description": "Total amount invoiced to the buyer"
+               },
+               "last_invoice_at": {
+                   "bsonType": "date",
+                   "description": "Date of the buyer's latest invoice"
+               },
+               "created_at": {
+                   "bsonType": "date",
+                   "description": "Creation timestamp"
+               }
+           }
+       }
+   }
+}
+
+
+# Buyer collection indexes
+buyer_indexes = [
+   IndexModel([("gstin", ASCENDING)], unique=True, partialFilterExpression={"gstin": {"$type": "string"}}),
+   IndexModel([("normalized_name", ASCENDING)]),
+   # Buyers without a GSTIN are keyed by name; run scripts.backfill_buyers first
+   # to merge any registered twice before this index existed
+   IndexModel(
+       [("normalized_name", ASCENDING)], name="normalized_name_without_gstin",
+       unique=True, partialFilterExpression={"gstin": {"$type": "null"}}
+   ),
+   IndexModel([("trigrams", ASCENDING)]),
+]
+
+
+# Seller feature collection schema
+seller_feature_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["seller_id", "invoice_count"],
+           "properties": {
+               "seller_id": {
+                   "bsonType": "objectId",
+                   "description": "Seller the features describe"
+               },
+               "months": {
+                   "bsonType": "object",
+                   "description": "Per-month sums (count, log amount, payment terms) keyed by YYYYMM"
+               },
+               "sequences": {
+                   "bsonType": "object",
+                   "description": "Highest invoice sequence number seen, by invoice number prefix"
+               },
+               "invoice_count": {
+                   "bsonType": ["int", "long"],
+                   "description": "Invoices recorded for the seller"
+               },
+               "first_invoice_at": {
+                   "bsonType": "date",
+                   "description": "Creation time of the seller's first recorded invoice"
+               },
+               "last_invoice_at": {
+                   "bsonType": "date",
+                   "description": "Creation time of the seller's latest recorded invoice"
+               }
+           }
+       }
+   }
+}
+
+
+# Seller feature collection indexes
+seller_feature_indexes = [
+   IndexModel([("seller_id", ASCENDING)], unique=True),
+]
+
+
+# Starred invoice collection schema
+starred_invoice_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["investor_id", "invoice_id", "created_at"],
+           "properties": {
+               "investor_id": {
+                   "bsonType": "objectId",
+                   "description": "Investor who starred the invoice"
+               },
+               "invoice_id": {
+                   "bsonType": "objectId",
+                   "description": "Starred invoice"
+               },
+               "created_at": {
+                   "bsonType": "date",
+                   "description": "When the invoice was starred"
+               }
+           }
+       }
+   }
+}
+
+
+# Starred invoice collection indexes
+starred_invoice_indexes = [
+   IndexModel([("investor_id", ASCENDING), ("_id", DESCENDING)]),
+   IndexModel([("invoice_id", ASCENDING)]),
+   IndexModel([("investor_id", ASCENDING), ("invoice_id", ASCENDING)], unique=True),
+]
+
+
+# Investment collection schema
+investment_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "required": ["investor_id", "invoice_id", "requested_amount", "status", "idempotency_key", "created_at"],
+           "properties": {
+               "investor_id": {
+                   "bsonType": "objectId",
+                   "description": "Investor who made the investment"
+               },
+               "invoice_id": {
+                   "bsonType": "objectId",
+                   "description": "Invoice invested in"
+               },
+               "requested_amount": {
+                   "bsonType": "double",
+                   "description": "Amount the investor asked to invest"
+               },
+               "allow_partial": {
+                   "bsonType": "bool",
+                   "description": "Whether less than the requested amount was acceptable"
+               },
+               "amount": {
+                   "bsonType": "double",
+                   "description": "Amount reserved on the invoice"
+               },
+               "status": {
+                   "enum": ["pending", "active", "completed", "defaulted", "failed"],
+                   "description": "Status of the investment"
+               },
+               "idempotency_key": {
+                   "bsonType": "string",
+                   "description": "Client key identifying the request, unique per investor"
+               },
+               "failure_reason": {
+                   "bsonType": ["string", "null"],
+                   "description": "Why nothing could be reserved"
+               },
+               "roi": {
+                   "bsonType": ["double", "null"],
+                   "description": "Annual return rate for the invoice's risk tier, in percent"
+               },
+               "risk_tier": {
+                   "bsonType": ["string", "null"],
+                   "description": "Risk tier of the invoice when invested in"
+               },
+               "expected_return": {
+                   "bsonType": ["double", "null"],
+                   "description": "Return expected by the due date"
+               },
+               "investment_date": {
+                   "bsonType": ["date", "null"],
+                   "description": "When the amount was reserved"
+               },
+               "maturity_date": {
+                   "bsonType": ["date", "null"],
+                   "description": "Due date of the invoice"
+               },
+               "created_at": {
+                   "bsonType": "date",
+                   "description": "When the investment was requested"
+               },
+               "updated_at": {
+                   "bsonType": "date",
+                   "description": "When the investment was last updated"
+               }
+           }
+       }
+   }
+}
+
+
+# Investment collection indexes
+investment_indexes = [
+   IndexModel([("investor_id", ASCENDING), ("created_at", DESCENDING)]),
+   IndexModel([("invoice_id", ASCENDING)]),
+   IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+   IndexModel([("investor_id", ASCENDING), ("idempotency_key", ASCENDING)], unique=True),
+]
+
+
+# Anomaly table collection schema: one document per metric and group of
+# each fit, plus the "current" document naming the fit in use
+anomaly_table_schema = {
+   "validator": {
+       "$jsonSchema": {
+           "bsonType": "object",
+           "properties": {
+               "fit_id": {
+                   "bsonType": "string",
+                   "description": "Fit the table belongs to"
+               },
+               "metric": {
+                   "enum": ["amount", "terms", "unit_price"],
+                   "description": "Metric the table describes"
+               },
+               "group": {
+                   "bsonType": "string",
+                   "description": "\"all\", \"segment:<business type>\" or \"buyer:<buyer ID>\""
+               },
+               "n": {
+                   "bsonType": ["int", "long"],
+                   "description": "Values the table was fitted on"
+               },
+               "median": {
+                   "bsonType": "double",
+                   "description": "Median (of log1p for amounts and prices)"
+               },
+               "mad": {
+                   "bsonType": "double",
+                   "description": "Median absolute deviation from the median"
+               },
+               "quantiles": {
+                   "bsonType": "array",
+                   "description": "1st, 5th, 25th, 50th, 75th, 95th and 99th percentiles"
+               }
+           }
+       }
+   }
+}
+
+
+# Anomaly table collection indexes
+anomaly_table_indexes = [
+   IndexModel([("fit_id", ASCENDING)]),
+]
+
+
+# Indexes replaced by differently defined ones, dropped when collections are set up
+superseded_indexes = {
+   "invoices": ["hash_1"],
+   "login_attempts": ["key_1_timestamp_-1"],
+}
+
+
 # Collection schemas and indexes
 collection_schemas = {
    "users": (user_schema, user_indexes),
@@ -554,4 +1101,12 @@ collection_schemas = {
    "consent_records": (consent_record_schema, consent_record_indexes),
    "notifications": (notification_schema, notification_indexes),
    "consent_logs": (consent_log_schema, consent_log_indexes),
+   "login_attempts": (login_attempt_schema, login_attempt_indexes),
+   "consent_ledger": (consent_ledger_schema, consent_ledger_indexes),
+   "revalidation_jobs": (revalidation_job_schema, revalidation_job_indexes),
+   "buyers": (buyer_schema, buyer_indexes),
+   "seller_features": (seller_feature_schema, seller_feature_indexes),
+   "anomaly_tables": (anomaly_table_schema, anomaly_table_indexes),
+   "starred_invoices": (starred_invoice_schema, starred_invoice_indexes),
+   "investments": (investment_schema, investment_indexes),
 }
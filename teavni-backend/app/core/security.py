@@ -23,6 +23,22 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     return encoded_jwt
 
 
+# Scope of the short-lived tokens that only open the event stream
+EVENT_STREAM_SCOPE = "event_stream"
+
+
+def create_stream_ticket(subject: str) -> str:
+    """
+    Create a short-lived token that can only open the event stream
+
+    EventSource cannot set headers, so the stream is authenticated from the
+    query string; a ticket keeps the session token out of URLs and logs.
+    """
+    expire = datetime.utcnow() + timedelta(seconds=settings.EVENT_STREAM_TICKET_SECONDS)
+    to_encode = {"exp": expire, "sub": str(subject), "scope": EVENT_STREAM_SCOPE}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
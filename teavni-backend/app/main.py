@@ -28,24 +28,76 @@ app.add_middleware(
 async def startup_db_client():
    from app.core.database import connect_to_mongo
    await connect_to_mongo()
+  
+   from app.services.event_bus import event_bus
+   from app.services.event_handlers import register_event_handlers
+   register_event_handlers()
+   if settings.EVENT_BUS_ENABLED:
+       event_bus.start()
+  
+   # Load the system settings once and keep them cached until they change
+   from app.services.settings_service import settings_service
+   await settings_service.start()
+  
+   if settings.NOTIFICATION_DISPATCHER_ENABLED:
+       from app.services.notification_dispatcher import notification_dispatcher
+       notification_dispatcher.start()
+  
+   if settings.CONSENT_SWEEP_ENABLED:
+       from app.services.consent_scheduler import consent_sweep_scheduler
+       consent_sweep_scheduler.start()
+  
+   if settings.MARKETPLACE_SNAPSHOT_ENABLED:
+       from app.services.marketplace_service import marketplace_snapshot
+       marketplace_snapshot.start()
+  
+   if settings.ANOMALY_ENGINE_ENABLED:
+       from app.services.anomaly_engine import anomaly_engine
+       anomaly_engine.start()
+  
+   # Pick up a revalidation job left behind by a crashed node
+   from app.services.revalidation_service import revalidation_service
+   await revalidation_service.resume_interrupted()
+  
+   # Settle investments a crashed node left pending
+   from app.services.funding_service import funding_service
+   await funding_service.recover_pending()
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
    from app.core.database import close_mongo_connection
+   from app.utils.email_utils import close_mail_transport
+   from app.services.notification_dispatcher import notification_dispatcher
+   from app.services.consent_scheduler import consent_sweep_scheduler
+   from app.services.anomaly_engine import anomaly_engine
+   from app.services.marketplace_service import marketplace_snapshot
+   from app.services.event_bus import event_bus
+   from app.services.revalidation_service import revalidation_service
+   from app.services.settings_service import settings_service
+   await revalidation_service.stop()
+   await anomaly_engine.stop()
+   await marketplace_snapshot.stop()
+   await consent_sweep_scheduler.stop()
+   await notification_dispatcher.stop()
+   await settings_service.stop()
+   await event_bus.stop()
+   await close_mail_transport()
    await close_mongo_connection()
 
 
 # Import and include routers
-from app.api.routes import auth, users, invoices, validation, legalbot, admin
+from app.api.routes import auth, users, invoices, validation, legalbot, admin, events, investments
 
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(invoices.router, prefix="/api/invoices", tags=["Invoices"])
+app.include_router(investments.router, prefix="/api/investments", tags=["Investments"])
 app.include_router(validation.router, prefix="/api/validation", tags=["Validation"])
 app.include_router(legalbot.router, prefix="/api/legalbot", tags=["LegalBot"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
 
 
 @app.get("/")
@@ -0,0 +1,23 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field
+
+class DomainEventType(str, Enum):
+    INVOICE_CREATED = "invoice_created"
+    INVOICE_STATUS_CHANGED = "invoice_status_changed"
+    INVOICE_UPDATED = "invoice_updated"
+    CONSENT_STATUS_CHANGED = "consent_status_changed"
+    NOTIFICATION_STATUS_CHANGED = "notification_status_changed"
+    SETTINGS_CHANGED = "settings_changed"
+
+class DomainEvent(BaseModel):
+    type: DomainEventType
+    entity_id: str
+    invoice_id: Optional[str] = None
+    seller_id: Optional[str] = None
+    status: Optional[str] = None
+    changed_fields: List[str] = []
+    # Current state of the changed document (large fields such as OCR data are left out)
+    document: Dict[str, Any] = {}
+    occurred_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,15 @@
+from enum import Enum
+from pydantic import BaseModel, Field
+
+class InvestmentStatus(str, Enum):
+    PENDING = "pending"  # Recorded, amount not yet reserved on the invoice
+    ACTIVE = "active"
+    COMPLETED = "completed"
+    DEFAULTED = "defaulted"
+    FAILED = "failed"  # Nothing could be reserved
+
+class InvestmentCreate(BaseModel):
+    invoice_id: str
+    amount: float = Field(..., gt=0)
+    # Accept less than `amount` if that is all that is left
+    allow_partial: bool = False
@@ -100,8 +100,6 @@ class InvoiceUpdate(BaseModel):
     trust_score: Optional[int] = None
     risk_tier: Optional[RiskTier] = None
     validation_results: Optional[List[ValidationCheck]] = None
-    funded_amount: Optional[float] = None
-    available_amount: Optional[float] = None
 
 class SupportingDocument(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
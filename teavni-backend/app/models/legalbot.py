@@ -35,6 +35,7 @@ class ConsentEvent(str, Enum):
 
 class ConsentLog(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    consent_id: Optional[PyObjectId] = None
     invoice_id: PyObjectId
     event: ConsentEvent
     timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -50,6 +51,7 @@ class ConsentLog(BaseModel):
 class Notification(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     invoice_id: PyObjectId
+    consent_id: Optional[PyObjectId] = None
     type: NotificationType
     recipient: str  # Email address, phone number, etc.
     status: NotificationStatus = NotificationStatus.QUEUED
@@ -75,8 +77,10 @@ class ConsentRecord(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     consent_window_start: datetime
     consent_window_end: datetime
-    notifications: List[PyObjectId] = []  # References to Notification objects
-    logs: List[PyObjectId] = []  # References to ConsentLog objects
+    notifications: List[PyObjectId] = []  # Most recent Notification references
+    logs: List[PyObjectId] = []  # Most recent ConsentLog references
+    notification_count: int = 0
+    log_count: int = 0
     dispute_reason: Optional[str] = None
     dispute_details: Optional[Dict[str, Any]] = None
     ledger_entry: Optional[str] = None  # Final ledger entry for record keeping
@@ -0,0 +1,461 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.invoice import InvoiceStatus
+from app.models.user import UserType
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "anomaly_refit"
+# `anomaly_tables` document naming the current fit
+CURRENT_FIT_ID = "current"
+
+METRICS = ["amount", "terms", "unit_price"]
+# Metrics fitted on a log scale, as amounts and prices are heavy-tailed
+LOG_METRICS = {"amount", "unit_price"}
+# Floors on the MAD, so a group of near-identical values does not flag every other value
+MAD_FLOORS = {"amount": 0.05, "terms": 1.0, "unit_price": 0.05}
+QUANTILES = np.array([0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+# The MAD of a normal distribution is 0.6745 standard deviations
+MAD_SCALE = 0.6745
+
+FIT_PROJECTION = {
+    "amount": 1, "invoice_date": 1, "due_date": 1, "seller_id": 1, "buyer_id": 1, "line_items.unit_price": 1,
+}
+
+
+def _terms_days(invoice: Dict[str, Any]) -> float:
+    invoice_date, due_date = invoice.get("invoice_date"), invoice.get("due_date")
+    if not isinstance(invoice_date, datetime) or not isinstance(due_date, datetime):
+        return np.nan
+    return (due_date - invoice_date).total_seconds() / 86400
+
+
+def _group_quantiles(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    # Linear-interpolated quantile q of each group of a (group, value)-sorted array
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, starts + counts - 1)
+    fraction = position - low
+    return sorted_values[low] * (1 - fraction) + sorted_values[high] * fraction
+
+
+def _by_group(order: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    # Reorder positions sorted by value so they are grouped by code, keeping
+    # the value order within each group; much cheaper than a lexsort
+    return order[np.argsort(codes[order], kind="stable")]
+
+
+def group_statistics(
+    values: np.ndarray,
+    codes: np.ndarray,
+    min_size: int,
+    value_order: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Median, MAD and quantiles of the values of every group with at least
+    `min_size` values; values with a negative code belong to no group
+
+    Values are sorted once by group and value for the quantiles, and the
+    absolute deviations from each group's median once for the MADs,
+    whatever the number of groups. `value_order` (the argsort of
+    `values`) can be shared between groupings of the same values.
+
+    Returns:
+        The kept group codes, with the count, median, MAD and QUANTILES of each
+    """
+    counts = np.bincount(codes[codes >= 0], minlength=1)
+    groups = np.flatnonzero(counts >= min_size)
+    keep = (codes >= 0) & (counts[np.maximum(codes, 0)] >= min_size)
+    group_counts = counts[groups]
+    starts = np.concatenate(([0], np.cumsum(group_counts)[:-1])).astype(np.int64)
+
+    if value_order is None:
+        value_order = np.argsort(values)
+    order = _by_group(value_order[keep[value_order]], codes)
+    sorted_values, sorted_codes = values[order], codes[order]
+    quantiles = np.stack([_group_quantiles(sorted_values, starts, group_counts, q) for q in QUANTILES], axis=1)
+    medians = _group_quantiles(sorted_values, starts, group_counts, 0.5)
+
+    group_medians = np.zeros(len(counts))
+    group_medians[groups] = medians
+    deviations = np.abs(sorted_values - group_medians[sorted_codes])
+    sorted_deviations = deviations[_by_group(np.argsort(deviations), sorted_codes)]
+    mads = _group_quantiles(sorted_deviations, starts, group_counts, 0.5)
+
+    return {"groups": groups, "counts": group_counts, "medians": medians, "mads": mads, "quantiles": quantiles}
+
+
+class ScoringTables:
+    """
+    Robust statistics of one fit, per metric and group, for lookup at validation
+
+    Groups are "buyer:<id>", "segment:<business type>" and "all"; an
+    invoice is scored against the most specific group that has a table.
+    """
+
+    def __init__(self, fit_id: str, rows: List[Dict[str, Any]], segments: Dict[str, str]):
+        self.fit_id = fit_id
+        self.segments = segments
+        self._index: Dict[str, Dict[str, int]] = {metric: {} for metric in METRICS}
+        self._groups: Dict[str, List[str]] = {metric: [] for metric in METRICS}
+        columns: Dict[str, Dict[str, list]] = {
+            metric: {"n": [], "median": [], "mad": [], "quantiles": []} for metric in METRICS
+        }
+        for row in rows:
+            metric = row["metric"]
+            self._index[metric][row["group"]] = len(columns[metric]["n"])
+            self._groups[metric].append(row["group"])
+            for name in ("n", "median", "mad", "quantiles"):
+                columns[metric][name].append(row[name])
+        self._tables = {
+            metric: {
+                "n": np.array(column["n"], dtype=np.int64),
+                "median": np.array(column["median"], dtype=float),
+                "mad": np.maximum(np.array(column["mad"], dtype=float), MAD_FLOORS[metric]),
+                "quantiles": np.array(column["quantiles"], dtype=float).reshape(-1, len(QUANTILES)),
+            }
+            for metric, column in columns.items()
+        }
+
+    def score(
+        self,
+        metric: str,
+        values: np.ndarray,
+        sellers: List[Any],
+        buyers: List[Any]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Robust z-scores of values against their groups
+
+        Returns:
+            The z-scores, and the table row each value was scored against (-1 if none)
+        """
+        index = self._index[metric]
+        rows = np.full(len(values), -1, dtype=np.int64)
+        for position, (seller, buyer) in enumerate(zip(sellers, buyers)):
+            for group in (f"buyer:{buyer}" if buyer else None, f"segment:{self.segments.get(str(seller))}", "all"):
+                row = index.get(group)
+                if row is not None:
+                    rows[position] = row
+                    break
+
+        table = self._tables[metric]
+        if metric in LOG_METRICS:
+            values = np.log1p(np.maximum(values, 0))
+        found = rows >= 0
+        if not found.any():
+            return np.zeros(len(values)), rows
+        safe_rows = np.where(found, rows, 0)
+        zscores = MAD_SCALE * (values - table["median"][safe_rows]) / table["mad"][safe_rows]
+        return np.where(found, zscores, 0.0), rows
+
+    def describe(self, metric: str, row: int) -> Dict[str, Any]:
+        """
+        The group a value was scored against, with its median and 1st/99th percentiles
+        """
+        if row < 0:
+            return {}
+        table = self._tables[metric]
+        unscale = np.expm1 if metric in LOG_METRICS else (lambda value: value)
+        return {
+            "group": self._groups[metric][row],
+            "group_size": int(table["n"][row]),
+            "typical": round(float(unscale(table["median"][row])), 2),
+            "p01": round(float(unscale(table["quantiles"][row][0])), 2),
+            "p99": round(float(unscale(table["quantiles"][row][-1])), 2),
+        }
+
+
+class AnomalyEngine:
+    """
+    Population-level anomaly statistics of invoice amounts, payment terms
+    and line item unit prices
+
+    The holder of the `anomaly_refit` lease keeps the population in NumPy
+    arrays: each tick it reads only the invoices created since the last
+    one and refits, and every ANOMALY_FULL_REFIT_HOURS it rereads them all
+    (dropping rejected and edited invoices). A fit is the median, MAD and
+    quantiles per group, computed with a couple of sorts per grouping, and
+    is written to `anomaly_tables`. Every node loads the current fit into
+    memory; validation scores invoices against it with dictionary lookups
+    and vectorized arithmetic.
+    """
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.tables: Optional[ScoringTables] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reset_population()
+
+    def _reset_population(self) -> None:
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._seller_codes: Dict[str, int] = {}
+        self._buyer_codes: Dict[str, int] = {}
+        self._checkpoint: Optional[ObjectId] = None
+        self._full_fit_at: Optional[datetime] = None
+
+    def start(self) -> None:
+        """
+        Start the refit loop in the background
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+            logger.info(f"Anomaly engine started on {self.node_id}")
+
+    async def stop(self) -> None:
+        """
+        Stop the refit loop and give up leadership
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._release_lease()
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Anomaly refit failed: {str(e)}")
+            interval = settings.ANOMALY_REFIT_INTERVAL_SECONDS
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+    async def tick(self) -> None:
+        """
+        Refit if this node holds the lease, else pick up the leader's latest fit
+        """
+        self.is_leader = await self._acquire_lease()
+        if self.is_leader:
+            full_refit_due = self._full_fit_at is None or \
+                datetime.utcnow() - self._full_fit_at > timedelta(hours=settings.ANOMALY_FULL_REFIT_HOURS)
+            await self.refit(full=full_refit_due)
+        else:
+            self._reset_population()
+            await self.load_tables()
+
+    async def ensure_loaded(self) -> None:
+        """
+        Load the current fit on first use
+        """
+        if self.tables is None:
+            await self.load_tables()
+
+    async def load_tables(self) -> None:
+        """
+        Load the current fit from `anomaly_tables` if it changed
+        """
+        tables_collection = get_collection("anomaly_tables")
+        current = await tables_collection.find_one({"_id": CURRENT_FIT_ID})
+        if not current or (self.tables is not None and self.tables.fit_id == current["fit_id"]):
+            return
+        rows = await tables_collection.find(
+            {"_id": {"$ne": CURRENT_FIT_ID}, "fit_id": current["fit_id"]}
+        ).to_list(length=None)
+        self.tables = ScoringTables(current["fit_id"], rows, await self._load_segments())
+        logger.info(f"Loaded anomaly tables {current['fit_id']} ({len(rows)} groups)")
+
+    async def refit(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Read new invoices (all of them if `full`), refit and publish the tables
+
+        Returns:
+            Dict[str, Any]: Fit summary (invoices, line items, groups, timings)
+        """
+        started = time.monotonic()
+        if full:
+            self._reset_population()
+        loaded = await self._load_invoices()
+        if full:
+            self._full_fit_at = datetime.utcnow()
+        loaded_at = time.monotonic()
+
+        segments = await self._load_segments()
+        rows = await asyncio.to_thread(self._fit, segments)
+        fitted_at = time.monotonic()
+
+        fit_id = str(ObjectId())
+        summary = {
+            "fit_id": fit_id,
+            "fitted_at": datetime.utcnow(),
+            "full": full,
+            "invoices": sum(len(chunk["amount"]) for chunk in self._chunks),
+            "line_items": sum(len(chunk["unit_price"]) for chunk in self._chunks),
+            "new_invoices": loaded,
+            "groups": len(rows),
+            "load_ms": int((loaded_at - started) * 1000),
+            "fit_ms": int((fitted_at - loaded_at) * 1000),
+        }
+        await self._publish(fit_id, rows, summary)
+        self.tables = ScoringTables(fit_id, rows, segments)
+        logger.info(
+            f"Anomaly refit ({'full' if full else 'incremental'}) over {summary['invoices']} invoices: "
+            f"{loaded} read in {summary['load_ms']}ms, fitted in {summary['fit_ms']}ms"
+        )
+        return summary
+
+    async def get_status(self) -> Dict[str, Any]:
+        """
+        Get the summary of the current fit and the leader holding the lease
+        """
+        current = await get_collection("anomaly_tables").find_one({"_id": CURRENT_FIT_ID}, {"_id": 0})
+        lease = await get_collection("scheduler_leases").find_one({"_id": LEASE_ID}) or {}
+        return {"leader": lease.get("holder"), "lease_until": lease.get("lease_until"), "fit": current}
+
+    async def _load_invoices(self) -> int:
+        # Invoices after the checkpoint; ObjectIds from different workers are
+        # not strictly in commit order, and the few an incremental read misses
+        # are picked up by the next full refit
+        query: Dict[str, Any] = {"status": {"$ne": InvoiceStatus.REJECTED.value}}
+        if self._checkpoint is not None:
+            query["_id"] = {"$gt": self._checkpoint}
+        cursor = get_collection("invoices").find(query, FIT_PROJECTION).sort("_id", 1) \
+            .batch_size(settings.ANOMALY_LOAD_BATCH_SIZE)
+
+        amounts, terms, sellers, buyers = [], [], [], []
+        prices, price_invoices = [], []
+        async for invoice in cursor:
+            for item in invoice.get("line_items") or []:
+                prices.append(float(item.get("unit_price") or 0))
+                price_invoices.append(len(amounts))
+            amounts.append(float(invoice.get("amount") or 0))
+            terms.append(_terms_days(invoice))
+            sellers.append(self._code(self._seller_codes, invoice.get("seller_id")))
+            buyers.append(self._code(self._buyer_codes, invoice.get("buyer_id")))
+            self._checkpoint = invoice["_id"]
+
+        if amounts:
+            sellers_array = np.array(sellers, dtype=np.int64)
+            buyers_array = np.array(buyers, dtype=np.int64)
+            owners = np.array(price_invoices, dtype=np.int64)
+            self._chunks.append({
+                "amount": np.array(amounts, dtype=float),
+                "terms": np.array(terms, dtype=float),
+                "seller": sellers_array,
+                "buyer": buyers_array,
+                "unit_price": np.array(prices, dtype=float),
+                "unit_price_seller": sellers_array[owners],
+                "unit_price_buyer": buyers_array[owners],
+            })
+        return len(amounts)
+
+    @staticmethod
+    def _code(codes: Dict[str, int], value: Any) -> int:
+        if not value:
+            return -1
+        return codes.setdefault(str(value), len(codes))
+
+    @staticmethod
+    async def _load_segments() -> Dict[str, str]:
+        # Seller ID -> business type
+        cursor = get_collection("users").find(
+            {"type": UserType.BUSINESS.value, "business_profile.business_type": {"$exists": True}},
+            {"business_profile.business_type": 1}
+        )
+        return {str(user["_id"]): user["business_profile"]["business_type"] async for user in cursor}
+
+    def _fit(self, segments: Dict[str, str]) -> List[Dict[str, Any]]:
+        if not self._chunks:
+            return []
+        population = {name: np.concatenate([chunk[name] for chunk in self._chunks]) for name in self._chunks[0]}
+
+        segment_names = sorted(set(segments.values()))
+        seller_ids = sorted(self._seller_codes, key=self._seller_codes.get)
+        seller_segments = np.array(
+            [segment_names.index(segments[seller]) if seller in segments else -1 for seller in seller_ids] or [-1],
+            dtype=np.int64
+        )
+        buyer_ids = sorted(self._buyer_codes, key=self._buyer_codes.get)
+
+        rows = []
+        for metric in METRICS:
+            values = population[metric]
+            sellers = population["seller" if metric != "unit_price" else "unit_price_seller"]
+            buyers = population["buyer" if metric != "unit_price" else "unit_price_buyer"]
+            valid = np.isfinite(values) & ((values > 0) if metric in LOG_METRICS else True)
+            values, sellers, buyers = values[valid], sellers[valid], buyers[valid]
+            if metric in LOG_METRICS:
+                values = np.log1p(values)
+
+            segment_codes = np.where(sellers >= 0, seller_segments[np.maximum(sellers, 0)], -1)
+            groupings = [
+                (lambda code: "all", np.zeros(len(values), dtype=np.int64)),
+                (lambda code: f"segment:{segment_names[code]}", segment_codes),
+                (lambda code: f"buyer:{buyer_ids[code]}", buyers),
+            ]
+            value_order = np.argsort(values)
+            for label, codes in groupings:
+                statistics = group_statistics(values, codes, settings.ANOMALY_MIN_GROUP_SIZE, value_order)
+                for position, code in enumerate(statistics["groups"]):
+                    rows.append({
+                        "metric": metric,
+                        "group": label(code),
+                        "n": int(statistics["counts"][position]),
+                        "median": float(statistics["medians"][position]),
+                        "mad": float(statistics["mads"][position]),
+                        "quantiles": statistics["quantiles"][position].tolist(),
+                    })
+        return rows
+
+    @staticmethod
+    async def _publish(fit_id: str, rows: List[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+        # Write the new fit, switch the current pointer to it, then drop older fits
+        tables_collection = get_collection("anomaly_tables")
+        if rows:
+            await tables_collection.insert_many([{**row, "fit_id": fit_id} for row in rows], ordered=False)
+        await tables_collection.replace_one({"_id": CURRENT_FIT_ID}, summary, upsert=True)
+        await tables_collection.delete_many({"_id": {"$ne": CURRENT_FIT_ID}, "fit_id": {"$ne": fit_id}})
+
+    async def _acquire_lease(self) -> bool:
+        """
+        Acquire or renew the refit lease; False if another node holds it
+        """
+        now = datetime.utcnow()
+        try:
+            await get_collection("scheduler_leases").update_one(
+                {
+                    "_id": LEASE_ID,
+                    "$or": [
+                        {"holder": self.node_id},
+                        {"lease_until": {"$lt": now}}
+                    ]
+                },
+                {"$set": {
+                    "holder": self.node_id,
+                    "lease_until": now + timedelta(seconds=settings.ANOMALY_LEADER_LEASE_SECONDS)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by a live leader
+            return False
+        return True
+
+    async def _release_lease(self) -> None:
+        if not self.is_leader:
+            return
+        await get_collection("scheduler_leases").update_one(
+            {"_id": LEASE_ID, "holder": self.node_id},
+            {"$set": {"lease_until": datetime.utcnow()}}
+        )
+        self.is_leader = False
+
+anomaly_engine = AnomalyEngine()
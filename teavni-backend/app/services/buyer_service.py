@@ -0,0 +1,329 @@
+import math
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.invoice import InvoiceStatus
+from app.services.gstin_validator import gstin_validator, normalize_gstin
+
+# Legal-form words and punctuation that vary between spellings of the same buyer
+NAME_NOISE = re.compile(r"[^a-z0-9 ]")
+MESSRS_PREFIX = re.compile(r"^\s*m/?s\b\.?")
+LEGAL_FORMS = {
+    "pvt", "private", "ltd", "limited", "llp", "inc", "co", "company", "corp", "corporation", "the", "and",
+}
+
+# Invoice statuses that count toward a buyer's exposure
+EXPOSURE_STATUSES = [InvoiceStatus.VALIDATED.value, InvoiceStatus.FUNDED.value]
+
+
+def normalize_buyer_name(name: Optional[str]) -> str:
+    """
+    Normalize a buyer name for matching: lowercase, no punctuation or legal-form words
+    """
+    name = MESSRS_PREFIX.sub(" ", (name or "").lower())
+    words = NAME_NOISE.sub(" ", name.replace("&", " and ")).split()
+    return " ".join(word for word in words if word not in LEGAL_FORMS)
+
+
+def name_trigrams(normalized_name: str) -> List[str]:
+    """
+    Character trigrams of a normalized name, padded so word edges count
+    """
+    padded = f"  {normalized_name} "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def _similarity(a: List[str], b: List[str]) -> float:
+    # Jaccard similarity of two trigram sets
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class BuyerService:
+    """
+    Service for the buyer registry
+
+    Each invoice's free-text buyer is resolved to a canonical `buyers`
+    document at ingestion: by GSTIN when the invoice has a valid one
+    (unique index), otherwise by exact normalized name, then by trigram
+    similarity of the normalized name (multikey index on the trigrams).
+    Name matching only queries a name's rarest trigrams, counted per
+    buyer in `buyer_trigrams`, so common ones never pull in most of the
+    registry.
+    Recent resolutions are kept in an in-memory LRU, so repeat buyers
+    cost no query. Invoices then carry `buyer_id`, which makes per-buyer
+    history and exposure indexed queries.
+    """
+
+    def __init__(self):
+        self._resolved: "OrderedDict[Tuple[str, str], ObjectId]" = OrderedDict()
+
+    async def resolve_buyer(self, name: Optional[str], gstin: Optional[str] = None) -> Optional[ObjectId]:
+        """
+        Resolve a buyer name and GSTIN to a buyer ID, registering new buyers
+
+        Returns:
+            Optional[ObjectId]: The buyer ID, or None if neither name nor GSTIN is usable
+        """
+        # A misread GSTIN would register a second buyer, so only valid ones are keys
+        gstin = normalize_gstin(gstin)
+        gstin = gstin if gstin_validator.is_valid(gstin) else None
+        normalized_name = normalize_buyer_name(name)
+        if not gstin and not normalized_name:
+            return None
+
+        key = ("gstin", gstin) if gstin else ("name", normalized_name)
+        buyer_id = self._resolved.get(key)
+        if buyer_id is not None:
+            self._resolved.move_to_end(key)
+            return buyer_id
+
+        if gstin:
+            buyer_id = await self._upsert_by_gstin(gstin, name, normalized_name)
+        else:
+            buyer_id = await self._match_by_name(normalized_name) or await self._register(name, normalized_name)
+
+        self._resolved[key] = buyer_id
+        if len(self._resolved) > settings.BUYER_RESOLUTION_CACHE_SIZE:
+            self._resolved.popitem(last=False)
+        return buyer_id
+
+    async def record_invoice(self, buyer_id: ObjectId, amount: float, invoice_date: Optional[datetime] = None) -> None:
+        """
+        Update a buyer's running invoice aggregates after an invoice is created
+        """
+        now = datetime.utcnow()
+        await get_collection("buyers").update_one(
+            {"_id": buyer_id},
+            {
+                "$inc": {"invoice_count": 1, "total_invoiced": float(amount or 0)},
+                "$max": {"last_invoice_at": invoice_date or now},
+                "$set": {"updated_at": now}
+            }
+        )
+
+    async def get_buyer(self, buyer_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a buyer with its invoice aggregates and current exposure
+        """
+        buyer = await get_collection("buyers").find_one({"_id": ObjectId(buyer_id)}, {"trigrams": 0})
+        if not buyer:
+            return None
+        exposure = await self._exposure({"buyer_id": buyer["_id"]})
+        buyer["exposure"] = exposure[0] if exposure else {"invoice_count": 0, "amount": 0.0, "funded_amount": 0.0}
+        buyer["exposure"].pop("_id", None)
+        buyer["id"] = str(buyer.pop("_id"))
+        return buyer
+
+    async def get_concentration(self, limit: int = 20) -> Dict[str, Any]:
+        """
+        Get the buyers carrying the most funded exposure, with each one's
+        share and the Herfindahl-Hirschman index of the whole book
+        """
+        exposure = await self._exposure({"buyer_id": {"$ne": None}})
+        total_funded = sum(buyer["funded_amount"] for buyer in exposure)
+        shares = [buyer["funded_amount"] / total_funded for buyer in exposure] if total_funded else []
+
+        top = exposure[:limit]
+        names = {
+            buyer["_id"]: buyer.get("name")
+            async for buyer in get_collection("buyers").find(
+                {"_id": {"$in": [entry["_id"] for entry in top]}}, {"name": 1}
+            )
+        }
+        return {
+            "total_funded": total_funded,
+            "buyer_count": len(exposure),
+            "hhi": round(sum(share * share for share in shares) * 10000, 1),
+            "buyers": [
+                {
+                    "buyer_id": str(entry["_id"]),
+                    "name": names.get(entry["_id"]),
+                    "invoice_count": entry["invoice_count"],
+                    "amount": entry["amount"],
+                    "funded_amount": entry["funded_amount"],
+                    "share": round(share, 4),
+                }
+                for entry, share in zip(top, shares or [0.0] * len(top))
+            ],
+        }
+
+    @staticmethod
+    async def _exposure(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Served by the invoices (buyer_id, status) index
+        pipeline = [
+            {"$match": {**match, "status": {"$in": EXPOSURE_STATUSES}}},
+            {"$group": {
+                "_id": "$buyer_id",
+                "invoice_count": {"$sum": 1},
+                "amount": {"$sum": "$amount"},
+                "funded_amount": {"$sum": {"$ifNull": ["$funded_amount", 0]}}
+            }},
+            {"$sort": {"funded_amount": -1}}
+        ]
+        return await get_collection("invoices").aggregate(pipeline).to_list(length=None)
+
+    @staticmethod
+    async def _upsert_by_gstin(gstin: str, name: Optional[str], normalized_name: str) -> ObjectId:
+        now = datetime.utcnow()
+        new_id = ObjectId()
+        buyers_collection = get_collection("buyers")
+        update = {
+            "$setOnInsert": {
+                "_id": new_id,
+                "gstin": gstin,
+                "name": name,
+                "normalized_name": normalized_name,
+                "trigrams": name_trigrams(normalized_name),
+                "invoice_count": 0,
+                "total_invoiced": 0.0,
+                "created_at": now,
+            },
+            "$set": {"updated_at": now},
+        }
+        if name:
+            update["$addToSet"] = {"aliases": name}
+        try:
+            buyer = await buyers_collection.find_one_and_update(
+                {"gstin": gstin}, update, upsert=True, projection={"_id": 1}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Registered concurrently by another request
+            buyer = await buyers_collection.find_one({"gstin": gstin}, {"_id": 1})
+        if buyer["_id"] == new_id:
+            await BuyerService._count_trigrams(update["$setOnInsert"]["trigrams"])
+        return buyer["_id"]
+
+    @staticmethod
+    async def _match_by_name(normalized_name: str) -> Optional[ObjectId]:
+        buyers_collection = get_collection("buyers")
+        exact = await buyers_collection.find_one({"normalized_name": normalized_name}, {"_id": 1})
+        if exact:
+            return exact["_id"]
+
+        # A buyer at least BUYER_NAME_MATCH_THRESHOLD similar shares all but `slack`
+        # of the name's trigrams, so it shares one of any slack + 1 of them
+        trigrams = name_trigrams(normalized_name)
+        slack = len(trigrams) - math.ceil(settings.BUYER_NAME_MATCH_THRESHOLD * len(trigrams) - 1e-9)
+        rarest = await BuyerService._rarest(trigrams, max(slack, 0) + 1)
+        pipeline = [
+            {"$match": {"trigrams": {"$in": rarest}}},
+            {"$limit": settings.BUYER_NAME_SCAN_LIMIT},
+            {"$project": {"trigrams": 1, "shared": {"$size": {"$setIntersection": ["$trigrams", trigrams]}}}},
+            {"$sort": {"shared": -1}},
+            {"$limit": settings.BUYER_NAME_CANDIDATES}
+        ]
+        best_id, best_score = None, 0.0
+        async for candidate in buyers_collection.aggregate(pipeline):
+            score = _similarity(trigrams, candidate["trigrams"])
+            if score > best_score:
+                best_id, best_score = candidate["_id"], score
+        return best_id if best_score >= settings.BUYER_NAME_MATCH_THRESHOLD else None
+
+    @staticmethod
+    async def _register(name: Optional[str], normalized_name: str) -> ObjectId:
+        # Unique per normalized name among buyers without a GSTIN, so concurrent
+        # invoices for a new buyer register it once
+        now = datetime.utcnow()
+        new_id = ObjectId()
+        buyers_collection = get_collection("buyers")
+        update = {
+            "$setOnInsert": {
+                "_id": new_id,
+                "gstin": None,
+                "name": name,
+                "normalized_name": normalized_name,
+                "trigrams": name_trigrams(normalized_name),
+                "invoice_count": 0,
+                "total_invoiced": 0.0,
+                "created_at": now,
+            },
+            "$set": {"updated_at": now},
+        }
+        if name:
+            update["$addToSet"] = {"aliases": name}
+        else:
+            update["$setOnInsert"]["aliases"] = []
+        query = {"normalized_name": normalized_name, "gstin": None}
+        try:
+            buyer = await buyers_collection.find_one_and_update(
+                query, update, upsert=True, projection={"_id": 1}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Registered concurrently by another request
+            buyer = await buyers_collection.find_one(query, {"_id": 1})
+        if buyer["_id"] == new_id:
+            await BuyerService._count_trigrams(update["$setOnInsert"]["trigrams"])
+        return buyer["_id"]
+
+    @staticmethod
+    async def _rarest(trigrams: List[str], count: int) -> List[str]:
+        # Trigrams without a count belong to no buyer yet, so sort first
+        counts = {
+            entry["_id"]: entry["buyers"]
+            async for entry in get_collection("buyer_trigrams").find({"_id": {"$in": trigrams}})
+        }
+        return sorted(trigrams, key=lambda trigram: counts.get(trigram, 0))[:count]
+
+    @staticmethod
+    async def _count_trigrams(trigrams: List[str]) -> None:
+        if trigrams:
+            await get_collection("buyer_trigrams").bulk_write(
+                [UpdateOne({"_id": trigram}, {"$inc": {"buyers": 1}}, upsert=True) for trigram in trigrams],
+                ordered=False
+            )
+
+    async def merge_duplicate_names(self) -> int:
+        """
+        Merge buyers without a GSTIN registered more than once under the same
+        normalized name into the oldest one, moving their invoices to it
+
+        Returns:
+            int: Number of buyers merged away
+        """
+        buyers_collection = get_collection("buyers")
+        duplicates = buyers_collection.aggregate([
+            {"$match": {"gstin": None}},
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$normalized_name", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}}
+        ])
+        merged = 0
+        async for group in duplicates:
+            keep, others = group["ids"][0], group["ids"][1:]
+            copies = await buyers_collection.find({"_id": {"$in": others}}).to_list(length=None)
+            await get_collection("invoices").update_many({"buyer_id": {"$in": others}}, {"$set": {"buyer_id": keep}})
+            update = {
+                "$inc": {
+                    "invoice_count": sum(buyer.get("invoice_count", 0) for buyer in copies),
+                    "total_invoiced": sum(buyer.get("total_invoiced", 0.0) for buyer in copies),
+                },
+                "$addToSet": {"aliases": {"$each": [alias for buyer in copies for alias in buyer.get("aliases") or []]}},
+                "$set": {"updated_at": datetime.utcnow()},
+            }
+            last_invoice_at = [buyer["last_invoice_at"] for buyer in copies if buyer.get("last_invoice_at")]
+            if last_invoice_at:
+                update["$max"] = {"last_invoice_at": max(last_invoice_at)}
+            await buyers_collection.update_one({"_id": keep}, update)
+            await buyers_collection.delete_many({"_id": {"$in": others}})
+            merged += len(others)
+        return merged
+
+    async def rebuild_trigram_counts(self) -> None:
+        """
+        Recount how many buyers share each name trigram, for buyers registered
+        before the counts were kept
+        """
+        await get_collection("buyers").aggregate([
+            {"$unwind": "$trigrams"},
+            {"$group": {"_id": "$trigrams", "buyers": {"$sum": 1}}},
+            {"$out": "buyer_trigrams"}
+        ]).to_list(length=None)
+
+buyer_service = BuyerService()
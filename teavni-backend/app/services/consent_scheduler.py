@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.legalbot import ConsentStatus
+from app.services.legalbot_service import legalbot_service
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "consent_sweep"
+
+
+class ConsentSweepScheduler:
+    """
+    Periodic passive consent sweep with leader election.
+
+    Every node runs the scheduler, but only the holder of the
+    `consent_sweep` lease document in `scheduler_leases` sweeps. The
+    leader renews the lease on each tick; if it dies, another node takes
+    over once the lease expires. Each tick sweeps at most
+    CONSENT_SWEEP_MAX_BATCHES_PER_RUN batches, so a large backlog is
+    worked off steadily over several ticks instead of in one burst.
+    """
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.metrics: Dict[str, Any] = {
+            "runs": 0,
+            "failures": 0,
+            "records_processed": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "last_processed": None,
+            "backlog": None,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the scheduler loop in the background
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+            logger.info(f"Consent sweep scheduler started on {self.node_id}")
+
+    async def stop(self) -> None:
+        """
+        Stop the scheduler and give up leadership
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._release_lease()
+        logger.info("Consent sweep scheduler stopped")
+
+    async def run_forever(self) -> None:
+        """
+        Run sweep ticks on the configured interval until cancelled
+        """
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["failures"] += 1
+                logger.error(f"Consent sweep failed: {str(e)}")
+
+            # Jitter keeps nodes from contending for the lease in lockstep
+            interval = settings.CONSENT_SWEEP_INTERVAL_SECONDS
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+    async def tick(self) -> Optional[int]:
+        """
+        Sweep once if this node holds the lease
+
+        Returns:
+            Optional[int]: Number of records processed, or None if not the leader
+        """
+        self.is_leader = await self._acquire_lease()
+        if not self.is_leader:
+            return None
+
+        started = time.monotonic()
+        updated_records = await legalbot_service.check_passive_consent(
+            max_batches=settings.CONSENT_SWEEP_MAX_BATCHES_PER_RUN
+        )
+        duration_ms = int((time.monotonic() - started) * 1000)
+        backlog = await get_collection("consent_records").count_documents({
+            "status": ConsentStatus.PENDING,
+            "consent_window_end": {"$lt": datetime.utcnow()}
+        })
+
+        self.metrics.update({
+            "runs": self.metrics["runs"] + 1,
+            "records_processed": self.metrics["records_processed"] + len(updated_records),
+            "last_run_at": datetime.utcnow(),
+            "last_duration_ms": duration_ms,
+            "last_processed": len(updated_records),
+            "backlog": backlog,
+        })
+
+        # Publish the metrics on the lease document so any node can report them
+        await get_collection("scheduler_leases").update_one(
+            {"_id": LEASE_ID, "holder": self.node_id},
+            {"$set": {"metrics": self.metrics}}
+        )
+
+        if updated_records or backlog:
+            logger.info(
+                f"Consent sweep processed {len(updated_records)} records in {duration_ms}ms, "
+                f"{backlog} still expired"
+            )
+        return len(updated_records)
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get the sweep metrics published by the current leader
+        """
+        lease = await get_collection("scheduler_leases").find_one({"_id": LEASE_ID})
+        if not lease:
+            return {"leader": None, "lease_until": None, "metrics": None}
+        return {
+            "leader": lease.get("holder"),
+            "lease_until": lease.get("lease_until"),
+            "metrics": lease.get("metrics"),
+        }
+
+    async def _acquire_lease(self) -> bool:
+        """
+        Acquire or renew the sweep lease; False if another node holds it
+        """
+        now = datetime.utcnow()
+        try:
+            await get_collection("scheduler_leases").update_one(
+                {
+                    "_id": LEASE_ID,
+                    "$or": [
+                        {"holder": self.node_id},
+                        {"lease_until": {"$lt": now}}
+                    ]
+                },
+                {"$set": {
+                    "holder": self.node_id,
+                    "lease_until": now + timedelta(seconds=settings.CONSENT_SWEEP_LEADER_LEASE_SECONDS)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by a live leader
+            return False
+        return True
+
+    async def _release_lease(self) -> None:
+        if not self.is_leader:
+            return
+        await get_collection("scheduler_leases").update_one(
+            {"_id": LEASE_ID, "holder": self.node_id},
+            {"$set": {"lease_until": datetime.utcnow()}}
+        )
+        self.is_leader = False
+
+consent_sweep_scheduler = ConsentSweepScheduler()
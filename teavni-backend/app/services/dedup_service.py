@@ -0,0 +1,140 @@
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from app.core.database import get_collection
+from app.models.invoice import InvoiceStatus
+from app.services.image_index import image_hash_index
+
+# Separators and punctuation sellers vary between copies of the same invoice number
+INVOICE_NUMBER_NOISE = re.compile(r"[^A-Z0-9]")
+LEADING_ZEROS = re.compile(r"(?<![0-9])0+(?=[0-9])")
+
+# Fields the duplicate lookups read
+DUPLICATE_PROJECTION = {
+    "invoice_number": 1, "amount": 1, "invoice_date": 1, "status": 1, "hash": 1, "image_hash": 1,
+}
+
+
+def normalize_invoice_number(invoice_number: Optional[str]) -> Optional[str]:
+    """
+    Normalize an invoice number for duplicate matching: case, separators
+    and zero padding are ignored, so "inv/0042" matches "INV-42"
+    """
+    if not invoice_number:
+        return None
+    normalized = LEADING_ZEROS.sub("", INVOICE_NUMBER_NOISE.sub("", invoice_number.upper()))
+    return normalized or None
+
+
+def _same_day(a: Any, b: Any) -> bool:
+    if isinstance(a, datetime) and isinstance(b, datetime):
+        return a.date() == b.date()
+    return a == b
+
+
+class DuplicateInvoiceError(ValueError):
+    """
+    Raised when an invoice has already been submitted
+    """
+
+    def __init__(self, message: str, invoice_id: str):
+        super().__init__(message)
+        self.invoice_id = invoice_id
+
+
+class DedupService:
+    """
+    Service for detecting invoices submitted more than once
+
+    Every lookup is an index seek:
+    - the SHA-256 file hash is unique across live invoices;
+    - the normalized key (seller, normalized invoice number, amount,
+      invoice date) catches the same invoice typed in again;
+    - the perceptual image hash catches rescans and re-exports of the
+      same page, whose file hashes differ: the image hash index finds
+      pages within IMAGE_HASH_MAX_DISTANCE bits.
+
+    Exact duplicates of a live (not rejected) invoice are refused. Near
+    duplicates by key are recorded as `possible_duplicates` (reported by
+    the `duplicate_invoice` rule), similar images as `near_duplicates`
+    (reported by the `near_duplicate` rule).
+    """
+
+    @staticmethod
+    async def check_invoice(invoice: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Check a new invoice document against existing invoices
+
+        Args:
+            invoice: The invoice document about to be inserted, with
+                seller_id, normalized_invoice_number, hash and image_hash set
+
+        Returns:
+            List[Dict[str, Any]]: Invoices with the same key, as {invoice_id, reason}
+
+        Raises:
+            DuplicateInvoiceError: If a live invoice is an exact duplicate
+        """
+        invoices_collection = get_collection("invoices")
+        matches: Dict[str, str] = {}
+
+        if invoice.get("hash"):
+            existing = await invoices_collection.find_one(
+                {"hash": invoice["hash"], "status": {"$ne": InvoiceStatus.REJECTED}}, DUPLICATE_PROJECTION
+            )
+            if existing:
+                raise DuplicateInvoiceError(
+                    f"This invoice file was already submitted as invoice {existing.get('invoice_number')}",
+                    str(existing["_id"])
+                )
+
+        if invoice.get("normalized_invoice_number"):
+            cursor = invoices_collection.find(
+                {
+                    "seller_id": invoice["seller_id"],
+                    "normalized_invoice_number": invoice["normalized_invoice_number"]
+                },
+                DUPLICATE_PROJECTION
+            )
+            async for existing in cursor:
+                same_terms = existing.get("amount") == invoice.get("amount") and \
+                    _same_day(existing.get("invoice_date"), invoice.get("invoice_date"))
+                if same_terms and existing.get("status") != InvoiceStatus.REJECTED:
+                    raise DuplicateInvoiceError(
+                        f"Invoice {existing.get('invoice_number')} with the same amount and date was already submitted",
+                        str(existing["_id"])
+                    )
+                matches[str(existing["_id"])] = "same_invoice_number" if not same_terms else "resubmitted"
+
+        return [{"invoice_id": invoice_id, "reason": reason} for invoice_id, reason in matches.items()]
+
+    @staticmethod
+    async def find_similar_images(image_hash: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Find live invoices whose first page looks like this image hash
+
+        Returns:
+            List[Dict[str, Any]]: Matches as {invoice_id, distance}, closest first
+        """
+        if image_hash is None:
+            return []
+        matches = await image_hash_index.search(image_hash)
+        if not matches:
+            return []
+        # The index keeps deleted and rejected invoices; only live ones count
+        live = {
+            str(invoice["_id"]) async for invoice in get_collection("invoices").find(
+                {
+                    "_id": {"$in": [ObjectId(invoice_id) for invoice_id, _ in matches]},
+                    "status": {"$ne": InvoiceStatus.REJECTED}
+                },
+                {"_id": 1}
+            )
+        }
+        return [
+            {"invoice_id": invoice_id, "distance": distance}
+            for invoice_id, distance in matches if invoice_id in live
+        ]
+
+dedup_service = DedupService()
@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from app.core.config import settings
+from app.core.database import db, get_collection
+from app.models.events import DomainEvent, DomainEventType
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[DomainEvent], Awaitable[None]]
+
+WATCHED_COLLECTIONS = ["invoices", "consent_records", "notifications", "system_settings"]
+
+# Fields too large to carry on every event, or internal to the service that writes them
+EXCLUDED_FIELDS = ["ocr_data", "validation_results", "content", "metadata", "reservations"]
+
+# Server error codes: change streams need a replica set; the resume point fell off the oplog
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def _plain(value: Any) -> Any:
+    # ObjectIds become strings so events can be sent to clients as JSON
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def change_to_event(change: Dict[str, Any]) -> Optional[DomainEvent]:
+    """
+    Translate a change stream document into a domain event
+    """
+    collection = change["ns"]["coll"]
+    operation = change["operationType"]
+    document = change.get("fullDocument") or {}
+
+    if operation == "update":
+        changed = change.get("updateDescription", {}).get("updatedFields", {})
+    else:
+        changed = document
+    status_changed = "status" in changed
+    status = document.get("status", changed.get("status"))
+
+    if collection == "invoices":
+        if operation == "insert":
+            event_type = DomainEventType.INVOICE_CREATED
+        elif status_changed:
+            event_type = DomainEventType.INVOICE_STATUS_CHANGED
+        else:
+            event_type = DomainEventType.INVOICE_UPDATED
+        invoice_id = change["documentKey"]["_id"]
+    elif collection == "consent_records" and status_changed:
+        event_type = DomainEventType.CONSENT_STATUS_CHANGED
+        invoice_id = document.get("invoice_id")
+    elif collection == "notifications" and status_changed:
+        event_type = DomainEventType.NOTIFICATION_STATUS_CHANGED
+        invoice_id = document.get("invoice_id")
+    elif collection == "system_settings":
+        event_type = DomainEventType.SETTINGS_CHANGED
+        invoice_id = None
+    else:
+        return None
+
+    return DomainEvent(
+        type=event_type,
+        entity_id=str(change["documentKey"]["_id"]),
+        invoice_id=str(invoice_id) if invoice_id else None,
+        seller_id=str(document["seller_id"]) if document.get("seller_id") else None,
+        status=getattr(status, "value", status),
+        changed_fields=sorted(key.split(".")[0] for key in changed if key != "_id"),
+        document={key: value for key, value in _plain(document).items() if key not in EXCLUDED_FIELDS},
+        occurred_at=change.get("wallTime") or datetime.utcnow()
+    )
+
+
+class LocalChangeStream:
+    """
+    In-process stand-in for a replica set change stream, used in tests and
+    in development against a standalone MongoDB.
+
+    Changes pushed with `push` are returned by `try_next` in order, each
+    with a resume token, like a Motor change stream.
+    """
+
+    def __init__(self):
+        self._changes: asyncio.Queue = asyncio.Queue()
+        self._sequence = 0
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.alive = True
+
+    def push(self, change: Dict[str, Any]) -> None:
+        self._sequence += 1
+        change.setdefault("_id", {"_data": f"{self._sequence:016x}"})
+        self._changes.put_nowait(change)
+
+    async def try_next(self) -> Optional[Dict[str, Any]]:
+        try:
+            change = await asyncio.wait_for(self._changes.get(), timeout=0.1)
+        except asyncio.TimeoutError:
+            return None
+        self.resume_token = change["_id"]
+        return change
+
+    async def close(self) -> None:
+        self.alive = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class EventBus:
+    """
+    Publishes domain events derived from MongoDB change streams to
+    in-process subscribers.
+
+    One change stream per process watches invoices, consent records,
+    notifications and system settings. Events are handed to subscribers on
+    a background task, in stream order, so side effects never run on the
+    request path.
+
+    Every process keeps its in-memory state (marketplace snapshot, settings
+    cache, event streams) current from its own stream, but only the holder
+    of the `event_bus:<consumer>` lease in `scheduler_leases` persists its
+    resume token in `event_bus_offsets` and resumes from it on start, so
+    one position is kept per consumer rather than overwritten by every
+    process. A restarted process that takes the lease over picks up where
+    the last holder left off (at-least-once delivery; handlers must be
+    idempotent); the others start from the present.
+
+    Change streams need a replica set. Against a standalone server the bus
+    stays up in local mode: every service that writes a watched document
+    publishes the event with `emit` or `emit_change`, which are no-ops
+    while the change stream is live.
+    """
+
+    def __init__(self):
+        self.streaming = False
+        self.node_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._handlers: Dict[Optional[DomainEventType], List[EventHandler]] = defaultdict(list)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stream_factory = None
+        self._processed_token: Optional[Dict[str, Any]] = None
+        self._saved_token: Optional[Dict[str, Any]] = None
+        self._saved_at = 0.0
+        self.metrics: Dict[str, Any] = {"events": 0, "handler_failures": 0, "last_event_at": None}
+
+    def subscribe(self, handler: EventHandler, *event_types: DomainEventType) -> None:
+        """
+        Register a handler for the given event types (all events if none are given)
+        """
+        for event_type in event_types or (None,):
+            self._handlers[event_type].append(handler)
+
+    def start(self, stream_factory: Optional[Callable[[Optional[Dict[str, Any]]], Any]] = None) -> None:
+        """
+        Start consuming the change stream in the background
+
+        Args:
+            stream_factory: Opens a change stream given a resume token; defaults
+                to a database-wide Motor change stream
+        """
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.EVENT_BUS_QUEUE_SIZE)
+        self._stream_factory = stream_factory or self._open_change_stream
+        self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._consume())]
+        logger.info("Event bus started")
+
+    async def stop(self) -> None:
+        """
+        Stop consuming, finish queued events and persist the resume token
+        """
+        if self._queue is None:
+            return
+        consumer, dispatcher = self._tasks[1], self._tasks[0]
+        consumer.cancel()
+        try:
+            await consumer
+        except asyncio.CancelledError:
+            pass
+        self.streaming = False
+
+        await self._queue.join()
+        dispatcher.cancel()
+        try:
+            await dispatcher
+        except asyncio.CancelledError:
+            pass
+        await self._save_token(force=True)
+        await self._release_lease()
+        self._queue = None
+        self._tasks = []
+        logger.info("Event bus stopped")
+
+    async def emit(self, event: DomainEvent) -> None:
+        """
+        Publish an event written by this process when no change stream is live
+
+        While the change stream is live the write itself produces the event,
+        so this does nothing. Without a running bus (scripts) the handlers
+        run inline.
+        """
+        if self.streaming:
+            return
+        try:
+            self._queue.put_nowait((event, None))
+        except (AttributeError, asyncio.QueueFull):
+            # No running bus, or handlers are backed up: handle it here
+            await self._handle(event)
+
+    async def emit_change(
+        self,
+        collection: str,
+        document: Dict[str, Any],
+        updated_fields: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Emit the event a change stream would report for a write by this process
+
+        Args:
+            collection: Collection that was written
+            document: The document after the write
+            updated_fields: Fields the write set; None for an insert
+        """
+        if self.streaming:
+            return
+        change = {
+            "ns": {"coll": collection},
+            "operationType": "insert" if updated_fields is None else "update",
+            "documentKey": {"_id": document["_id"]},
+            "updateDescription": {"updatedFields": updated_fields or {}},
+            "fullDocument": document,
+        }
+        event = change_to_event(change)
+        if event is not None:
+            await self.emit(event)
+
+    async def publish_change(self, change: Dict[str, Any]) -> None:
+        """
+        Translate a change stream document and queue the resulting event
+        """
+        event = change_to_event(change)
+        if event is not None:
+            await self._queue.put((event, change.get("_id")))
+
+    def _open_change_stream(self, resume_after: Optional[Dict[str, Any]]):
+        pipeline = [
+            {"$match": {
+                "ns.coll": {"$in": WATCHED_COLLECTIONS},
+                "operationType": {"$in": ["insert", "update", "replace"]},
+                # Consent records and notifications only matter when their status moves
+                "$or": [
+                    {"ns.coll": {"$in": ["invoices", "system_settings"]}},
+                    {"operationType": {"$ne": "update"}},
+                    {"updateDescription.updatedFields.status": {"$exists": True}},
+                ]
+            }},
+            {"$project": {f"fullDocument.{field}": 0 for field in EXCLUDED_FIELDS}},
+        ]
+        return db.db.watch(pipeline, full_document="updateLookup", resume_after=resume_after)
+
+    async def _consume(self) -> None:
+        resume_token = None
+        try:
+            self.is_leader = await self._acquire_lease()
+            if self.is_leader:
+                offset = await get_collection("event_bus_offsets").find_one({"_id": settings.EVENT_BUS_CONSUMER})
+                resume_token = offset["token"] if offset else None
+        except PyMongoError as e:
+            logger.error(f"Failed to load event bus resume token: {str(e)}")
+        self._saved_token = resume_token
+
+        while True:
+            try:
+                async with self._stream_factory(resume_token) as stream:
+                    self.streaming = True
+                    logger.info("Event bus change stream open")
+                    while stream.alive:
+                        change = await stream.try_next()
+                        if change is not None:
+                            await self.publish_change(change)
+                        resume_token = stream.resume_token or resume_token
+                self.streaming = False
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.streaming = False
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Change streams need a replica set; event bus running in local mode")
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.error("Event bus resume point is no longer in the oplog; resuming from now")
+                    resume_token = None
+                else:
+                    logger.error(f"Event bus change stream failed: {str(e)}")
+                await asyncio.sleep(settings.EVENT_BUS_RETRY_SECONDS)
+            except PyMongoError as e:
+                self.streaming = False
+                logger.error(f"Event bus change stream failed: {str(e)}")
+                await asyncio.sleep(settings.EVENT_BUS_RETRY_SECONDS)
+
+    async def _dispatch(self) -> None:
+        while True:
+            event, token = await self._queue.get()
+            try:
+                await self._handle(event)
+                if token is not None:
+                    self._processed_token = token
+                    await self._save_token()
+            except Exception as e:
+                logger.error(f"Failed to persist event bus resume token: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _handle(self, event: DomainEvent) -> None:
+        handlers = self._handlers.get(event.type, []) + self._handlers.get(None, [])
+        results = await asyncio.gather(*(handler(event) for handler in handlers), return_exceptions=True)
+        for handler, result in zip(handlers, results):
+            if isinstance(result, Exception):
+                self.metrics["handler_failures"] += 1
+                logger.error(f"Event handler {getattr(handler, '__name__', handler)} failed on {event.type.value}: {str(result)}")
+        self.metrics["events"] += 1
+        self.metrics["last_event_at"] = datetime.utcnow()
+
+    async def _save_token(self, force: bool = False) -> None:
+        if self._processed_token is None or self._processed_token == self._saved_token:
+            return
+        if not force and time.monotonic() - self._saved_at < settings.EVENT_BUS_TOKEN_SAVE_SECONDS:
+            return
+        # Renews the lease; a process that does not hold it keeps its position to itself
+        self.is_leader = await self._acquire_lease()
+        if not self.is_leader:
+            self._saved_at = time.monotonic()
+            return
+        await get_collection("event_bus_offsets").update_one(
+            {"_id": settings.EVENT_BUS_CONSUMER},
+            {"$set": {"token": self._processed_token, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._saved_token = self._processed_token
+        self._saved_at = time.monotonic()
+
+    async def _acquire_lease(self) -> bool:
+        """
+        Acquire or renew the resume token lease; False if another process holds it
+        """
+        now = datetime.utcnow()
+        try:
+            await get_collection("scheduler_leases").update_one(
+                {
+                    "_id": f"event_bus:{settings.EVENT_BUS_CONSUMER}",
+                    "$or": [
+                        {"holder": self.node_id},
+                        # A released lease ends "now", so it can be taken at once
+                        {"lease_until": {"$lte": now}}
+                    ]
+                },
+                {"$set": {
+                    "holder": self.node_id,
+                    "lease_until": now + timedelta(seconds=settings.EVENT_BUS_LEASE_SECONDS)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another live process holds the lease
+            return False
+        return True
+
+    async def _release_lease(self) -> None:
+        if not self.is_leader:
+            return
+        await get_collection("scheduler_leases").update_one(
+            {"_id": f"event_bus:{settings.EVENT_BUS_CONSUMER}", "holder": self.node_id},
+            {"$set": {"lease_until": datetime.utcnow()}}
+        )
+        self.is_leader = False
+
+event_bus = EventBus()
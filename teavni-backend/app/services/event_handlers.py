@@ -0,0 +1,44 @@
+from bson import ObjectId
+from app.models.events import DomainEvent, DomainEventType
+from app.services.event_bus import event_bus
+from app.services.legalbot_service import legalbot_service
+from app.services.marketplace_service import marketplace_snapshot
+from app.services.settings_service import settings_service
+
+
+async def apply_consent_outcome(event: DomainEvent) -> None:
+    """
+    Move the invoice to VALIDATED or REJECTED once its consent is decided
+
+    The consent write already does this; the handler is a backstop for a
+    request that failed between the two writes, and a no-op otherwise.
+    """
+    if event.invoice_id:
+        await legalbot_service.apply_consent_outcome(ObjectId(event.invoice_id), event.status)
+
+
+async def update_marketplace_snapshot(event: DomainEvent) -> None:
+    """
+    Keep this worker's marketplace snapshot current with the invoice's new state
+    """
+    if marketplace_snapshot.ready and event.document:
+        await marketplace_snapshot.apply({**event.document, "_id": event.entity_id})
+
+
+async def invalidate_settings(event: DomainEvent) -> None:
+    """
+    Reload this worker's cached system settings when the settings document changes
+    """
+    settings_service.invalidate()
+    await settings_service.get_settings()
+
+
+def register_event_handlers() -> None:
+    """
+    Subscribe the platform's side effects to the event bus
+    """
+    event_bus.subscribe(apply_consent_outcome, DomainEventType.CONSENT_STATUS_CHANGED)
+    event_bus.subscribe(
+        update_marketplace_snapshot, DomainEventType.INVOICE_STATUS_CHANGED, DomainEventType.INVOICE_UPDATED
+    )
+    event_bus.subscribe(invalidate_settings, DomainEventType.SETTINGS_CHANGED)
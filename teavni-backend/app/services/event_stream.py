@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, Optional, Set
+from bson import ObjectId
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.events import DomainEvent, DomainEventType
+from app.models.invoice import InvoiceStatus
+from app.models.user import UserType
+from app.services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Events pushed to clients
+STREAMED_EVENTS = [
+    DomainEventType.INVOICE_CREATED,
+    DomainEventType.INVOICE_STATUS_CHANGED,
+    DomainEventType.INVOICE_UPDATED,
+    DomainEventType.CONSENT_STATUS_CHANGED,
+]
+
+# Invoice statuses investors can see on the marketplace
+INVESTOR_VISIBLE_STATUSES = {InvoiceStatus.VALIDATED.value, InvoiceStatus.FUNDED.value}
+
+# Invoice fields sent to clients with invoice events
+STREAMED_INVOICE_FIELDS = [
+    "invoice_number", "amount", "status", "trust_score", "risk_tier",
+    "available_amount", "funded_amount", "updated_at",
+]
+
+
+class StreamConnection:
+    """
+    One client's event stream: a bounded queue of events it may see
+    """
+
+    def __init__(self, user: Dict[str, Any], invoice_id: Optional[str] = None):
+        self.user_id = user["id"]
+        self.user_type = user.get("type")
+        self.invoice_id = invoice_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        # Set when the client fell too far behind; the stream then ends and the client reconnects
+        self.overflowed = False
+
+    def offer(self, event: DomainEvent) -> None:
+        if self.invoice_id and event.invoice_id != self.invoice_id:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventStreamHub:
+    """
+    Fans domain events out to connected server-sent event clients.
+
+    Each worker subscribes to the event bus once; every event is matched to
+    the connections allowed to see it (the invoice's seller, admins, and
+    investors for marketplace invoices) without touching the database per
+    connection. Consent events carry no seller, so the invoice's seller is
+    resolved once per event through a small cache.
+    """
+
+    def __init__(self):
+        self._subscribed = False
+        self._by_user: Dict[str, Set[StreamConnection]] = defaultdict(set)
+        self._admins: Set[StreamConnection] = set()
+        self._investors: Set[StreamConnection] = set()
+        self._invoice_sellers: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._by_user.values())
+
+    def connect(self, user: Dict[str, Any], invoice_id: Optional[str] = None) -> StreamConnection:
+        """
+        Register a client connection
+        """
+        if not self._subscribed:
+            event_bus.subscribe(self._publish, *STREAMED_EVENTS)
+            self._subscribed = True
+
+        connection = StreamConnection(user, invoice_id)
+        self._by_user[connection.user_id].add(connection)
+        if connection.user_type == UserType.ADMIN:
+            self._admins.add(connection)
+        elif connection.user_type == UserType.INVESTOR:
+            self._investors.add(connection)
+        return connection
+
+    def disconnect(self, connection: StreamConnection) -> None:
+        """
+        Remove a client connection
+        """
+        connections = self._by_user.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._by_user[connection.user_id]
+        self._admins.discard(connection)
+        self._investors.discard(connection)
+
+    @staticmethod
+    def to_message(event: DomainEvent) -> Dict[str, Any]:
+        """
+        Build the client-facing payload of an event
+        """
+        if event.type == DomainEventType.CONSENT_STATUS_CHANGED:
+            document = {"consent_id": event.entity_id, "status": event.status}
+        else:
+            document = {field: event.document.get(field) for field in STREAMED_INVOICE_FIELDS}
+        return {
+            "type": event.type.value,
+            "invoice_id": event.invoice_id,
+            "status": event.status,
+            "changed_fields": event.changed_fields,
+            "data": document,
+            "occurred_at": event.occurred_at,
+        }
+
+    async def _publish(self, event: DomainEvent) -> None:
+        if not self._by_user or not event.invoice_id:
+            return
+
+        seller_id = event.seller_id or await self._seller_of(event.invoice_id)
+        if event.seller_id:
+            self._remember_seller(event.invoice_id, event.seller_id)
+
+        recipients = set(self._admins)
+        if seller_id:
+            recipients.update(self._by_user.get(seller_id, ()))
+        if event.type != DomainEventType.CONSENT_STATUS_CHANGED and event.status in INVESTOR_VISIBLE_STATUSES:
+            recipients.update(self._investors)
+
+        for connection in recipients:
+            connection.offer(event)
+
+    async def _seller_of(self, invoice_id: str) -> Optional[str]:
+        seller_id = self._invoice_sellers.get(invoice_id)
+        if seller_id is None:
+            invoice = await get_collection("invoices").find_one({"_id": ObjectId(invoice_id)}, {"seller_id": 1})
+            if not invoice:
+                return None
+            seller_id = str(invoice["seller_id"])
+            self._remember_seller(invoice_id, seller_id)
+        else:
+            self._invoice_sellers.move_to_end(invoice_id)
+        return seller_id
+
+    def _remember_seller(self, invoice_id: str, seller_id: str) -> None:
+        self._invoice_sellers[invoice_id] = seller_id
+        self._invoice_sellers.move_to_end(invoice_id)
+        if len(self._invoice_sellers) > settings.EVENT_STREAM_SELLER_CACHE_SIZE:
+            self._invoice_sellers.popitem(last=False)
+
+event_stream_hub = EventStreamHub()
@@ -0,0 +1,208 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from app.core.config import settings
+from app.core.database import get_collection
+from app.services.gstin_validator import (
+    gstin_validator, normalize_gstin, DIGITS, LETTERS, GSTIN_CHARSET, PAN_HOLDER_TYPES, VALID,
+)
+
+# Characters OCR reads for one another, with how likely the misreading is
+CONFUSABLES = [
+    ("O", "0", 0.1), ("I", "1", 0.1), ("S", "5", 0.1), ("B", "8", 0.1),
+    ("D", "0", 0.03), ("Q", "0", 0.03), ("L", "1", 0.03), ("Z", "2", 0.03),
+    ("G", "6", 0.03), ("A", "4", 0.03), ("T", "7", 0.03), ("L", "I", 0.03),
+]
+
+# Shape tokens: a named character class, or a single literal character
+TOKEN_CHARSETS = {
+    "digit": DIGITS,
+    "letter": LETTERS,
+    "pan_type": "".join(PAN_HOLDER_TYPES),
+    "entity": GSTIN_CHARSET[1:],
+    "alnum": GSTIN_CHARSET,
+}
+GSTIN_SHAPE = ["digit"] * 2 + ["letter"] * 3 + ["pan_type", "letter"] + ["digit"] * 4 + ["letter", "entity", "alnum", "alnum"]
+
+# Weight left for "none of the candidates is the true reading"
+UNEXPLAINED_WEIGHT = 0.001
+
+
+def invoice_number_shape(invoice_number: str) -> List[str]:
+    """
+    Shape of an invoice number: digits become a digit class, letters and
+    separators stay as they are (sellers keep their prefixes and series)
+    """
+    return ["digit" if char.isdigit() else char.upper() for char in invoice_number]
+
+
+class ShapeTrie:
+    """
+    Trie of field shapes, walked one character at a time so a search
+    abandons a substitution as soon as no known shape continues with it
+    """
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self, shapes: Optional[List[List[str]]] = None):
+        self.children: Dict[str, "ShapeTrie"] = {}
+        self.terminal = False
+        for shape in shapes or []:
+            self.add(shape)
+
+    def add(self, shape: List[str]) -> None:
+        node = self
+        for token in shape:
+            node = node.children.setdefault(token, ShapeTrie())
+        node.terminal = True
+
+    def step(self, char: str) -> List["ShapeTrie"]:
+        # Nodes reached by reading `char` from this one
+        return [
+            child for token, child in self.children.items()
+            if char.upper() in TOKEN_CHARSETS.get(token, token)
+        ]
+
+
+class FieldCorrector:
+    """
+    Corrects OCR misreadings of structured invoice fields
+
+    A reading is repaired by substituting OCR-confusable characters (O/0,
+    I/1, S/5, B/8, ...): a depth-first search over the reading walks the
+    trie of the shapes the field may take, so only substitutions some
+    shape allows are ever expanded. Complete candidates are then checked
+    (GSTINs against their check digit, in one batch) and weighted by the
+    likelihood of their substitutions; the best one is returned with its
+    share of the total weight as confidence.
+
+    The search keeps the reading's own characters first, tries at most
+    OCR_CORRECTION_MAX_EDITS substitutions and stops at the per-field time
+    budget, reporting what it found so far.
+    """
+
+    def __init__(self):
+        self._substitutes: Dict[str, List[Tuple[str, float]]] = {}
+        for first, second, probability in CONFUSABLES:
+            self._substitutes.setdefault(first, []).append((second, probability))
+            self._substitutes.setdefault(second, []).append((first, probability))
+        self._gstin_trie = ShapeTrie([GSTIN_SHAPE])
+        # Seller ID -> trie of the shapes of their invoice numbers
+        self._seller_tries: "OrderedDict[str, ShapeTrie]" = OrderedDict()
+
+    def correct_gstin(self, reading: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Correct an OCR reading of a GSTIN
+
+        Returns:
+            Optional[Dict[str, Any]]: The correction (value, confidence,
+            substitutions, candidates), or None if no valid GSTIN is within reach
+        """
+        reading = normalize_gstin(reading)
+        if not reading:
+            return None
+        return self._correct(reading, self._gstin_trie, validate=self._valid_gstins)
+
+    def gstin_candidates(self, reading: Optional[str], limit: int = 5) -> List[str]:
+        """
+        Valid GSTINs an invalid reading may be a misreading of, most likely first
+        """
+        correction = self.correct_gstin(reading)
+        if not correction:
+            return []
+        return [candidate for candidate in correction["candidates"] if candidate != correction["original"]][:limit]
+
+    async def correct_invoice_number(self, seller_id: str, reading: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Correct an OCR reading of an invoice number against the shapes of
+        the seller's previous invoice numbers
+
+        Returns:
+            Optional[Dict[str, Any]]: The correction, or None if the seller has
+            no invoices yet or no known shape is within reach
+        """
+        reading = (reading or "").strip()
+        if not reading:
+            return None
+        trie = await self._seller_trie(seller_id)
+        if not trie.children:
+            return None
+        return self._correct(reading, trie)
+
+    def remember_invoice_number(self, seller_id: str, invoice_number: Optional[str]) -> None:
+        """
+        Add a new invoice number's shape to the seller's cached trie
+        """
+        trie = self._seller_tries.get(str(seller_id))
+        if trie is not None and invoice_number:
+            trie.add(invoice_number_shape(invoice_number))
+
+    async def _seller_trie(self, seller_id: str) -> ShapeTrie:
+        seller_id = str(seller_id)
+        trie = self._seller_tries.get(seller_id)
+        if trie is not None:
+            self._seller_tries.move_to_end(seller_id)
+            return trie
+
+        cursor = get_collection("invoices").find(
+            {"seller_id": ObjectId(seller_id), "invoice_number": {"$type": "string"}},
+            {"invoice_number": 1}
+        ).sort("_id", -1).limit(settings.OCR_CORRECTION_PATTERN_SAMPLE)
+        trie = ShapeTrie([invoice_number_shape(invoice["invoice_number"]) async for invoice in cursor])
+
+        self._seller_tries[seller_id] = trie
+        if len(self._seller_tries) > settings.OCR_CORRECTION_SELLER_CACHE_SIZE:
+            self._seller_tries.popitem(last=False)
+        return trie
+
+    @staticmethod
+    def _valid_gstins(values: List[str]) -> List[bool]:
+        return list(gstin_validator.check(values) == VALID)
+
+    def _correct(self, reading: str, trie: ShapeTrie, validate=None) -> Optional[Dict[str, Any]]:
+        found, complete = self._search(reading, trie)
+        if validate and found:
+            found = {value: weight for (value, weight), ok in zip(found.items(), validate(list(found))) if ok}
+        if not found:
+            return None
+
+        ranked = sorted(found.items(), key=lambda item: item[1], reverse=True)
+        value, weight = ranked[0]
+        return {
+            "value": value,
+            "original": reading,
+            "confidence": round(weight / (sum(found.values()) + UNEXPLAINED_WEIGHT), 3),
+            "substitutions": [
+                {"position": position, "from": before, "to": after}
+                for position, (before, after) in enumerate(zip(reading, value)) if before != after
+            ],
+            "candidates": [candidate for candidate, _ in ranked[:5]],
+            "complete": complete,
+        }
+
+    def _search(self, reading: str, trie: ShapeTrie) -> Tuple[Dict[str, float], bool]:
+        # Depth-first over (position, trie node, prefix, weight, edits)
+        deadline = time.perf_counter() + settings.OCR_CORRECTION_TIME_BUDGET_MS / 1000
+        found: Dict[str, float] = {}
+        stack = [(0, trie, "", 1.0, 0)]
+        while stack:
+            if time.perf_counter() > deadline:
+                return found, False
+            position, node, prefix, weight, edits = stack.pop()
+            if position == len(reading):
+                if node.terminal and weight > found.get(prefix, 0.0):
+                    found[prefix] = weight
+                continue
+
+            char = reading[position]
+            if edits < settings.OCR_CORRECTION_MAX_EDITS:
+                for substitute, probability in self._substitutes.get(char.upper(), []):
+                    for child in node.step(substitute):
+                        stack.append((position + 1, child, prefix + substitute, weight * probability, edits + 1))
+            # Pushed last so the reading's own character is explored first
+            for child in node.step(char):
+                stack.append((position + 1, child, prefix + char, weight, edits))
+        return found, True
+
+field_corrector = FieldCorrector()
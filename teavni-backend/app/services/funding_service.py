@@ -0,0 +1,381 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.invoice import InvoiceStatus
+from app.models.investment import InvestmentStatus
+from app.services.event_bus import event_bus, EXCLUDED_FIELDS
+from app.services.marketplace_service import RETURN_RATES
+
+logger = logging.getLogger(__name__)
+
+# Amounts are in rupees to the paisa; anything under half a paisa is float noise
+HALF_PAISA = 0.005
+
+# Invoice fields an investment needs once its amount is reserved
+RESERVED_PROJECTION = {"status": 1, "available_amount": 1, "funded_amount": 1, "due_date": 1, "risk_tier": 1}
+
+# The invoice as invoice events carry it
+EVENT_PROJECTION = {field: 0 for field in EXCLUDED_FIELDS}
+
+
+class FundingService:
+    """
+    Service for investing in invoices
+
+    An investment is first recorded as pending under the investor's
+    idempotency key, so a retried request finds it instead of funding
+    twice. Its amount is then reserved with one conditional update of the
+    invoice, which only matches while the invoice is validated, not yet
+    due, has at least that amount available and holds no reservation for
+    this investment. The same write decrements `available_amount`,
+    increments `funded_amount` and records the reservation, so concurrent
+    investors can never oversubscribe an invoice. A request that loses a
+    race rereads the invoice and tries again, up to FUNDING_MAX_ATTEMPTS
+    times.
+
+    The investments are the record of what was invested: an invoice's
+    `reservations` only hold the amounts of investments still pending, and
+    each is removed once its investment is active, so the array stays as
+    small as the number of investors funding the invoice at that moment.
+    A pending investment left behind by a crash is settled from it by
+    `recover_pending`.
+
+    With `allow_partial`, an investor asking for more than is left takes
+    what is left. Any investment must be at least FUNDING_MIN_AMOUNT,
+    unless it takes the rest of the invoice. The invoice moves to FUNDED
+    once nothing is left.
+    """
+
+    async def fund(
+        self,
+        investor_id: str,
+        invoice_id: str,
+        amount: float,
+        idempotency_key: str,
+        allow_partial: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Invest in an invoice
+
+        Returns:
+            Dict[str, Any]: The investment; for a repeated idempotency key, the
+            investment the key was first used for
+
+        Raises:
+            ValueError: If nothing could be reserved, or the idempotency key
+            was used for a different investment
+        """
+        amount = round(float(amount), 2)
+        now = datetime.utcnow()
+        investment = {
+            "investor_id": ObjectId(investor_id),
+            "invoice_id": ObjectId(invoice_id),
+            "requested_amount": amount,
+            "allow_partial": allow_partial,
+            "amount": 0.0,
+            "status": InvestmentStatus.PENDING.value,
+            "idempotency_key": idempotency_key,
+            "created_at": now,
+            "updated_at": now,
+        }
+        investments_collection = get_collection("investments")
+        try:
+            result = await investments_collection.insert_one(investment)
+        except DuplicateKeyError:
+            existing = await investments_collection.find_one(
+                {"investor_id": investment["investor_id"], "idempotency_key": idempotency_key}
+            )
+            if existing["invoice_id"] != investment["invoice_id"] or existing["requested_amount"] != amount:
+                raise ValueError("Idempotency key was already used for a different investment")
+            if existing["status"] == InvestmentStatus.FAILED.value:
+                raise ValueError(existing.get("failure_reason") or "Investment failed")
+            return self._format(existing)
+        investment["_id"] = result.inserted_id
+
+        try:
+            fill, invoice = await self._reserve(investment)
+        except ValueError as e:
+            await investments_collection.update_one(
+                {"_id": investment["_id"], "status": InvestmentStatus.PENDING.value},
+                {"$set": {
+                    "status": InvestmentStatus.FAILED.value,
+                    "failure_reason": str(e),
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+            raise
+        return await self._activate(investment, fill, invoice)
+
+    async def list_investments(self, investor_id: str) -> List[Dict[str, Any]]:
+        """
+        List an investor's investments, latest first, with their invoices' details
+        """
+        investments = await get_collection("investments").find(
+            {"investor_id": ObjectId(investor_id), "status": {"$ne": InvestmentStatus.FAILED.value}}
+        ).sort("created_at", DESCENDING).to_list(length=None)
+        return await self._with_invoices(investments)
+
+    async def get_investment(self, investor_id: str, investment_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get one of an investor's investments with its invoice's details
+        """
+        investment = await get_collection("investments").find_one(
+            {"_id": ObjectId(investment_id), "investor_id": ObjectId(investor_id)}
+        )
+        if not investment:
+            return None
+        return (await self._with_invoices([investment]))[0]
+
+    async def recover_pending(self) -> int:
+        """
+        Settle investments left pending for FUNDING_PENDING_TIMEOUT_SECONDS
+        (called on startup): activate those whose amount the invoice holds,
+        fail the others, and clear reservations left behind by investments
+        that were settled
+
+        Returns:
+            int: Number of investments settled
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.FUNDING_PENDING_TIMEOUT_SECONDS)
+        cursor = get_collection("investments").find(
+            {"status": InvestmentStatus.PENDING.value, "created_at": {"$lt": cutoff}}
+        )
+        settled = 0
+        async for investment in cursor:
+            invoice = await get_collection("invoices").find_one(
+                {"_id": investment["invoice_id"]},
+                {**RESERVED_PROJECTION, "reservations": {"$elemMatch": {"investment_id": investment["_id"]}}}
+            )
+            if invoice and invoice.get("reservations"):
+                await self._activate(investment, invoice["reservations"][0]["amount"], invoice)
+            else:
+                await get_collection("investments").update_one(
+                    {"_id": investment["_id"], "status": InvestmentStatus.PENDING.value},
+                    {"$set": {
+                        "status": InvestmentStatus.FAILED.value,
+                        "failure_reason": "Interrupted before the amount was reserved",
+                        "updated_at": datetime.utcnow()
+                    }}
+                )
+            settled += 1
+
+        # Reservations can be left behind by an investment activated just before a
+        # crash (kept), or a failed one whose request reserved after recovery gave up
+        # on it (given back)
+        invoices_collection = get_collection("invoices")
+        async for invoice in invoices_collection.find({"reservations.at": {"$lt": cutoff}}, {"reservations": 1}):
+            stale = {
+                reservation["investment_id"]: reservation["amount"]
+                for reservation in invoice["reservations"] if reservation["at"] < cutoff
+            }
+            cursor = get_collection("investments").find(
+                {"_id": {"$in": list(stale)}, "status": {"$ne": InvestmentStatus.PENDING.value}},
+                {"invoice_id": 1, "status": 1}
+            )
+            async for investment in cursor:
+                if investment["status"] == InvestmentStatus.FAILED.value:
+                    await self._release(investment, stale[investment["_id"]])
+                else:
+                    await invoices_collection.update_one(
+                        {"_id": invoice["_id"]},
+                        {"$pull": {"reservations": {"investment_id": investment["_id"]}}}
+                    )
+        if settled:
+            logger.info(f"Settled {settled} interrupted investments")
+        return settled
+
+    async def _reserve(self, investment: Dict[str, Any]) -> Tuple[float, Dict[str, Any]]:
+        # Reserve the investment's amount on its invoice; returns the amount
+        # reserved and the invoice after the reservation
+        invoices_collection = get_collection("invoices")
+        requested = investment["requested_amount"]
+        # Try the requested amount straight away: the common, uncontended case
+        fill = requested if requested >= settings.FUNDING_MIN_AMOUNT else None
+
+        for _ in range(settings.FUNDING_MAX_ATTEMPTS):
+            if fill is not None:
+                now = datetime.utcnow()
+                invoice = await invoices_collection.find_one_and_update(
+                    {
+                        "_id": investment["invoice_id"],
+                        "status": InvoiceStatus.VALIDATED.value,
+                        "due_date": {"$gt": now},
+                        "available_amount": {"$gte": fill},
+                        "reservations.investment_id": {"$ne": investment["_id"]},
+                    },
+                    {
+                        "$inc": {"available_amount": -fill, "funded_amount": fill},
+                        "$push": {"reservations": {"investment_id": investment["_id"], "amount": fill, "at": now}},
+                        "$set": {"updated_at": now},
+                    },
+                    projection=RESERVED_PROJECTION,
+                    return_document=ReturnDocument.AFTER
+                )
+                if invoice:
+                    return fill, invoice
+
+            # Not reserved: see what is left and size the next attempt
+            invoice = await invoices_collection.find_one(
+                {"_id": investment["invoice_id"]},
+                {**RESERVED_PROJECTION, "reservations": {"$elemMatch": {"investment_id": investment["_id"]}}}
+            )
+            if not invoice:
+                raise ValueError("Invoice not found")
+            if invoice.get("reservations"):
+                # Reserved by an earlier attempt whose reply was lost
+                return invoice["reservations"][0]["amount"], invoice
+            if invoice["status"] != InvoiceStatus.VALIDATED.value:
+                raise ValueError("Invoice is not open for funding")
+            if invoice["due_date"] <= datetime.utcnow():
+                raise ValueError("Invoice is past its due date")
+
+            available = invoice.get("available_amount") or 0.0
+            if available < HALF_PAISA:
+                raise ValueError("Invoice is fully funded")
+            if requested >= available - HALF_PAISA:
+                if requested > available + HALF_PAISA and not investment["allow_partial"]:
+                    raise ValueError(f"Only {available:,.2f} is left to fund on this invoice")
+                # Take exactly what is left, so the invoice ends at zero
+                fill = available
+            elif requested < settings.FUNDING_MIN_AMOUNT:
+                raise ValueError(
+                    f"Investments must be at least {settings.FUNDING_MIN_AMOUNT:,.2f} "
+                    f"unless they fund the rest of the invoice"
+                )
+            else:
+                fill = requested
+
+        raise ValueError("Too many investors are funding this invoice at once; please try again")
+
+    async def _activate(self, investment: Dict[str, Any], fill: float, invoice: Dict[str, Any]) -> Dict[str, Any]:
+        # Mark a reserved investment active, drop its reservation, and mark the
+        # invoice funded if nothing is left
+        now = datetime.utcnow()
+        return_rate = RETURN_RATES.get(invoice.get("risk_tier"))
+        days = max(0, math.ceil((invoice["due_date"] - now).total_seconds() / 86400))
+        update = {
+            "status": InvestmentStatus.ACTIVE.value,
+            "amount": fill,
+            "roi": return_rate,
+            "risk_tier": invoice.get("risk_tier"),
+            "expected_return": round(fill * (return_rate or 0) / 100 * days / 365, 2),
+            "investment_date": now,
+            "maturity_date": invoice["due_date"],
+            "updated_at": now,
+        }
+        activated = await get_collection("investments").find_one_and_update(
+            {"_id": investment["_id"], "status": InvestmentStatus.PENDING.value},
+            {"$set": update},
+            return_document=ReturnDocument.AFTER
+        )
+        if activated is None:
+            current = await get_collection("investments").find_one({"_id": investment["_id"]})
+            if current["status"] == InvestmentStatus.FAILED.value:
+                # Recovery gave up on it while this request was still reserving
+                await self._release(investment, fill)
+                raise ValueError(current.get("failure_reason") or "Investment failed")
+            return self._format(current)
+
+        invoice = await get_collection("invoices").find_one_and_update(
+            {"_id": investment["invoice_id"]},
+            {"$pull": {"reservations": {"investment_id": investment["_id"]}}},
+            projection=EVENT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if (invoice.get("available_amount") or 0.0) < HALF_PAISA:
+            await self._mark_funded(invoice["_id"])
+        else:
+            await event_bus.emit_change("invoices", invoice, {
+                "available_amount": invoice["available_amount"],
+                "funded_amount": invoice.get("funded_amount"),
+            })
+        return self._format(activated)
+
+    async def _mark_funded(self, invoice_id: ObjectId) -> None:
+        now = datetime.utcnow()
+        update_data = {"status": InvoiceStatus.FUNDED.value, "funded_at": now, "updated_at": now}
+        invoice = await get_collection("invoices").find_one_and_update(
+            {"_id": invoice_id, "status": InvoiceStatus.VALIDATED.value, "available_amount": {"$lt": HALF_PAISA}},
+            {"$set": update_data},
+            projection=EVENT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if invoice:
+            await event_bus.emit_change("invoices", invoice, update_data)
+
+    @staticmethod
+    async def _release(investment: Dict[str, Any], fill: float) -> None:
+        # Give a reserved amount back to the invoice, reopening it if it was funded
+        invoices_collection = get_collection("invoices")
+        now = datetime.utcnow()
+        invoice = await invoices_collection.find_one_and_update(
+            {"_id": investment["invoice_id"], "reservations.investment_id": investment["_id"]},
+            {
+                "$inc": {"available_amount": fill, "funded_amount": -fill},
+                "$pull": {"reservations": {"investment_id": investment["_id"]}},
+                "$set": {"updated_at": now},
+            },
+            projection=EVENT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if invoice is None:
+            return
+        update_data = {"available_amount": invoice["available_amount"], "funded_amount": invoice["funded_amount"]}
+        if invoice["status"] == InvoiceStatus.FUNDED.value:
+            reopened = await invoices_collection.find_one_and_update(
+                {"_id": invoice["_id"], "status": InvoiceStatus.FUNDED.value, "available_amount": {"$gte": HALF_PAISA}},
+                {"$set": {"status": InvoiceStatus.VALIDATED.value, "updated_at": now}, "$unset": {"funded_at": ""}},
+                projection=EVENT_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            if reopened:
+                invoice = reopened
+                update_data["status"] = InvoiceStatus.VALIDATED.value
+        await event_bus.emit_change("invoices", invoice, update_data)
+
+    @staticmethod
+    async def _with_invoices(investments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Add the invoice number, due date, seller name and days to maturity
+        invoices = await get_collection("invoices").find(
+            {"_id": {"$in": list({investment["invoice_id"] for investment in investments})}},
+            {"invoice_number": 1, "due_date": 1, "seller_id": 1, "buyer_name": 1, "status": 1}
+        ).to_list(length=None)
+        invoices_by_id = {invoice["_id"]: invoice for invoice in invoices}
+        sellers = await get_collection("users").find(
+            {"_id": {"$in": list({invoice["seller_id"] for invoice in invoices})}},
+            {"business_profile.company_name": 1}
+        ).to_list(length=None)
+        seller_names = {seller["_id"]: (seller.get("business_profile") or {}).get("company_name") for seller in sellers}
+
+        now = datetime.utcnow()
+        formatted = []
+        for investment in investments:
+            invoice = invoices_by_id.get(investment["invoice_id"]) or {}
+            due_date = invoice.get("due_date") or investment.get("maturity_date")
+            formatted.append({
+                **FundingService._format(investment),
+                "invoice_number": invoice.get("invoice_number"),
+                "invoice_status": invoice.get("status"),
+                "buyer_name": invoice.get("buyer_name"),
+                "company_name": seller_names.get(invoice.get("seller_id")),
+                "due_date": due_date,
+                "return_rate": investment.get("roi"),
+                "days_to_maturity": max(0, math.ceil((due_date - now).total_seconds() / 86400)) if due_date else None,
+            })
+        return formatted
+
+    @staticmethod
+    def _format(investment: Dict[str, Any]) -> Dict[str, Any]:
+        formatted = {key: value for key, value in investment.items() if key != "_id"}
+        formatted["id"] = str(investment["_id"])
+        formatted["investor_id"] = str(investment["investor_id"])
+        formatted["invoice_id"] = str(investment["invoice_id"])
+        return formatted
+
+funding_service = FundingService()
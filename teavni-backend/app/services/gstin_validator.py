@@ -0,0 +1,190 @@
+from typing import Dict, Any, Optional, Sequence
+import numpy as np
+
+GSTIN_LENGTH = 15
+GSTIN_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# GST state and union territory codes (first two digits)
+STATE_CODES = {
+    "01": "Jammu and Kashmir",
+    "02": "Himachal Pradesh",
+    "03": "Punjab",
+    "04": "Chandigarh",
+    "05": "Uttarakhand",
+    "06": "Haryana",
+    "07": "Delhi",
+    "08": "Rajasthan",
+    "09": "Uttar Pradesh",
+    "10": "Bihar",
+    "11": "Sikkim",
+    "12": "Arunachal Pradesh",
+    "13": "Nagaland",
+    "14": "Manipur",
+    "15": "Mizoram",
+    "16": "Tripura",
+    "17": "Meghalaya",
+    "18": "Assam",
+    "19": "West Bengal",
+    "20": "Jharkhand",
+    "21": "Odisha",
+    "22": "Chhattisgarh",
+    "23": "Madhya Pradesh",
+    "24": "Gujarat",
+    "25": "Daman and Diu",
+    "26": "Dadra and Nagar Haveli and Daman and Diu",
+    "27": "Maharashtra",
+    "28": "Andhra Pradesh (old)",
+    "29": "Karnataka",
+    "30": "Goa",
+    "31": "Lakshadweep",
+    "32": "Kerala",
+    "33": "Tamil Nadu",
+    "34": "Puducherry",
+    "35": "Andaman and Nicobar Islands",
+    "36": "Telangana",
+    "37": "Andhra Pradesh",
+    "38": "Ladakh",
+    "97": "Other Territory",
+    "99": "Centre Jurisdiction",
+}
+
+# PAN holder type (fourth character of the PAN, sixth of the GSTIN)
+PAN_HOLDER_TYPES = {
+    "A": "Association of Persons",
+    "B": "Body of Individuals",
+    "C": "Company",
+    "F": "Firm",
+    "G": "Government",
+    "H": "Hindu Undivided Family",
+    "J": "Artificial Juridical Person",
+    "L": "Local Authority",
+    "P": "Individual",
+    "T": "Trust",
+}
+
+# Characters allowed at each position: state code, PAN (5 letters, 4
+# digits, 1 letter), entity number (never 0), default "Z", check digit
+DIGITS = "0123456789"
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+POSITION_CHARSETS = [
+    DIGITS, DIGITS,
+    LETTERS, LETTERS, LETTERS, "".join(PAN_HOLDER_TYPES), LETTERS,
+    DIGITS, DIGITS, DIGITS, DIGITS,
+    LETTERS,
+    GSTIN_CHARSET[1:],
+    GSTIN_CHARSET,
+    GSTIN_CHARSET,
+]
+
+# Outcome codes of a GSTIN check
+VALID, MALFORMED, UNKNOWN_STATE, BAD_CHECK_DIGIT = 0, 1, 2, 3
+
+OUTCOME_REASONS = {
+    VALID: "valid",
+    MALFORMED: "malformed",
+    UNKNOWN_STATE: "unknown_state",
+    BAD_CHECK_DIGIT: "bad_check_digit",
+}
+
+
+def normalize_gstin(value: Optional[str]) -> str:
+    """
+    Uppercase a GSTIN and drop the spaces and separators OCR and users add
+    """
+    return "".join(char for char in (value or "").upper() if char.isalnum())
+
+
+class GSTINValidator:
+    """
+    Local GSTIN validator: grammar, state code and the mod-36 check digit
+
+    Every check is a lookup in tables built once, indexed by character
+    code, so a batch of GSTINs is validated with a handful of NumPy
+    operations and no call to an external GST service.
+
+    The check digit is the GSTN's Luhn mod-36 variant: the first 14
+    characters are valued 0-35, alternately weighted 1 and 2, each
+    product is reduced to quotient + remainder by 36, and the check digit
+    brings the sum to a multiple of 36.
+    """
+
+    def __init__(self):
+        # Character code -> value 0-35, or -1
+        self._values = np.full(256, -1, dtype=np.int64)
+        for value, char in enumerate(GSTIN_CHARSET):
+            self._values[ord(char)] = value
+        # (position, character code) -> allowed
+        self._allowed = np.zeros((GSTIN_LENGTH, 256), dtype=bool)
+        for position, charset in enumerate(POSITION_CHARSETS):
+            self._allowed[position, [ord(char) for char in charset]] = True
+        # Two-digit state number -> known
+        self._states = np.zeros(100, dtype=bool)
+        self._states[[int(code) for code in STATE_CODES]] = True
+        self._weights = np.array([1, 2] * 7, dtype=np.int64)
+
+    def check_digit(self, prefix: str) -> str:
+        """
+        Compute the check digit of the first 14 characters of a GSTIN
+        """
+        values = self._values[np.frombuffer(prefix[:GSTIN_LENGTH - 1].encode("ascii"), dtype=np.uint8)]
+        products = values * self._weights
+        return GSTIN_CHARSET[-int((products // 36 + products % 36).sum()) % 36]
+
+    def check(self, gstins: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Check a batch of GSTINs
+
+        Returns:
+            Outcome code of each GSTIN (VALID, MALFORMED, UNKNOWN_STATE or BAD_CHECK_DIGIT)
+        """
+        count = len(gstins)
+        outcomes = np.full(count, MALFORMED, dtype=np.int8)
+        shaped = [
+            index for index, gstin in enumerate(gstins)
+            if isinstance(gstin, str) and len(gstin) == GSTIN_LENGTH and gstin.isascii()
+        ]
+        if not shaped:
+            return outcomes
+
+        codes = np.frombuffer("".join(gstins[index] for index in shaped).encode("ascii"), dtype=np.uint8)
+        codes = codes.reshape(len(shaped), GSTIN_LENGTH)
+        well_formed = self._allowed[np.arange(GSTIN_LENGTH), codes].all(axis=1)
+
+        states = (codes[:, 0].astype(np.int64) - ord("0")) * 10 + codes[:, 1] - ord("0")
+        known_state = self._states[np.clip(states, 0, 99)]
+
+        values = self._values[codes]
+        products = values[:, :GSTIN_LENGTH - 1] * self._weights
+        checks = (36 - (products // 36 + products % 36).sum(axis=1) % 36) % 36
+
+        outcomes[shaped] = np.select(
+            [~well_formed, ~known_state, checks != values[:, GSTIN_LENGTH - 1]],
+            [MALFORMED, UNKNOWN_STATE, BAD_CHECK_DIGIT],
+            VALID
+        )
+        return outcomes
+
+    def is_valid(self, gstin: Optional[str]) -> bool:
+        return bool(gstin) and int(self.check([gstin])[0]) == VALID
+
+    def decode(self, gstin: Optional[str]) -> Dict[str, Any]:
+        """
+        Decode a GSTIN into its state, PAN and entity number
+
+        Returns:
+            Dict[str, Any]: The outcome reason, and the decoded parts if the GSTIN is well formed
+        """
+        outcome = int(self.check([gstin])[0])
+        decoded: Dict[str, Any] = {"gstin": gstin, "valid": outcome == VALID, "reason": OUTCOME_REASONS[outcome]}
+        if outcome == MALFORMED:
+            return decoded
+        decoded.update({
+            "state_code": gstin[:2],
+            "state": STATE_CODES.get(gstin[:2]),
+            "pan": gstin[2:12],
+            "holder_type": PAN_HOLDER_TYPES.get(gstin[5]),
+            "entity_number": gstin[12],
+        })
+        return decoded
+
+gstin_validator = GSTINValidator()
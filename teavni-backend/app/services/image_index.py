@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
+import numpy as np
+from bson import ObjectId
+from app.core.config import settings
+from app.core.database import get_collection
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def _as_unsigned(image_hash: int) -> np.uint64:
+    # Image hashes are stored as signed BSON longs
+    return np.uint64(int(image_hash) & HASH_MASK)
+
+
+class ImageHashIndex:
+    """
+    In-memory index answering "which invoice images are within Hamming
+    distance k of this one" over the 64-bit page hashes
+
+    Multi-index hashing: the hash is cut into max_distance + 1 chunks, so
+    (pigeonhole) any hash within max_distance agrees exactly with the
+    query on at least one chunk. Each chunk has a sorted table, so a
+    search is a binary search per chunk plus a vectorized popcount over
+    the candidates it returns.
+
+    New invoices are picked up incrementally by `_id` and buffered; the
+    buffer is merged into the sorted tables every IMAGE_INDEX_MERGE_SIZE
+    hashes and the tables are saved to IMAGE_INDEX_PATH, so a restart
+    only reads the invoices created since the last save.
+    """
+
+    def __init__(self, path: str, max_distance: int):
+        self.path = path
+        self.max_distance = max_distance
+        chunk_count = max_distance + 1
+        sizes = [HASH_BITS // chunk_count + (1 if i < HASH_BITS % chunk_count else 0) for i in range(chunk_count)]
+        shifts = np.cumsum([0] + sizes[:-1])
+        self._chunks = [(np.uint64(shift), np.uint64((1 << size) - 1)) for shift, size in zip(shifts, sizes)]
+
+        self._reset()
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    def _reset(self) -> None:
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._ids = np.empty(0, dtype="V12")
+        self._keys: List[np.ndarray] = [np.empty(0, dtype=np.uint64) for _ in self._chunks]
+        self._orders: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in self._chunks]
+        # Invoices read since the last merge
+        self._pending: Dict[ObjectId, np.uint64] = {}
+        # Merged invoices inside the re-read window, to skip them on refresh
+        self._recent: Set[ObjectId] = set()
+        # Last invoice `_id` merged into the tables, and read at all
+        self._merged_checkpoint: Optional[ObjectId] = None
+        self._checkpoint: Optional[ObjectId] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._hashes) + len(self._pending)
+
+    async def search(self, image_hash: int, distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Find invoices whose image hash is within `distance` bits of `image_hash`
+
+        Returns:
+            (invoice ID, distance) pairs, closest first
+        """
+        distance = self.max_distance if distance is None else min(distance, self.max_distance)
+        await self.refresh()
+
+        query = _as_unsigned(image_hash)
+        candidates = [
+            order[np.searchsorted(keys, value, "left"):np.searchsorted(keys, value, "right")]
+            for (shift, mask), keys, order in zip(self._chunks, self._keys, self._orders)
+            for value in [(query >> shift) & mask]
+        ]
+        positions = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        distances = np.bitwise_count(self._hashes[positions] ^ query)
+        close = distances <= distance
+        matches = [
+            (ObjectId(bytes(invoice_id)), int(bits))
+            for invoice_id, bits in zip(self._ids[positions][close], distances[close])
+        ]
+
+        if self._pending:
+            pending_ids = list(self._pending)
+            pending_distances = np.bitwise_count(np.array(list(self._pending.values()), dtype=np.uint64) ^ query)
+            matches.extend(
+                (pending_ids[index], int(pending_distances[index]))
+                for index in np.flatnonzero(pending_distances <= distance)
+            )
+
+        return [(str(invoice_id), bits) for invoice_id, bits in sorted(matches, key=lambda match: match[1])]
+
+    async def refresh(self) -> None:
+        """
+        Load the saved index on first use and read invoices created since
+        """
+        async with self._lock:
+            if not self._loaded:
+                await asyncio.to_thread(self._load)
+                self._loaded = True
+
+            # ObjectIds from different workers are not created in commit
+            # order, so re-read a short window before the checkpoint
+            query: Dict[str, Any] = {"image_hash": {"$type": "long"}}
+            if self._checkpoint is not None:
+                query["_id"] = {"$gt": self._window_start()}
+            cursor = get_collection("invoices").find(query, {"image_hash": 1}).sort("_id", 1)
+            async for invoice in cursor:
+                invoice_id = invoice["_id"]
+                if invoice_id in self._recent:
+                    continue
+                self._pending[invoice_id] = _as_unsigned(invoice["image_hash"])
+                if self._checkpoint is None or invoice_id > self._checkpoint:
+                    self._checkpoint = invoice_id
+
+            if len(self._pending) >= settings.IMAGE_INDEX_MERGE_SIZE:
+                await asyncio.to_thread(self._merge)
+                await asyncio.to_thread(self._save)
+
+    def _window_start(self) -> Optional[ObjectId]:
+        if self._checkpoint is None:
+            return None
+        since = self._checkpoint.generation_time - timedelta(seconds=settings.IMAGE_INDEX_OVERLAP_SECONDS)
+        return ObjectId.from_datetime(since)
+
+    def _merge(self) -> None:
+        pending = dict(self._pending)
+        hashes = np.concatenate([self._hashes, np.array(list(pending.values()), dtype=np.uint64)])
+        ids = np.concatenate([self._ids, np.array([invoice_id.binary for invoice_id in pending], dtype="V12")])
+        self._build(hashes, ids)
+        for invoice_id in pending:
+            self._pending.pop(invoice_id, None)
+        self._merged_checkpoint = max(pending, default=self._merged_checkpoint)
+        window_start = self._window_start()
+        self._recent = {invoice_id for invoice_id in self._recent | set(pending) if invoice_id > window_start}
+        logger.info(f"Image hash index merged {len(pending)} invoices, {len(hashes)} indexed")
+
+    def _build(self, hashes: np.ndarray, ids: np.ndarray) -> None:
+        keys, orders = [], []
+        for shift, mask in self._chunks:
+            values = (hashes >> shift) & mask
+            order = np.argsort(values, kind="stable")
+            keys.append(values[order])
+            orders.append(order)
+        self._hashes, self._ids, self._keys, self._orders = hashes, ids, keys, orders
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A file of our own: other workers may be saving the index at the same time
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=directory or ".", prefix=f"{os.path.basename(self.path)}.", suffix=".tmp", delete=False
+        ) as f:
+            temporary_path = f.name
+            np.savez(
+                f,
+                hashes=self._hashes,
+                ids=self._ids,
+                max_distance=np.int64(self.max_distance),
+                checkpoint=np.frombuffer(self._merged_checkpoint.binary, dtype=np.uint8),
+                **{f"keys_{index}": keys for index, keys in enumerate(self._keys)},
+                **{f"orders_{index}": order for index, order in enumerate(self._orders)},
+            )
+        # Atomic replace: a crash mid-save leaves the previous index intact, and
+        # concurrent saves each replace it whole
+        try:
+            os.replace(temporary_path, self.path)
+        except OSError:
+            os.remove(temporary_path)
+            raise
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                if int(saved["max_distance"]) != self.max_distance:
+                    logger.info("Image hash index was saved for another distance, rebuilding it")
+                    return
+                self._hashes, self._ids = saved["hashes"], saved["ids"]
+                self._keys = [saved[f"keys_{index}"] for index in range(len(self._chunks))]
+                self._orders = [saved[f"orders_{index}"] for index in range(len(self._chunks))]
+                self._merged_checkpoint = ObjectId(saved["checkpoint"].tobytes())
+                self._checkpoint = self._merged_checkpoint
+            # ObjectIds start with their big-endian creation timestamp
+            timestamps = np.frombuffer(self._ids.tobytes(), dtype=">u4").reshape(-1, 3)[:, 0]
+            cutoff = int(self._window_start().generation_time.timestamp())
+            self._recent = {ObjectId(bytes(invoice_id)) for invoice_id in self._ids[timestamps >= cutoff]}
+            logger.info(f"Loaded image hash index with {len(self._hashes)} invoices")
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Could not load image hash index, rebuilding it: {str(e)}")
+            self._reset()
+
+image_hash_index = ImageHashIndex(settings.IMAGE_INDEX_PATH, settings.IMAGE_HASH_MAX_DISTANCE)
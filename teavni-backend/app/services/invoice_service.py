@@ -3,12 +3,19 @@ import shutil
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from fastapi import UploadFile, HTTPException, status
 from app.core.config import settings
 from app.core.database import get_collection
 from app.models.invoice import InvoiceCreate, InvoiceStatus, RiskTier
 from app.services.ocr_service import ocr_service
+from app.services.buyer_service import buyer_service
+from app.services.seller_feature_service import seller_feature_service
+from app.services.field_correction import field_corrector
+from app.services.dedup_service import dedup_service, normalize_invoice_number, DuplicateInvoiceError
 from app.services.validation_service import validation_service
+from app.services.event_bus import event_bus
 
 class InvoiceService:
     """
@@ -30,6 +37,7 @@ class InvoiceService:
         file_path = None
         ocr_data = None
         file_hash = None
+        image_hash = None
         
         if invoice_file:
             # Save the file
@@ -39,22 +47,24 @@ class InvoiceService:
             ocr_result = await ocr_service.process_invoice_file(file_path)
             ocr_data = ocr_result
             file_hash = ocr_result.get("hash")
+            image_hash = ocr_result.get("image_hash")
             
             # Merge OCR data with provided data
             # In a real application, you would have more sophisticated merging logic
             if not invoice_data.invoice_number and ocr_data.get("invoice_number"):
                 invoice_data.invoice_number = ocr_data["invoice_number"]
+                # Repair misread characters against the seller's invoice number shapes
+                correction = await field_corrector.correct_invoice_number(invoice_data.seller_id, ocr_data["invoice_number"])
+                if correction and correction["substitutions"]:
+                    ocr_data.setdefault("corrections", {})["invoice_number"] = correction
+                    if correction["confidence"] >= settings.OCR_CORRECTION_MIN_CONFIDENCE:
+                        invoice_data.invoice_number = correction["value"]
             if not invoice_data.amount and ocr_data.get("amount"):
                 invoice_data.amount = ocr_data["amount"]
             if not invoice_data.buyer_name and ocr_data.get("buyer_name"):
                 invoice_data.buyer_name = ocr_data["buyer_name"]
-        
-        # Process supporting documents if provided
-        supporting_doc_paths = []
-        if supporting_docs:
-            for doc in supporting_docs:
-                doc_path = await InvoiceService._save_uploaded_file(doc, "supporting")
-                supporting_doc_paths.append(doc_path)
+            if not invoice_data.buyer_gstin and ocr_data.get("buyer_gstin"):
+                invoice_data.buyer_gstin = ocr_data["buyer_gstin"]
         
         # Create invoice dict
         invoice_dict = invoice_data.dict()
@@ -65,12 +75,53 @@ class InvoiceService:
         invoice_dict["file_path"] = file_path
         invoice_dict["ocr_data"] = ocr_data
         invoice_dict["hash"] = file_hash
-        invoice_dict["supporting_documents"] = supporting_doc_paths
+        invoice_dict["image_hash"] = image_hash
+        invoice_dict["normalized_invoice_number"] = normalize_invoice_number(invoice_data.invoice_number)
         invoice_dict["funded_amount"] = 0.0
         invoice_dict["available_amount"] = float(invoice_data.amount)  # Set available amount to the invoice amount
         
+        # Refuse exact duplicates before anything else is stored; near duplicates are flagged by validation
+        try:
+            invoice_dict["possible_duplicates"] = await dedup_service.check_invoice(invoice_dict)
+        except DuplicateInvoiceError:
+            InvoiceService._remove_files([file_path])
+            raise
+        invoice_dict["near_duplicates"] = await dedup_service.find_similar_images(image_hash)
+        
+        # Process supporting documents if provided
+        supporting_doc_paths = []
+        if supporting_docs:
+            for doc in supporting_docs:
+                doc_path = await InvoiceService._save_uploaded_file(doc, "supporting")
+                supporting_doc_paths.append(doc_path)
+        invoice_dict["supporting_documents"] = supporting_doc_paths
+        
+        # Resolve the buyer to its registry entry
+        invoice_dict["buyer_id"] = await buyer_service.resolve_buyer(invoice_data.buyer_name, invoice_data.buyer_gstin)
+        
+        # Compare with the seller's history before this invoice joins it
+        invoice_dict["seller_profile"] = await seller_feature_service.screen(invoice_dict)
+        
         # Insert into database
-        result = await invoices_collection.insert_one(invoice_dict)
+        try:
+            result = await invoices_collection.insert_one(invoice_dict)
+        except DuplicateKeyError:
+            # The same file was submitted concurrently
+            InvoiceService._remove_files([file_path, *supporting_doc_paths])
+            existing = await invoices_collection.find_one(
+                {"hash": file_hash, "status": {"$ne": InvoiceStatus.REJECTED}}, {"_id": 1}
+            )
+            raise DuplicateInvoiceError(
+                "This invoice file was already submitted",
+                str(existing["_id"]) if existing else None
+            )
+        
+        await event_bus.emit_change("invoices", invoice_dict)
+        
+        if invoice_dict["buyer_id"]:
+            await buyer_service.record_invoice(invoice_dict["buyer_id"], invoice_dict["amount"], invoice_dict["invoice_date"])
+        await seller_feature_service.record(invoice_dict)
+        field_corrector.remember_invoice_number(invoice_data.seller_id, invoice_data.invoice_number)
         
         # Run validation
         invoice_id = str(result.inserted_id)
@@ -107,18 +158,28 @@ class InvoiceService:
         
         return file_path
     
+    @staticmethod
+    def _remove_files(paths: List[Optional[str]]) -> None:
+        """
+        Remove uploaded files of an invoice that was not created
+        """
+        for path in paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+    
     @staticmethod
     async def get_invoice_by_id(invoice_id: str) -> Optional[Dict[str, Any]]:
         """
         Get an invoice by ID
         """
         invoices_collection = get_collection("invoices")
-        invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)})
+        invoice = await invoices_collection.find_one({"_id": ObjectId(invoice_id)}, {"reservations": 0})
         
         if invoice:
             # Convert ObjectId to string for the response
             invoice["id"] = str(invoice["_id"])
             invoice["seller_id"] = str(invoice["seller_id"])
+            invoice["buyer_id"] = str(invoice["buyer_id"]) if invoice.get("buyer_id") else None
             del invoice["_id"]
         
         return invoice
@@ -146,13 +207,14 @@ class InvoiceService:
             query["risk_tier"] = risk_tier
         
         # Execute query
-        cursor = invoices_collection.find(query).skip(skip).limit(limit)
+        cursor = invoices_collection.find(query, {"reservations": 0}).skip(skip).limit(limit)
         invoices = []
         
         async for invoice in cursor:
             # Convert ObjectId to string for the response
             invoice["id"] = str(invoice["_id"])
             invoice["seller_id"] = str(invoice["seller_id"])
+            invoice["buyer_id"] = str(invoice["buyer_id"]) if invoice.get("buyer_id") else None
             del invoice["_id"]
             invoices.append(invoice)
         
@@ -167,10 +229,14 @@ class InvoiceService:
         
         update_data["updated_at"] = datetime.utcnow()
         
-        await invoices_collection.update_one(
+        invoice = await invoices_collection.find_one_and_update(
             {"_id": ObjectId(invoice_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"reservations": 0},
+            return_document=ReturnDocument.AFTER
         )
+        if invoice:
+            await event_bus.emit_change("invoices", invoice, update_data)
         
         return await InvoiceService.get_invoice_by_id(invoice_id)
     
@@ -196,6 +262,7 @@ class InvoiceService:
         
         # Delete from database
         result = await invoices_collection.delete_one({"_id": ObjectId(invoice_id)})
+        await get_collection("starred_invoices").delete_many({"invoice_id": ObjectId(invoice_id)})
         
         return result.deleted_count > 0
 
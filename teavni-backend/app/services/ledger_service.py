@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+
+GENESIS_HASH = "0" * 64
+
+
+class ConsentLedgerService:
+    """
+    Append-only, hash-chained consent ledger, one chain per invoice.
+
+    Every entry stores its height in the chain, the SHA-256 of the previous
+    entry and its own SHA-256 over a canonical encoding of its content.
+    A unique (invoice_id, height) index makes concurrent appends safe: the
+    loser of a race gets a duplicate key error and retries on the new tip.
+    Verification checkpoints the last verified height and hash per invoice,
+    so re-verifying a long ledger only hashes the entries added since.
+    """
+
+    @staticmethod
+    def _canonical_details(details: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Store details as JSON primitives so the hash is stable across a database round trip
+        return json.loads(json.dumps(details or {}, sort_keys=True, default=str))
+
+    @staticmethod
+    def compute_hash(entry: Dict[str, Any]) -> str:
+        """
+        Compute the SHA-256 of a ledger entry's content
+        """
+        payload = {
+            "invoice_id": str(entry["invoice_id"]),
+            "consent_id": str(entry["consent_id"]) if entry.get("consent_id") else None,
+            "height": entry["height"],
+            "status": entry["status"],
+            "entry": entry["entry"],
+            "details": entry["details"],
+            "timestamp": entry["timestamp"].isoformat(timespec="milliseconds"),
+            "prev_hash": entry["prev_hash"],
+        }
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _new_entry(
+        invoice_id: ObjectId,
+        consent_id: Optional[ObjectId],
+        status: str,
+        entry: str,
+        details: Optional[Dict[str, Any]],
+        height: int,
+        prev_hash: str,
+        timestamp: datetime
+    ) -> Dict[str, Any]:
+        ledger_entry = {
+            "invoice_id": invoice_id,
+            "consent_id": consent_id,
+            "height": height,
+            "status": getattr(status, "value", status),
+            "entry": entry,
+            "details": ConsentLedgerService._canonical_details(details),
+            # MongoDB stores milliseconds; truncate so the hash survives the round trip
+            "timestamp": timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000),
+            "prev_hash": prev_hash,
+        }
+        ledger_entry["hash"] = ConsentLedgerService.compute_hash(ledger_entry)
+        return ledger_entry
+
+    @staticmethod
+    async def _tips(invoice_ids: List[ObjectId]) -> Dict[ObjectId, Dict[str, Any]]:
+        """
+        Get the latest entry (height and hash) of each invoice's ledger in one query
+        """
+        ledger_collection = get_collection("consent_ledger")
+        cursor = ledger_collection.aggregate([
+            {"$match": {"invoice_id": {"$in": invoice_ids}}},
+            {"$sort": {"invoice_id": 1, "height": -1}},
+            {"$group": {"_id": "$invoice_id", "height": {"$first": "$height"}, "hash": {"$first": "$hash"}}},
+        ])
+        return {tip["_id"]: tip async for tip in cursor}
+
+    @staticmethod
+    async def append_entry(
+        invoice_id: ObjectId,
+        status: str,
+        entry: str,
+        details: Optional[Dict[str, Any]] = None,
+        consent_id: Optional[ObjectId] = None
+    ) -> Dict[str, Any]:
+        """
+        Append an entry to an invoice's ledger
+        """
+        ledger_collection = get_collection("consent_ledger")
+        invoice_id = ObjectId(invoice_id)
+        consent_id = ObjectId(consent_id) if consent_id else None
+
+        while True:
+            tip = (await ConsentLedgerService._tips([invoice_id])).get(invoice_id)
+            ledger_entry = ConsentLedgerService._new_entry(
+                invoice_id, consent_id, status, entry, details,
+                height=tip["height"] + 1 if tip else 0,
+                prev_hash=tip["hash"] if tip else GENESIS_HASH,
+                timestamp=datetime.utcnow()
+            )
+            try:
+                await ledger_collection.insert_one(ledger_entry)
+                return ledger_entry
+            except DuplicateKeyError:
+                # Another writer appended first; chain onto the new tip
+                continue
+
+    @staticmethod
+    async def append_entries(entries: List[Dict[str, Any]]) -> None:
+        """
+        Append entries to several invoices' ledgers with a single insert_many
+
+        Each item has invoice_id, status, entry and optionally details and
+        consent_id. The first entry per invoice goes into the batch; entries
+        that lose an append race, and any further entries for the same
+        invoice, are appended one by one afterwards in order.
+        """
+        if not entries:
+            return
+
+        ledger_collection = get_collection("consent_ledger")
+        batch, deferred, seen = [], [], set()
+        for item in entries:
+            if item["invoice_id"] in seen:
+                deferred.append(item)
+            else:
+                seen.add(item["invoice_id"])
+                batch.append(item)
+
+        tips = await ConsentLedgerService._tips([item["invoice_id"] for item in batch])
+        now = datetime.utcnow()
+        ledger_entries = []
+        for item in batch:
+            tip = tips.get(item["invoice_id"])
+            ledger_entries.append(ConsentLedgerService._new_entry(
+                item["invoice_id"], item.get("consent_id"), item["status"], item["entry"], item.get("details"),
+                height=tip["height"] + 1 if tip else 0,
+                prev_hash=tip["hash"] if tip else GENESIS_HASH,
+                timestamp=now
+            ))
+
+        try:
+            await ledger_collection.insert_many(ledger_entries, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in write_errors):
+                raise
+            deferred = [batch[error["index"]] for error in sorted(write_errors, key=lambda error: error["index"])] + deferred
+
+        for item in deferred:
+            await ConsentLedgerService.append_entry(
+                item["invoice_id"], item["status"], item["entry"], item.get("details"), item.get("consent_id")
+            )
+
+    @staticmethod
+    async def get_ledger(invoice_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get an invoice's ledger entries in chain order
+        """
+        ledger_collection = get_collection("consent_ledger")
+        cursor = ledger_collection.find({"invoice_id": ObjectId(invoice_id)}).sort("height", 1).skip(skip).limit(limit)
+        entries = []
+
+        async for ledger_entry in cursor:
+            # Convert ObjectId to string for the response
+            ledger_entry["id"] = str(ledger_entry["_id"])
+            ledger_entry["invoice_id"] = str(ledger_entry["invoice_id"])
+            if ledger_entry.get("consent_id"):
+                ledger_entry["consent_id"] = str(ledger_entry["consent_id"])
+            del ledger_entry["_id"]
+            entries.append(ledger_entry)
+
+        return entries
+
+    @staticmethod
+    async def verify_ledger(invoice_id: str, full: bool = False) -> Dict[str, Any]:
+        """
+        Verify an invoice's hash chain
+
+        Starts from the last verified checkpoint unless `full` is set, so
+        repeated verification only hashes new entries. The checkpoint only
+        advances over entries that verified.
+        """
+        ledger_collection = get_collection("consent_ledger")
+        checkpoints_collection = get_collection("consent_ledger_checkpoints")
+        invoice_oid = ObjectId(invoice_id)
+
+        checkpoint = None if full else await checkpoints_collection.find_one({"_id": invoice_oid})
+        height = checkpoint["height"] if checkpoint else -1
+        prev_hash = checkpoint["hash"] if checkpoint else GENESIS_HASH
+
+        cursor = ledger_collection.find({"invoice_id": invoice_oid, "height": {"$gt": height}}).sort("height", 1)
+        verified = 0
+        error = None
+
+        async for ledger_entry in cursor:
+            if ledger_entry["height"] != height + 1:
+                error = f"Missing entry at height {height + 1}"
+                break
+            if ledger_entry["prev_hash"] != prev_hash:
+                error = f"Broken link at height {ledger_entry['height']}"
+                break
+            if ConsentLedgerService.compute_hash(ledger_entry) != ledger_entry["hash"]:
+                error = f"Hash mismatch at height {ledger_entry['height']}"
+                break
+            height = ledger_entry["height"]
+            prev_hash = ledger_entry["hash"]
+            verified += 1
+
+        if verified:
+            await checkpoints_collection.update_one(
+                {"_id": invoice_oid},
+                {"$set": {"height": height, "hash": prev_hash, "verified_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+        return {
+            "invoice_id": invoice_id,
+            "valid": error is None,
+            "height": height,
+            "tip_hash": prev_hash,
+            "verified_entries": verified,
+            "error": error,
+        }
+
+    @staticmethod
+    async def verify_all(full: bool = False, concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Verify every invoice's ledger, several ledgers at a time
+
+        Invoice IDs are read in batches from the (invoice_id, height) index,
+        so memory and pending work stay bounded however many ledgers exist.
+        """
+        ledger_collection = get_collection("consent_ledger")
+        slots = asyncio.Semaphore(concurrency or settings.LEDGER_VERIFY_CONCURRENCY)
+
+        async def verify(invoice_id: ObjectId) -> Dict[str, Any]:
+            async with slots:
+                return await ConsentLedgerService.verify_ledger(str(invoice_id), full=full)
+
+        ledgers = 0
+        verified_entries = 0
+        invalid = []
+        last_id = None
+        while True:
+            # A batch is bounded by entries rather than ledgers, so it is a short
+            # index-only scan; a ledger cut off at the end is not read again
+            query = {"invoice_id": {"$gt": last_id}} if last_id else {}
+            entries = await ledger_collection.find(query, {"_id": 0, "invoice_id": 1}).sort("invoice_id", 1) \
+                .limit(settings.LEDGER_VERIFY_BATCH_SIZE).to_list(length=None)
+            if not entries:
+                break
+            invoice_ids = list(dict.fromkeys(entry["invoice_id"] for entry in entries))
+            last_id = invoice_ids[-1]
+
+            results = await asyncio.gather(*(verify(invoice_id) for invoice_id in invoice_ids))
+            ledgers += len(results)
+            verified_entries += sum(result["verified_entries"] for result in results)
+            invalid.extend(result for result in results if not result["valid"])
+
+        return {
+            "ledgers": ledgers,
+            "verified_entries": verified_entries,
+            "invalid": invalid,
+        }
+
+ledger_service = ConsentLedgerService()
@@ -1,10 +1,17 @@
 import os
+import uuid
+import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 from app.core.config import settings
 from app.core.database import get_collection
-from app.utils.email_utils import send_email
+from app.utils.email_utils import OutgoingMessage, build_email, send_emails
+from app.services.ledger_service import ledger_service
+from app.services.event_bus import event_bus
+from app.models.invoice import InvoiceStatus
 from app.models.legalbot import (
     ConsentStatus, 
     NotificationType, 
@@ -14,6 +21,38 @@ from app.models.legalbot import (
     NotificationCreate
 )
 
+# Invoice status that follows from a buyer's consent decision
+CONSENT_OUTCOMES = {
+    ConsentStatus.ACKNOWLEDGED.value: InvoiceStatus.VALIDATED.value,
+    ConsentStatus.DISPUTED.value: InvoiceStatus.REJECTED.value,
+}
+
+# Notification types with a delivery provider; others fail without being queued
+DELIVERABLE_NOTIFICATION_TYPES = {NotificationType.EMAIL.value, NotificationType.WHATSAPP.value}
+
+# Consent records never change invoice, so consent -> invoice IDs can be cached
+_consent_invoice_ids: "OrderedDict[str, ObjectId]" = OrderedDict()
+_CONSENT_INVOICE_CACHE_SIZE = 10000
+
+
+def _remember_consent_invoice(consent_id: str, invoice_id: ObjectId) -> None:
+    _consent_invoice_ids[consent_id] = invoice_id
+    _consent_invoice_ids.move_to_end(consent_id)
+    if len(_consent_invoice_ids) > _CONSENT_INVOICE_CACHE_SIZE:
+        _consent_invoice_ids.popitem(last=False)
+
+
+def _link_reference(field: str, reference_id: ObjectId) -> Dict[str, Any]:
+    """
+    Update that appends a reference to a consent record's bounded recent list and bumps its counter
+    """
+    count_field = "log_count" if field == "logs" else "notification_count"
+    return {
+        "$push": {field: {"$each": [reference_id], "$slice": -settings.CONSENT_RECENT_REFERENCES}},
+        "$inc": {count_field: 1}
+    }
+
+
 class LegalBotService:
     """
     Service for LegalBot consent management
@@ -49,6 +88,8 @@ class LegalBotService:
             "consent_window_end": consent_window_end,
             "notifications": [],
             "logs": [],
+            "notification_count": 0,
+            "log_count": 0,
             "ledger_entry": None
         }
         
@@ -83,6 +124,7 @@ class LegalBotService:
         # Log event
         await LegalBotService.log_consent_event(
             consent_id=consent_id,
+            invoice_id=consent_record["invoice_id"],
             event=ConsentEvent.NOTIFICATION_SENT,
             details={
                 "invoice_id": consent_data.invoice_id,
@@ -106,15 +148,7 @@ class LegalBotService:
         record = await consent_collection.find_one({"_id": ObjectId(consent_id)})
         
         if record:
-            # Convert ObjectId to string for the response
-            record["id"] = str(record["_id"])
-            record["invoice_id"] = str(record["invoice_id"])
-            
-            # Convert notification and log IDs to strings
-            record["notifications"] = [str(nid) for nid in record["notifications"]]
-            record["logs"] = [str(lid) for lid in record["logs"]]
-            
-            del record["_id"]
+            record = LegalBotService._serialize_consent_record(record)
         
         return record
     
@@ -127,16 +161,46 @@ class LegalBotService:
         record = await consent_collection.find_one({"invoice_id": ObjectId(invoice_id)})
         
         if record:
+            record = LegalBotService._serialize_consent_record(record)
+        
+        return record
+    
+    @staticmethod
+    async def list_consent_logs(consent_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List the full event history of a consent record, newest first
+
+        Consent records only keep the most recent log references, so the
+        complete history is read from consent_logs by consent_id.
+        """
+        logs_collection = get_collection("consent_logs")
+        cursor = logs_collection.find({"consent_id": ObjectId(consent_id)}).sort("timestamp", -1).skip(skip).limit(limit)
+        logs = []
+        
+        async for log in cursor:
             # Convert ObjectId to string for the response
-            record["id"] = str(record["_id"])
-            record["invoice_id"] = str(record["invoice_id"])
-            
-            # Convert notification and log IDs to strings
-            record["notifications"] = [str(nid) for nid in record["notifications"]]
-            record["logs"] = [str(lid) for lid in record["logs"]]
-            
-            del record["_id"]
+            log["id"] = str(log["_id"])
+            log["consent_id"] = consent_id
+            log["invoice_id"] = str(log["invoice_id"])
+            del log["_id"]
+            logs.append(log)
         
+        return logs
+    
+    @staticmethod
+    def _serialize_consent_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a consent record document for the response
+        """
+        # Convert ObjectId to string for the response
+        record["id"] = str(record["_id"])
+        record["invoice_id"] = str(record["invoice_id"])
+        
+        # Convert notification and log IDs to strings
+        record["notifications"] = [str(nid) for nid in record.get("notifications", [])]
+        record["logs"] = [str(lid) for lid in record.get("logs", [])]
+        
+        del record["_id"]
         return record
     
     @staticmethod
@@ -176,6 +240,15 @@ class LegalBotService:
             {"$set": update_data}
         )
         
+        # Append to the invoice's hash-chained ledger
+        await ledger_service.append_entry(
+            invoice_id=record["invoice_id"],
+            consent_id=record["_id"],
+            status=status,
+            entry=ledger_entry,
+            details=details
+        )
+        
         # Log event
         event = ConsentEvent.EXPLICIT_CONSENT
         if status == ConsentStatus.DISPUTED:
@@ -187,28 +260,15 @@ class LegalBotService:
         
         await LegalBotService.log_consent_event(
             consent_id=consent_id,
+            invoice_id=record["invoice_id"],
             event=event,
             details=details
         )
         
-        # Update invoice status based on consent status
-        invoice_id = str(record["invoice_id"])
-        invoices_collection = get_collection("invoices")
-        
-        from app.models.invoice import InvoiceStatus
-        
-        if status == ConsentStatus.ACKNOWLEDGED:
-            # If consent is acknowledged (explicitly or passively), update invoice to VALIDATED
-            await invoices_collection.update_one(
-                {"_id": record["invoice_id"]},
-                {"$set": {"status": InvoiceStatus.VALIDATED, "updated_at": datetime.utcnow()}}
-            )
-        elif status == ConsentStatus.DISPUTED:
-            # If consent is disputed, update invoice to REJECTED
-            await invoices_collection.update_one(
-                {"_id": record["invoice_id"]},
-                {"$set": {"status": InvoiceStatus.REJECTED, "updated_at": datetime.utcnow()}}
-            )
+        # The invoice follows the consent decision in the same request; the
+        # consent event's handler only repeats it if this write was lost
+        await LegalBotService.apply_consent_outcome(record["invoice_id"], status)
+        await event_bus.emit_change("consent_records", {**record, **update_data}, update_data)
         
         # Get the updated record
         updated_record = await LegalBotService.get_consent_record(consent_id)
@@ -216,40 +276,201 @@ class LegalBotService:
         return updated_record if updated_record else {}
     
     @staticmethod
-    async def check_passive_consent() -> List[Dict[str, Any]]:
+    async def apply_consent_outcome(invoice_id: ObjectId, consent_status: str) -> None:
+        """
+        Move an invoice to VALIDATED or REJECTED once its consent is decided
+
+        Invoices already there are skipped, so repeating it does not write again.
+        """
+        new_status = CONSENT_OUTCOMES.get(getattr(consent_status, "value", consent_status))
+        if new_status is None:
+            return
+        now = datetime.utcnow()
+        update_data = {"status": new_status, "updated_at": now}
+        if new_status == InvoiceStatus.VALIDATED.value:
+            # Open the invoice for funding in the same write
+            update_data["available_amount"] = {"$ifNull": ["$available_amount", "$amount"]}
+        invoice = await get_collection("invoices").find_one_and_update(
+            {"_id": invoice_id, "status": {"$ne": new_status}},
+            [{"$set": update_data}],
+            projection={"reservations": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if invoice:
+            await event_bus.emit_change("invoices", invoice, {
+                "status": new_status,
+                "updated_at": now,
+                **({"available_amount": invoice.get("available_amount")} if "available_amount" in update_data else {})
+            })
+    
+    @staticmethod
+    async def check_passive_consent(
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         Check for passive consent (no response within consent window)
+
+        Expired PENDING records are processed in batches: each batch is
+        claimed with a lease (so concurrent sweeps on other workers skip
+        it), then acknowledged with one bulk_write, one insert_many for the
+        consent logs and one update_many for the invoices, whose change
+        events go out as for any other invoice write. `max_batches`
+        bounds the work done per call; by default the backlog is drained.
         """
-        consent_collection = get_collection("consent_records")
+        batch_size = batch_size or settings.CONSENT_SWEEP_BATCH_SIZE
+        sweep_id = str(uuid.uuid4())
+        updated_records = []
+        batches = 0
         
-        # Find records with expired consent window and still in PENDING status
+        while max_batches is None or batches < max_batches:
+            batches += 1
+            batch = await LegalBotService._claim_expired_consents(sweep_id, batch_size)
+            if not batch:
+                break
+            
+            updated_records.extend(await LegalBotService._acknowledge_passive_consents(sweep_id, batch))
+            
+            if len(batch) < batch_size:
+                break
+        
+        return updated_records
+    
+    @staticmethod
+    async def _claim_expired_consents(sweep_id: str, batch_size: int) -> List[Dict[str, Any]]:
+        """
+        Lease a batch of expired PENDING consent records to this sweep
+        """
+        consent_collection = get_collection("consent_records")
         now = datetime.utcnow()
-        query = {
+        claimable = {
             "status": ConsentStatus.PENDING,
-            "consent_window_end": {"$lt": now}
+            "consent_window_end": {"$lt": now},
+            "$or": [
+                {"sweep_lease_until": None},
+                {"sweep_lease_until": {"$lt": now}}
+            ]
         }
         
-        cursor = consent_collection.find(query)
-        updated_records = []
+        cursor = consent_collection.find(claimable, {"_id": 1}).sort("consent_window_end", 1).limit(batch_size)
+        candidate_ids = [record["_id"] async for record in cursor]
+        if not candidate_ids:
+            return []
+        
+        # Another sweep may have claimed some candidates in the meantime; the
+        # filter is re-checked atomically per document, so each is leased once
+        await consent_collection.update_many(
+            {"_id": {"$in": candidate_ids}, **claimable},
+            {"$set": {
+                "sweep_id": sweep_id,
+                "sweep_lease_until": now + timedelta(seconds=settings.CONSENT_SWEEP_LEASE_SECONDS)
+            }}
+        )
         
-        async for record in cursor:
-            consent_id = str(record["_id"])
-            
-            # Update to ACKNOWLEDGED status (passive consent)
-            updated_record = await LegalBotService.update_consent_status(
-                consent_id=consent_id,
-                status=ConsentStatus.ACKNOWLEDGED,
-                details={"passive_consent": True}
-            )
-            
-            # Log passive consent event
-            await LegalBotService.log_consent_event(
-                consent_id=consent_id,
-                event=ConsentEvent.PASSIVE_CONSENT,
-                details={"consent_window_end": record["consent_window_end"].isoformat()}
+        cursor = consent_collection.find({"_id": {"$in": candidate_ids}, "sweep_id": sweep_id})
+        return [record async for record in cursor]
+    
+    @staticmethod
+    async def _acknowledge_passive_consents(sweep_id: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Record passive consent for a leased batch in three bulk writes
+        """
+        now = datetime.utcnow()
+        details = {"passive_consent": True}
+        ledger_entry = LegalBotService._generate_ledger_entry({}, ConsentStatus.ACKNOWLEDGED, details)
+        
+        log_entries = []
+        consent_updates = []
+        for record in records:
+            log_entry = {
+                "_id": ObjectId(),
+                "consent_id": record["_id"],
+                "invoice_id": record["invoice_id"],
+                "event": ConsentEvent.PASSIVE_CONSENT,
+                "timestamp": now,
+                "details": {**details, "consent_window_end": record["consent_window_end"].isoformat()},
+                "ip_address": None,
+                "user_agent": None
+            }
+            log_entries.append(log_entry)
+            consent_updates.append(UpdateOne(
+                {"_id": record["_id"], "sweep_id": sweep_id, "status": ConsentStatus.PENDING},
+                {
+                    "$set": {
+                        "status": ConsentStatus.ACKNOWLEDGED,
+                        "updated_at": now,
+                        "ledger_entry": ledger_entry
+                    },
+                    "$unset": {"sweep_lease_until": ""},
+                    **_link_reference("logs", log_entry["_id"])
+                }
+            ))
+        
+        consent_collection = get_collection("consent_records")
+        result = await consent_collection.bulk_write(consent_updates, ordered=False)
+        
+        if result.modified_count < len(records):
+            # Some records changed status (e.g. an explicit dispute) after being
+            # claimed; only log and validate the ones this sweep acknowledged
+            cursor = consent_collection.find(
+                {
+                    "_id": {"$in": [record["_id"] for record in records]},
+                    "sweep_id": sweep_id,
+                    "status": ConsentStatus.ACKNOWLEDGED
+                },
+                {"_id": 1}
             )
-            
-            updated_records.append(updated_record)
+            acknowledged_ids = {record["_id"] async for record in cursor}
+            pairs = [
+                (record, log_entry) for record, log_entry in zip(records, log_entries)
+                if record["_id"] in acknowledged_ids
+            ]
+            if not pairs:
+                return []
+            records, log_entries = (list(items) for items in zip(*pairs))
+        
+        await get_collection("consent_logs").insert_many(log_entries, ordered=False)
+        invoice_ids = [record["invoice_id"] for record in records]
+        invoices_collection = get_collection("invoices")
+        await invoices_collection.update_many(
+            {"_id": {"$in": invoice_ids}},
+            # Open the invoices for funding in the same write
+            [{"$set": {
+                "status": InvoiceStatus.VALIDATED.value,
+                "updated_at": now,
+                "available_amount": {"$ifNull": ["$available_amount", "$amount"]}
+            }}]
+        )
+        if not event_bus.streaming:
+            # Without change streams nothing else reports the bulk write
+            async for invoice in invoices_collection.find({"_id": {"$in": invoice_ids}}, {"reservations": 0}):
+                await event_bus.emit_change("invoices", invoice, {
+                    "status": invoice["status"],
+                    "updated_at": now,
+                    "available_amount": invoice.get("available_amount")
+                })
+        await ledger_service.append_entries([
+            {
+                "invoice_id": record["invoice_id"],
+                "consent_id": record["_id"],
+                "status": ConsentStatus.ACKNOWLEDGED,
+                "entry": ledger_entry,
+                "details": details
+            }
+            for record in records
+        ])
+        
+        updated_records = []
+        for record, log_entry in zip(records, log_entries):
+            record.update({
+                "status": ConsentStatus.ACKNOWLEDGED,
+                "updated_at": now,
+                "ledger_entry": ledger_entry
+            })
+            record.pop("sweep_lease_until", None)
+            record["logs"] = (record.get("logs", []) + [log_entry["_id"]])[-settings.CONSENT_RECENT_REFERENCES:]
+            record["log_count"] = record.get("log_count", 0) + 1
+            updated_records.append(LegalBotService._serialize_consent_record(record))
         
         return updated_records
     
@@ -259,120 +480,130 @@ class LegalBotService:
         consent_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Send a notification and record it
+        Queue a notification for delivery and record it
+
+        The notification is stored as QUEUED and delivered by the background
+        notification dispatcher, so callers do not wait on the provider.
+        Types without a provider are stored as FAILED straight away.
         """
+        from app.services.notification_dispatcher import notification_dispatcher
+        
         notifications_collection = get_collection("notifications")
         
         # Create notification record
+        now = datetime.utcnow()
+        deliverable = notification_data.type in DELIVERABLE_NOTIFICATION_TYPES
         notification = {
             "invoice_id": ObjectId(notification_data.invoice_id),
+            "consent_id": ObjectId(consent_id) if consent_id else None,
             "type": notification_data.type,
             "recipient": notification_data.recipient,
-            "status": NotificationStatus.QUEUED,
+            "status": NotificationStatus.QUEUED if deliverable else NotificationStatus.FAILED,
             "sent_at": None,
             "delivered_at": None,
             "read_at": None,
             "message_id": None,
             "content": notification_data.content,
-            "metadata": notification_data.metadata
+            "metadata": notification_data.metadata,
+            "attempts": 0,
+            "next_attempt_at": now if deliverable else None,
+            "last_error": None if deliverable else f"No provider for {NotificationType(notification_data.type).value} notifications",
+            "created_at": now
         }
         
         # Insert into database
         result = await notifications_collection.insert_one(notification)
         notification_id = result.inserted_id
         
-        # Send the actual notification based on type
-        success = False
-        message_id = None
-        
-        if notification_data.type == NotificationType.EMAIL:
-            # Get invoice details for CC
-            invoices_collection = get_collection("invoices")
-            invoice = await invoices_collection.find_one({"_id": ObjectId(notification_data.invoice_id)})
-            
-            if invoice and "seller_email" in invoice:
-                # If this is an email notification and we have email content in dictionary format
-                if isinstance(notification_data.metadata, dict) and "email_content" in notification_data.metadata:
-                    email_content = notification_data.metadata["email_content"]
-                    subject = email_content.get("subject", "TEVANI Invoice Notification")
-                    body = email_content.get("body", notification_data.content)
-                    
-                    # Send email with CC to seller
-                    success = await send_email(
-                        subject=subject,
-                        body=body,
-                        to_email=notification_data.recipient,
-                        cc_email=invoice.get("seller_email")
-                    )
-                else:
-                    # Get email content from invoice
-                    email_data = LegalBotService._generate_email_content(invoice)
-                    
-                    # Send email with CC to seller
-                    success = await send_email(
-                        subject=email_data["subject"],
-                        body=email_data["body"],
-                        to_email=notification_data.recipient,
-                        cc_email=invoice.get("seller_email")
-                    )
-                
-                if success:
-                    message_id = f"email_{notification_id}"
-            else:
-                # Fallback if we don't have seller email
-                success = await send_email(
-                    subject="TEVANI Invoice Notification",
-                    body=notification_data.content,
-                    to_email=notification_data.recipient
-                )
-                if success:
-                    message_id = f"email_{notification_id}"
-        
-        elif notification_data.type == NotificationType.WHATSAPP:
-            # In a real application, integrate with WhatsApp API here
-            # For demo purposes, we'll just mark it as sent
-            success = True
-            message_id = f"whatsapp_{notification_id}"
-        
-        # Update notification status based on sending result
-        status = NotificationStatus.SENT if success else NotificationStatus.FAILED
-        update_data = {
-            "status": status,
-            "sent_at": datetime.utcnow() if success else None
-        }
-        
-        # Log the result
-        if success:
-            print(f"Successfully sent {notification_data.type} notification to {notification_data.recipient}")
-        else:
-            print(f"Failed to send {notification_data.type} notification to {notification_data.recipient}. " +
-                  "Check email settings and ensure you're using an App Password for Gmail.")
-        
-        if message_id:
-            update_data["message_id"] = message_id
-            
-        await notifications_collection.update_one(
-            {"_id": notification_id},
-            {"$set": update_data}
-        )
-        
         # If consent_id is provided, add notification to consent record
         if consent_id:
             consent_collection = get_collection("consent_records")
             await consent_collection.update_one(
                 {"_id": ObjectId(consent_id)},
-                {"$push": {"notifications": notification_id}}
+                _link_reference("notifications", notification_id)
             )
         
-        # Get the created notification
-        created_notification = await notifications_collection.find_one({"_id": notification_id})
+        # Let a local dispatcher pick it up without waiting for its next poll
+        if deliverable:
+            notification_dispatcher.wake()
         
         # Convert ObjectId to string for the response
-        created_notification["id"] = str(created_notification["_id"])
-        created_notification["invoice_id"] = str(created_notification["invoice_id"])
-        del created_notification["_id"]
+        notification["id"] = str(notification_id)
+        notification["invoice_id"] = str(notification["invoice_id"])
+        notification["consent_id"] = consent_id
+        notification.pop("_id", None)
+        
+        return notification
+    
+    @staticmethod
+    async def _notification_email(notification: Dict[str, Any]) -> OutgoingMessage:
+        """
+        Build the email for an email notification, CCing the seller when known
+        """
+        metadata = notification.get("metadata")
+
+        # Get invoice details for CC
+        invoices_collection = get_collection("invoices")
+        invoice = await invoices_collection.find_one({"_id": notification["invoice_id"]})
+
+        if invoice and "seller_email" in invoice:
+            # If this is an email notification and we have email content in dictionary format
+            if isinstance(metadata, dict) and "email_content" in metadata:
+                email_content = metadata["email_content"]
+                subject = email_content.get("subject", "TEVANI Invoice Notification")
+                body = email_content.get("body", notification["content"])
+            else:
+                # Get email content from invoice
+                email_data = LegalBotService._generate_email_content(invoice)
+                subject = email_data["subject"]
+                body = email_data["body"]
+
+            # Send email with CC to seller
+            return build_email(subject, body, notification["recipient"], invoice.get("seller_email"))
+
+        # Fallback if we don't have seller email
+        return build_email("TEVANI Invoice Notification", notification["content"], notification["recipient"])
+
+    @staticmethod
+    async def deliver_emails(
+        notifications: List[Dict[str, Any]]
+    ) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        """
+        Deliver queued email notifications back-to-back over one mail connection
+
+        Returns:
+            List[Tuple[bool, Optional[str], Optional[str]]]: For each notification,
+                whether it was sent, the provider message ID and the error
+        """
+        messages = [await LegalBotService._notification_email(notification) for notification in notifications]
+        errors = await send_emails(messages)
+        return [
+            (False, None, error) if error else (True, f"email_{notification['_id']}", None)
+            for notification, error in zip(notifications, errors)
+        ]
+
+    @staticmethod
+    async def deliver_notification(notification: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Deliver a queued notification through its provider
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether delivery succeeded and the provider message ID
+        """
+        notification_id = notification["_id"]
+        success = False
+        message_id = None
+        
+        if notification["type"] == NotificationType.EMAIL:
+            [(success, message_id, _)] = await LegalBotService.deliver_emails([notification])
+        
+        elif notification["type"] == NotificationType.WHATSAPP:
+            # In a real application, integrate with WhatsApp API here
+            # For demo purposes, we'll just mark it as sent
+            success = True
+            message_id = f"whatsapp_{notification_id}"
         
-        return created_notification
+        return success, message_id
     
     @staticmethod
     async def update_notification_status(
@@ -418,22 +649,28 @@ class LegalBotService:
         )
         
         # Find consent record associated with this notification
-        consent_collection = get_collection("consent_records")
-        consent_record = await consent_collection.find_one({"notifications": ObjectId(notification_id)})
+        if "consent_id" in notification:
+            consent_id = str(notification["consent_id"]) if notification["consent_id"] else None
+        else:
+            # Notifications created before consent_id was recorded
+            consent_collection = get_collection("consent_records")
+            consent_record = await consent_collection.find_one({"notifications": ObjectId(notification_id)}, {"_id": 1})
+            consent_id = str(consent_record["_id"]) if consent_record else None
         
         # If found, log the event
-        if consent_record:
-            consent_id = str(consent_record["_id"])
+        if consent_id:
             
             if status == NotificationStatus.DELIVERED:
                 await LegalBotService.log_consent_event(
                     consent_id=consent_id,
+                    invoice_id=notification["invoice_id"],
                     event=ConsentEvent.NOTIFICATION_DELIVERED,
                     details={"notification_id": notification_id}
                 )
             elif status == NotificationStatus.READ:
                 await LegalBotService.log_consent_event(
                     consent_id=consent_id,
+                    invoice_id=notification["invoice_id"],
                     event=ConsentEvent.NOTIFICATION_READ,
                     details={"notification_id": notification_id}
                 )
@@ -454,46 +691,66 @@ class LegalBotService:
         event: ConsentEvent,
         details: Optional[Dict[str, Any]] = None,
         ip_address: Optional[str] = None,
-        user_agent: Optional[str] = None
+        user_agent: Optional[str] = None,
+        invoice_id: Optional[Union[str, ObjectId]] = None
     ) -> Dict[str, Any]:
         """
         Log a consent event
+
+        Pass `invoice_id` when the caller already has it; otherwise it is
+        taken from a cache of consent -> invoice IDs, or read while linking
+        the log to the consent record. The returned log is built locally
+        rather than read back.
         """
         logs_collection = get_collection("consent_logs")
         consent_collection = get_collection("consent_records")
         
-        # Get the consent record
-        consent_record = await consent_collection.find_one({"_id": ObjectId(consent_id)})
-        if not consent_record:
-            raise ValueError(f"Consent record with ID {consent_id} not found")
+        log_id = ObjectId()
+        consent_oid = ObjectId(consent_id)
+        if invoice_id is None:
+            invoice_id = _consent_invoice_ids.get(consent_id)
         
         # Create log entry
         log_entry = {
-            "invoice_id": consent_record["invoice_id"],
+            "_id": log_id,
+            "consent_id": consent_oid,
+            "invoice_id": ObjectId(invoice_id) if invoice_id is not None else None,
             "event": event,
             "timestamp": datetime.utcnow(),
             "details": details or {},
             "ip_address": ip_address,
             "user_agent": user_agent
         }
+        link_log = _link_reference("logs", log_id)
+        
+        if log_entry["invoice_id"] is None:
+            # Link the log and read the invoice ID in one round trip
+            consent_record = await consent_collection.find_one_and_update(
+                {"_id": consent_oid},
+                link_log,
+                projection={"invoice_id": 1}
+            )
+            if not consent_record:
+                raise ValueError(f"Consent record with ID {consent_id} not found")
+            log_entry["invoice_id"] = consent_record["invoice_id"]
+            await logs_collection.insert_one(log_entry)
+        else:
+            # Both writes are independent, so issue them concurrently
+            _, link_result = await asyncio.gather(
+                logs_collection.insert_one(log_entry),
+                consent_collection.update_one({"_id": consent_oid}, link_log)
+            )
+            if link_result.matched_count == 0:
+                await logs_collection.delete_one({"_id": log_id})
+                raise ValueError(f"Consent record with ID {consent_id} not found")
         
-        # Insert into database
-        result = await logs_collection.insert_one(log_entry)
-        log_id = result.inserted_id
-        
-        # Add log to consent record
-        await consent_collection.update_one(
-            {"_id": ObjectId(consent_id)},
-            {"$push": {"logs": log_id}}
-        )
-        
-        # Get the created log
-        created_log = await logs_collection.find_one({"_id": log_id})
+        _remember_consent_invoice(consent_id, log_entry["invoice_id"])
         
         # Convert ObjectId to string for the response
-        created_log["id"] = str(created_log["_id"])
+        created_log = dict(log_entry)
+        created_log["id"] = str(created_log.pop("_id"))
+        created_log["consent_id"] = consent_id
         created_log["invoice_id"] = str(created_log["invoice_id"])
-        del created_log["_id"]
         
         return created_log
     
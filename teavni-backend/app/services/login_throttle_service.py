@@ -0,0 +1,162 @@
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Optional, Tuple
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.database import get_collection
+from app.services.settings_service import settings_service
+
+
+class LoginThrottleService:
+    """
+    Sliding-window limiter for failed logins, keyed by email and client IP.
+
+    Each login reserves an attempt before the user lookup and bcrypt
+    verification, so a credential-stuffing run is rejected without
+    spending CPU on hashing, and concurrent guesses cannot all pass the
+    check before any of them is recorded. The attempt counts as failed
+    unless the login succeeds and calls `reset`. With the mongo backend
+    each key's attempts live in one document, reserved with a single
+    conditional update.
+    """
+
+    def __init__(self):
+        # key -> (monotonic timestamp, attempt ID) of failed attempts, oldest first
+        self._attempts: "OrderedDict[str, Deque[Tuple[float, str]]]" = OrderedDict()
+
+    async def reserve(self, email: str, ip_address: Optional[str] = None) -> Tuple[int, Optional[str]]:
+        """
+        Reserve a login attempt for the email and client IP
+
+        Returns:
+            Tuple[int, Optional[str]]: 0 and the attempt ID if allowed, otherwise
+                the number of seconds to wait and None
+        """
+        max_attempts = await self._max_attempts()
+        attempt_id = uuid.uuid4().hex
+        limits = [(self._email_key(email), max_attempts)]
+        if ip_address:
+            limits.append((self._ip_key(ip_address), max_attempts * settings.LOGIN_THROTTLE_IP_MULTIPLIER))
+
+        reserved = []
+        for key, limit in limits:
+            retry_after = await self._reserve(key, limit, attempt_id)
+            if retry_after:
+                # Only count attempts that were let through
+                for reserved_key in reserved:
+                    await self._release(reserved_key, attempt_id)
+                return retry_after, None
+            reserved.append(key)
+        return 0, attempt_id
+
+    async def reset(self, email: str, ip_address: Optional[str] = None, attempt_id: Optional[str] = None) -> None:
+        """
+        Clear failed attempts for an email after a successful login, and drop
+        the successful attempt from the client IP's
+        """
+        key = self._email_key(email)
+        if settings.LOGIN_THROTTLE_BACKEND == "mongo":
+            await get_collection("login_attempts").delete_one({"_id": key})
+        else:
+            self._attempts.pop(key, None)
+        if ip_address and attempt_id:
+            await self._release(self._ip_key(ip_address), attempt_id)
+
+    async def _reserve(self, key: str, limit: int, attempt_id: str) -> int:
+        """
+        Record an attempt unless the key is at its limit
+
+        Returns:
+            int: 0 if recorded, otherwise seconds until the oldest attempt in the window expires
+        """
+        window = settings.LOGIN_THROTTLE_WINDOW_SECONDS
+
+        if settings.LOGIN_THROTTLE_BACKEND == "mongo":
+            now = datetime.utcnow()
+            since = now - timedelta(seconds=window)
+            # Drop expired attempts and append this one only if under the limit, in one update
+            document = await get_collection("login_attempts").find_one_and_update(
+                {"_id": key},
+                [{"$set": {
+                    "attempts": {"$let": {
+                        "vars": {"recent": {"$filter": {
+                            "input": {"$ifNull": ["$attempts", []]},
+                            "cond": {"$gte": ["$$this.at", since]}
+                        }}},
+                        "in": {"$cond": [
+                            {"$lt": [{"$size": "$$recent"}, limit]},
+                            {"$concatArrays": ["$$recent", [{"id": attempt_id, "at": now}]]},
+                            "$$recent"
+                        ]}
+                    }},
+                    "timestamp": now
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            attempts = document["attempts"]
+            if any(attempt["id"] == attempt_id for attempt in attempts):
+                return 0
+            oldest = attempts[-limit]["at"]
+            return max(1, int((oldest - since).total_seconds()))
+
+        now = time.monotonic()
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            attempts = deque()
+            self._attempts[key] = attempts
+        else:
+            self._attempts.move_to_end(key)
+        while attempts and now - attempts[0][0] >= window:
+            attempts.popleft()
+        if len(attempts) >= limit:
+            return max(1, int(window - (now - attempts[-limit][0])))
+        attempts.append((now, attempt_id))
+
+        # Bound memory under a spray of random emails by evicting the stalest keys
+        while len(self._attempts) > settings.LOGIN_THROTTLE_MAX_KEYS:
+            self._attempts.popitem(last=False)
+        return 0
+
+    async def _release(self, key: str, attempt_id: str) -> None:
+        """
+        Remove a reserved attempt from a key
+        """
+        if settings.LOGIN_THROTTLE_BACKEND == "mongo":
+            await get_collection("login_attempts").update_one(
+                {"_id": key},
+                {"$pull": {"attempts": {"id": attempt_id}}}
+            )
+            return
+
+        attempts = self._attempts.get(key)
+        if attempts:
+            for attempt in attempts:
+                if attempt[1] == attempt_id:
+                    attempts.remove(attempt)
+                    break
+            if not attempts:
+                del self._attempts[key]
+
+    @staticmethod
+    async def _max_attempts() -> int:
+        """
+        Get maxLoginAttempts from the admin security settings
+        """
+        security = await settings_service.get_category("security")
+        try:
+            return max(1, int(security.get("maxLoginAttempts", 5)))
+        except (TypeError, ValueError):
+            return 5
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"email:{email.strip().lower()}"
+
+    @staticmethod
+    def _ip_key(ip_address: str) -> str:
+        return f"ip:{ip_address}"
+
+login_throttle_service = LoginThrottleService()
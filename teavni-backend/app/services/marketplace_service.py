@@ -0,0 +1,428 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.invoice import InvoiceStatus, RiskTier
+
+logger = logging.getLogger(__name__)
+
+# Annual return offered to investors by risk tier
+RETURN_RATES = {RiskTier.A.value: 12.0, RiskTier.B.value: 14.0, RiskTier.C.value: 15.5, RiskTier.D.value: 17.0}
+
+# Sort keys, each served in index order by one of the partial marketplace
+# indexes on invoices (app/core/schemas.py), with the ID as tie-breaker for
+# stable pages. The return follows the risk tier, so sorting by return sorts
+# by tier; with the tiers an $in, due date sorts merge one scan per tier.
+SORTS = {
+    "return_desc": [("risk_tier", DESCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)],
+    "return_asc": [("risk_tier", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)],
+    "maturity_asc": [("due_date", ASCENDING), ("_id", ASCENDING)],
+    "maturity_desc": [("due_date", DESCENDING), ("_id", DESCENDING)],
+    "amount_desc": [("amount", DESCENDING), ("_id", DESCENDING)],
+    "amount_asc": [("amount", ASCENDING), ("_id", ASCENDING)],
+    "trust_desc": [("trust_score", DESCENDING), ("_id", DESCENDING)],
+}
+
+TIER_CODES = {tier: code for code, tier in enumerate(RETURN_RATES)}
+EPOCH = datetime(1970, 1, 1)
+
+# Invoice fields shown in the marketplace
+LISTING_PROJECTION = {
+    "invoice_number": 1, "amount": 1, "invoice_date": 1, "due_date": 1, "description": 1, "buyer_name": 1,
+    "seller_id": 1, "status": 1, "trust_score": 1, "risk_tier": 1, "funded_amount": 1, "available_amount": 1,
+    "created_at": 1, "updated_at": 1,
+}
+
+
+class MarketplaceService:
+    """
+    Service for the investor marketplace and investors' starred invoices
+
+    The marketplace lists validated invoices that are not yet due and have
+    an amount left to fund. Every sort key has an index restricted to
+    validated invoices, so a page reads only its own entries whatever the
+    number of invoices in other states. Stars are one document per
+    investor and invoice, unique on the pair, so checking or toggling a
+    star is a single index lookup.
+    """
+
+    @staticmethod
+    async def list_invoices(
+        investor_id: str,
+        risk_tiers: Optional[List[RiskTier]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        min_tenor_days: Optional[int] = None,
+        max_tenor_days: Optional[int] = None,
+        min_return: Optional[float] = None,
+        max_return: Optional[float] = None,
+        sort: str = "return_desc",
+        skip: int = 0,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        List the invoices open for funding, filtered and sorted
+
+        Tenors are days from now to the due date.
+
+        Returns:
+            Dict[str, Any]: The number of matching invoices and the requested page
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Sort must be one of {', '.join(SORTS)}")
+
+        # Returns are per risk tier, so a return range is a set of tiers
+        tiers = [tier.value for tier in risk_tiers] if risk_tiers else list(RETURN_RATES)
+        tiers = [
+            tier for tier in tiers
+            if (min_return is None or RETURN_RATES[tier] >= min_return)
+            and (max_return is None or RETURN_RATES[tier] <= max_return)
+        ]
+        now = datetime.utcnow()
+        due_after = now + timedelta(days=min_tenor_days or 0)
+        due_before = now + timedelta(days=max_tenor_days) if max_tenor_days is not None else None
+
+        if marketplace_snapshot.ready:
+            total, entries = marketplace_snapshot.query(
+                tiers, due_after, due_before, min_amount, max_amount, sort, skip, limit
+            )
+            invoices = await MarketplaceService._listings(investor_id, entries)
+            return {"total": total, "invoices": invoices, "version": marketplace_snapshot.version}
+
+        query: Dict[str, Any] = {
+            "status": InvoiceStatus.VALIDATED.value,
+            "risk_tier": {"$in": tiers},
+            "due_date": {"$gt": due_after, **({"$lte": due_before} if due_before else {})},
+            "available_amount": {"$gt": 0},
+        }
+        if min_amount is not None or max_amount is not None:
+            query["amount"] = {
+                key: value for key, value in (("$gte", min_amount), ("$lte", max_amount)) if value is not None
+            }
+
+        invoices_collection = get_collection("invoices")
+        total = await invoices_collection.count_documents(query)
+        cursor = invoices_collection.find(query, LISTING_PROJECTION) \
+            .sort(SORTS[sort]).skip(skip).limit(limit)
+        invoices = await MarketplaceService._listings(
+            investor_id, [_entry(invoice) for invoice in await cursor.to_list(length=limit)]
+        )
+        return {"total": total, "invoices": invoices, "version": None}
+
+    @staticmethod
+    def etag(result: Dict[str, Any]) -> str:
+        """
+        Weak ETag of a marketplace page: changes with any listed invoice,
+        the investor's stars, the days to maturity or the total
+        """
+        fingerprint = repr((result["total"], [
+            (invoice["id"], invoice.get("updated_at"), invoice.get("available_amount"), invoice["starred"],
+             invoice["days_to_maturity"])
+            for invoice in result["invoices"]
+        ]))
+        return f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()[:20]}"'
+
+    @staticmethod
+    async def list_starred(investor_id: str) -> List[Dict[str, Any]]:
+        """
+        List an investor's starred invoices, most recently starred first, whatever their status
+        """
+        stars = await get_collection("starred_invoices").find(
+            {"investor_id": ObjectId(investor_id)}, {"invoice_id": 1}
+        ).sort("_id", DESCENDING).to_list(length=None)
+        invoice_ids = [star["invoice_id"] for star in stars]
+        invoices = await get_collection("invoices").find(
+            {"_id": {"$in": invoice_ids}}, LISTING_PROJECTION
+        ).to_list(length=None)
+        by_id = {invoice["_id"]: _entry(invoice) for invoice in invoices}
+        return await MarketplaceService._listings(
+            investor_id, [by_id[invoice_id] for invoice_id in invoice_ids if invoice_id in by_id]
+        )
+
+    @staticmethod
+    async def star(investor_id: str, invoice_id: str) -> None:
+        """
+        Star an invoice for an investor; starring it again is a no-op
+        """
+        invoice = await get_collection("invoices").find_one({"_id": ObjectId(invoice_id)}, {"status": 1})
+        if not invoice or invoice["status"] not in (InvoiceStatus.VALIDATED.value, InvoiceStatus.FUNDED.value):
+            raise ValueError("Invoice not found")
+        try:
+            await get_collection("starred_invoices").insert_one({
+                "investor_id": ObjectId(investor_id),
+                "invoice_id": ObjectId(invoice_id),
+                "created_at": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            pass
+        cached = _starred_cache.get(investor_id)
+        if cached:
+            cached[1].add(invoice_id)
+
+    @staticmethod
+    async def unstar(investor_id: str, invoice_id: str) -> None:
+        """
+        Remove an investor's star from an invoice
+        """
+        await get_collection("starred_invoices").delete_one(
+            {"investor_id": ObjectId(investor_id), "invoice_id": ObjectId(invoice_id)}
+        )
+        cached = _starred_cache.get(investor_id)
+        if cached:
+            cached[1].discard(invoice_id)
+
+    @staticmethod
+    async def starred_ids(investor_id: str) -> Set[str]:
+        """
+        IDs of the invoices the investor has starred
+
+        Cached per investor for MARKETPLACE_STARRED_CACHE_SECONDS and kept
+        current by this worker's star writes; if MongoDB cannot be reached
+        the cached set is used however old it is.
+        """
+        cached = _starred_cache.get(investor_id)
+        if cached and time.monotonic() - cached[0] < settings.MARKETPLACE_STARRED_CACHE_SECONDS:
+            _starred_cache.move_to_end(investor_id)
+            return cached[1]
+        try:
+            stars = get_collection("starred_invoices").find({"investor_id": ObjectId(investor_id)}, {"invoice_id": 1})
+            starred = {str(star["invoice_id"]) async for star in stars}
+        except PyMongoError as e:
+            logger.warning(f"Could not load starred invoices, using cached ones: {str(e)}")
+            return cached[1] if cached else set()
+
+        _starred_cache[investor_id] = (time.monotonic(), starred)
+        _starred_cache.move_to_end(investor_id)
+        if len(_starred_cache) > settings.MARKETPLACE_STARRED_CACHE_SIZE:
+            _starred_cache.popitem(last=False)
+        return starred
+
+    @staticmethod
+    async def _listings(investor_id: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Add the seller's company name, the days to maturity and the investor's star
+        starred = await MarketplaceService.starred_ids(investor_id)
+        missing = {entry["seller_id"] for entry in entries if "seller_name" not in entry}
+        seller_names = await _seller_names(missing) if missing else {}
+
+        now = datetime.utcnow()
+        return [
+            {
+                "seller_name": seller_names.get(entry["seller_id"]),
+                **entry,
+                "days_to_maturity": max(0, math.ceil((entry["due_date"] - now).total_seconds() / 86400)),
+                "starred": entry["id"] in starred,
+            }
+            for entry in entries
+        ]
+
+marketplace_service = MarketplaceService()
+
+
+def _entry(invoice: Dict[str, Any]) -> Dict[str, Any]:
+    # Listing of an invoice document (or event document), without per-investor fields
+    entry = {key: invoice.get(key) for key in LISTING_PROJECTION if key in invoice}
+    entry["id"] = str(invoice.get("_id") or invoice.get("id"))
+    entry["seller_id"] = str(invoice["seller_id"])
+    entry["return_rate"] = RETURN_RATES.get(invoice.get("risk_tier"))
+    return entry
+
+
+def _is_open(invoice: Dict[str, Any]) -> bool:
+    # Whether an invoice belongs in the marketplace
+    return invoice.get("status") == InvoiceStatus.VALIDATED.value \
+        and (invoice.get("available_amount") or 0) > 0 \
+        and isinstance(invoice.get("due_date"), datetime) and invoice["due_date"] > datetime.utcnow()
+
+
+async def _seller_names(seller_ids: Set[str]) -> Dict[str, Optional[str]]:
+    sellers = get_collection("users").find(
+        {"_id": {"$in": [ObjectId(seller_id) for seller_id in seller_ids]}},
+        {"business_profile.company_name": 1}
+    )
+    return {
+        str(seller["_id"]): (seller.get("business_profile") or {}).get("company_name") async for seller in sellers
+    }
+
+
+# Investor ID -> (loaded at, starred invoice IDs)
+_starred_cache: "OrderedDict[str, Tuple[float, Set[str]]]" = OrderedDict()
+
+
+class MarketplaceSnapshot:
+    """
+    In-memory copy of the invoices open for funding, for serving the
+    marketplace without reading MongoDB
+
+    Listings are kept by ID and, for querying, as NumPy columns (risk tier,
+    due date, amount, trust score, available amount) with one precomputed
+    order per sort key; a page is a mask over the columns walked in the
+    sort's order. Invoice events from the event bus add, replace or drop
+    single listings and bump `version`; the columns and orders are rebuilt
+    on the next query after a change. The whole snapshot is reloaded every
+    MARKETPLACE_SNAPSHOT_REFRESH_SECONDS, which also covers writes no event
+    reports (standalone MongoDB). If a reload fails the previous snapshot
+    keeps being served.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.version = 0
+        self.loaded_at: Optional[datetime] = None
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._seller_names: Dict[str, Optional[str]] = {}
+        self._columns: Optional[Tuple[List[Dict[str, Any]], Dict[str, np.ndarray], Dict[str, np.ndarray]]] = None
+        # Invoices changed while a reload is reading, reapplied on top of it
+        self._changed_during_reload: Optional[Dict[str, Dict[str, Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start reloading the snapshot in the background
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        """
+        Stop reloading the snapshot
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Marketplace snapshot reload failed: {str(e)}")
+            await asyncio.sleep(settings.MARKETPLACE_SNAPSHOT_REFRESH_SECONDS)
+
+    async def reload(self) -> None:
+        """
+        Replace the snapshot with the open invoices currently in MongoDB
+        """
+        self._changed_during_reload = {}
+        try:
+            invoices = await get_collection("invoices").find(
+                {
+                    "status": InvoiceStatus.VALIDATED.value,
+                    "available_amount": {"$gt": 0},
+                    "due_date": {"$gt": datetime.utcnow()},
+                },
+                LISTING_PROJECTION
+            ).to_list(length=None)
+            seller_names = await _seller_names({str(invoice["seller_id"]) for invoice in invoices})
+            changed = self._changed_during_reload
+        finally:
+            self._changed_during_reload = None
+
+        self._seller_names = seller_names
+        self._entries = {entry["id"]: entry for entry in map(self._named_entry, invoices)}
+        for document in changed.values():
+            self._apply(document)
+        self._columns = None
+        self.version += 1
+        self.loaded_at = datetime.utcnow()
+        self.ready = True
+
+    async def apply(self, invoice: Dict[str, Any]) -> None:
+        """
+        Add, replace or drop the listing of a changed invoice
+        """
+        seller_id = str(invoice.get("seller_id"))
+        if _is_open(invoice) and seller_id not in self._seller_names:
+            try:
+                self._seller_names.update(await _seller_names({seller_id}))
+            except PyMongoError:
+                pass
+        if self._changed_during_reload is not None:
+            self._changed_during_reload[str(invoice.get("_id") or invoice.get("id"))] = invoice
+        if self._apply(invoice):
+            self._columns = None
+            self.version += 1
+
+    def query(
+        self,
+        tiers: List[str],
+        due_after: datetime,
+        due_before: Optional[datetime],
+        min_amount: Optional[float],
+        max_amount: Optional[float],
+        sort: str,
+        skip: int,
+        limit: int
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Filter and sort the snapshot
+
+        Returns:
+            The number of matching listings and the requested page of them
+        """
+        entries, columns, orders = self._build()
+        mask = np.isin(columns["risk_tier"], [TIER_CODES[tier] for tier in tiers]) \
+            & (columns["due_date"] > (due_after - EPOCH).total_seconds()) \
+            & (columns["available_amount"] > 0)
+        if due_before is not None:
+            mask &= columns["due_date"] <= (due_before - EPOCH).total_seconds()
+        if min_amount is not None:
+            mask &= columns["amount"] >= min_amount
+        if max_amount is not None:
+            mask &= columns["amount"] <= max_amount
+
+        order = orders[sort]
+        selected = order[mask[order]]
+        return len(selected), [entries[position] for position in selected[skip:skip + limit]]
+
+    def _named_entry(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
+        entry = _entry(invoice)
+        entry["seller_name"] = self._seller_names.get(entry["seller_id"])
+        return entry
+
+    def _apply(self, invoice: Dict[str, Any]) -> bool:
+        # Whether the snapshot changed
+        invoice_id = str(invoice.get("_id") or invoice.get("id"))
+        if _is_open(invoice):
+            self._entries[invoice_id] = self._named_entry(invoice)
+            return True
+        return self._entries.pop(invoice_id, None) is not None
+
+    def _build(self) -> Tuple[List[Dict[str, Any]], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        if self._columns is None:
+            # In ID order, so a listing's position breaks ties as the ID does
+            entries = [self._entries[invoice_id] for invoice_id in sorted(self._entries)]
+            columns = {
+                "risk_tier": np.array([TIER_CODES.get(entry.get("risk_tier"), -1) for entry in entries], dtype=np.int64),
+                "due_date": np.array([(entry["due_date"] - EPOCH).total_seconds() for entry in entries], dtype=float),
+                "amount": np.array([entry.get("amount") or 0 for entry in entries], dtype=float),
+                "trust_score": np.array([entry.get("trust_score") or 0 for entry in entries], dtype=float),
+                "available_amount": np.array([entry.get("available_amount") or 0 for entry in entries], dtype=float),
+                "_id": np.arange(len(entries), dtype=float),
+            }
+            orders = {
+                sort: np.lexsort([
+                    columns[field] if direction == ASCENDING else -columns[field] for field, direction in reversed(keys)
+                ])
+                for sort, keys in SORTS.items()
+            }
+            self._columns = (entries, columns, orders)
+        return self._columns
+
+marketplace_snapshot = MarketplaceSnapshot()
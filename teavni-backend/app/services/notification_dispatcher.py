@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.legalbot import NotificationStatus, NotificationType
+from app.services.legalbot_service import legalbot_service, DELIVERABLE_NOTIFICATION_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+class _RateLimiter:
+    """
+    Token bucket limiting deliveries per second for one provider
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"Notification rate limit must be positive, got {rate}")
+        self._rate = rate
+        # At least one token fits, so rates below one per second still deliver
+        self._capacity = max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class NotificationDispatcher:
+    """
+    Background worker draining QUEUED notifications.
+
+    Each notification is claimed with a single find_one_and_update that
+    pushes `next_attempt_at` forward by a lease, so several workers (or
+    processes) can drain the queue without double-sending, and a
+    notification claimed by a crashed worker becomes eligible again once
+    its lease expires. Failed deliveries are retried with exponential
+    backoff; after NOTIFICATION_MAX_ATTEMPTS the notification is
+    dead-lettered as FAILED. Notifications of a type without a provider
+    are dead-lettered on their first attempt. Due email notifications are
+    claimed in batches and sent back-to-back over one mail connection.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: set = set()
+        self._limiters: Dict[str, _RateLimiter] = {}
+
+    def start(self) -> None:
+        """
+        Start draining the queue in the background
+        """
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(settings.NOTIFICATION_DISPATCH_CONCURRENCY)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Notification dispatcher started")
+
+    async def stop(self) -> None:
+        """
+        Stop claiming new notifications and wait for in-flight deliveries
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        logger.info("Notification dispatcher stopped")
+
+    def wake(self) -> None:
+        """
+        Signal that new notifications were queued
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self._dispatch_available()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification dispatch failed: {str(e)}")
+                claimed = 0
+
+            if claimed:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.NOTIFICATION_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_available(self) -> int:
+        """
+        Claim and start delivering due notifications while delivery slots are free
+        """
+        claimed = 0
+        while True:
+            await self._slots.acquire()
+            notification = await self._claim()
+            if notification is None:
+                self._slots.release()
+                return claimed
+
+            batch = [notification]
+            if notification["type"] == NotificationType.EMAIL:
+                while len(batch) < settings.NOTIFICATION_EMAIL_BATCH_SIZE:
+                    notification = await self._claim({"type": NotificationType.EMAIL})
+                    if notification is None:
+                        break
+                    batch.append(notification)
+
+            claimed += len(batch)
+            task = asyncio.create_task(self._deliver(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _claim(self, extra_filter: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await get_collection("notifications").find_one_and_update(
+            {"status": NotificationStatus.QUEUED, "next_attempt_at": {"$lte": now}, **(extra_filter or {})},
+            {
+                "$set": {"next_attempt_at": now + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _deliver(self, notifications: List[Dict[str, Any]]) -> None:
+        try:
+            results = []
+            deliverable = []
+            for notification in notifications:
+                if notification["type"] in DELIVERABLE_NOTIFICATION_TYPES:
+                    deliverable.append(notification)
+                else:
+                    # Retrying cannot help without a provider
+                    results.append((
+                        notification, False, None, f"No provider for {notification['type']} notifications", False
+                    ))
+
+            if deliverable:
+                for notification in deliverable:
+                    await self._limiter(notification["type"]).acquire()
+                try:
+                    if deliverable[0]["type"] == NotificationType.EMAIL:
+                        outcomes = await legalbot_service.deliver_emails(deliverable)
+                    else:
+                        [notification] = deliverable
+                        success, message_id = await legalbot_service.deliver_notification(notification)
+                        outcomes = [(success, message_id, None)]
+                except Exception as e:
+                    outcomes = [(False, None, str(e))] * len(deliverable)
+
+                for notification, (success, message_id, error) in zip(deliverable, outcomes):
+                    if not success and not error:
+                        error = "Provider rejected the notification"
+                    results.append((notification, success, message_id, error, True))
+
+            for notification, success, message_id, error, retry in results:
+                try:
+                    await self._record_result(notification, success, message_id, error, retry=retry)
+                except Exception as e:
+                    logger.error(f"Failed to record delivery of notification {notification['_id']}: {str(e)}")
+        finally:
+            self._slots.release()
+
+    async def _record_result(
+        self,
+        notification: Dict[str, Any],
+        success: bool,
+        message_id: Optional[str],
+        error: Optional[str],
+        retry: bool = True
+    ) -> None:
+        notifications_collection = get_collection("notifications")
+        now = datetime.utcnow()
+        attempts = notification.get("attempts", 1)
+
+        if success:
+            update = {
+                "status": NotificationStatus.SENT,
+                "sent_at": now,
+                "message_id": message_id,
+                "last_error": None
+            }
+            logger.info(f"Sent {notification['type']} notification to {notification['recipient']}")
+        elif not retry or attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            # Dead-letter: stop retrying and keep the last error for inspection
+            update = {
+                "status": NotificationStatus.FAILED,
+                "last_error": error,
+                "dead_lettered_at": now
+            }
+            logger.error(
+                f"Giving up on {notification['type']} notification to {notification['recipient']} "
+                f"after {attempts} attempts: {error}"
+            )
+        else:
+            backoff = settings.NOTIFICATION_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            backoff = min(backoff, settings.NOTIFICATION_RETRY_MAX_SECONDS)
+            update = {
+                "next_attempt_at": now + timedelta(seconds=backoff * random.uniform(0.8, 1.2)),
+                "last_error": error
+            }
+            logger.warning(
+                f"Failed to send {notification['type']} notification to {notification['recipient']} "
+                f"(attempt {attempts}), retrying in {int(backoff)}s: {error}"
+            )
+
+        # Only the holder of the current claim may record a result
+        await notifications_collection.update_one(
+            {"_id": notification["_id"], "status": NotificationStatus.QUEUED, "attempts": attempts},
+            {"$set": update}
+        )
+
+    def _limiter(self, notification_type: str) -> _RateLimiter:
+        limiter = self._limiters.get(notification_type)
+        if limiter is None:
+            rate = settings.NOTIFICATION_RATE_LIMITS.get(notification_type, settings.NOTIFICATION_DEFAULT_RATE_LIMIT)
+            limiter = _RateLimiter(rate)
+            self._limiters[notification_type] = limiter
+        return limiter
+
+notification_dispatcher = NotificationDispatcher()
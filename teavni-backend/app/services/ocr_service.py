@@ -6,9 +6,11 @@ import hashlib
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple
 import pytesseract
+from bson.int64 import Int64
 from PIL import Image
 from pdf2image import convert_from_path
 from app.core.config import settings
+from app.services.field_correction import field_corrector
 
 class OCRService:
     """
@@ -23,8 +25,11 @@ class OCRService:
         # Calculate file hash for tamper detection
         file_hash = OCRService._calculate_file_hash(file_path)
         
+        # Rasterize the file once for OCR and the image hash
+        images = OCRService._load_images(file_path)
+        
         # Extract text from file
-        text = await OCRService._extract_text_from_file(file_path)
+        text = await OCRService._extract_text_from_file(images)
         
         # Parse invoice data from text
         invoice_data = OCRService._parse_invoice_data(text)
@@ -32,6 +37,7 @@ class OCRService:
         # Add metadata
         invoice_data["file_path"] = file_path
         invoice_data["hash"] = file_hash
+        invoice_data["image_hash"] = OCRService._calculate_image_hash(images[0]) if images else None
         invoice_data["ocr_text"] = text
         
         return invoice_data
@@ -48,24 +54,48 @@ class OCRService:
         return sha256_hash.hexdigest()
     
     @staticmethod
-    async def _extract_text_from_file(file_path: str) -> str:
+    def _calculate_image_hash(image: Image.Image) -> Int64:
+        """
+        Calculate a 64-bit difference hash (dHash) of a page image
+
+        Unlike the file hash it survives rescans, re-exports and
+        recompression: each bit records whether a pixel of the 9x8
+        grayscale thumbnail is brighter than its right neighbour. Stored
+        as a signed BSON long.
         """
-        Extract text from a file using OCR
+        thumbnail = image.convert("L").resize((9, 8), Image.LANCZOS)
+        pixels = list(thumbnail.getdata())
+        image_hash = 0
+        for row in range(8):
+            for col in range(8):
+                left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+                image_hash = (image_hash << 1) | (left > right)
+        return Int64(image_hash - (1 << 64) if image_hash >= 1 << 63 else image_hash)
+    
+    @staticmethod
+    def _load_images(file_path: str) -> List[Image.Image]:
+        """
+        Load the pages of a file as images
         """
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == ".pdf":
             # Convert PDF to images
-            images = convert_from_path(file_path)
-            text = ""
-            
-            # Process each page
-            for image in images:
-                text += pytesseract.image_to_string(image)
-        else:
-            # Process image file
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
+            return convert_from_path(file_path)
+        
+        # Image file
+        return [Image.open(file_path)]
+    
+    @staticmethod
+    async def _extract_text_from_file(images: List[Image.Image]) -> str:
+        """
+        Extract text from the page images of a file using OCR
+        """
+        text = ""
+        
+        # Process each page
+        for image in images:
+            text += pytesseract.image_to_string(image)
         
         return text
     
@@ -74,15 +104,18 @@ class OCRService:
         """
         Parse invoice data from OCR text
         """
+        buyer_gstin, gstin_correction = OCRService._extract_gstin(text)
         data = {
             "invoice_number": OCRService._extract_invoice_number(text),
             "invoice_date": OCRService._extract_date(text, "invoice date"),
             "due_date": OCRService._extract_date(text, "due date"),
             "amount": OCRService._extract_amount(text),
             "buyer_name": OCRService._extract_buyer_name(text),
-            "buyer_gstin": OCRService._extract_gstin(text),
+            "buyer_gstin": buyer_gstin,
             "line_items": OCRService._extract_line_items(text),
             "purchase_order_number": OCRService._extract_po_number(text),
+            # Misreadings repaired by field correction, by field
+            "corrections": {"buyer_gstin": gstin_correction} if gstin_correction else {},
         }
         
         return data
@@ -169,18 +202,25 @@ class OCRService:
         return None
     
     @staticmethod
-    def _extract_gstin(text: str) -> Optional[str]:
+    def _extract_gstin(text: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
         """
-        Extract GSTIN from text
+        Extract GSTIN from text, with the correction applied to it if any
+
+        Any 15 characters after a GST label are read, since OCR confuses
+        letters and digits (O/0, I/1, S/5, B/8) the GSTIN grammar would
+        otherwise reject. The first reading that is valid, or corrects to a
+        valid GSTIN with enough confidence, is returned; failing that, the
+        first reading is returned as is for the GSTIN rule to flag.
         """
-        # GSTIN format: 2 digits, 10 characters, 1 digit, 1 character, 1 digit/character
-        pattern = r"(?:GSTIN|GST|GST IN|GST No)[:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[0-9A-Z]{1}[A-Z0-9]{1})"
-        
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
-        
-        return None
+        pattern = r"(?:GSTIN|GST IN|GST No|GST)[.:\s]*([0-9A-Z]{15})"
+
+        readings = [match.upper() for match in re.findall(pattern, text, re.IGNORECASE)]
+        for reading in readings:
+            correction = field_corrector.correct_gstin(reading)
+            if correction and correction["confidence"] >= settings.OCR_CORRECTION_MIN_CONFIDENCE:
+                return correction["value"], correction if correction["substitutions"] else None
+
+        return (readings[0] if readings else None), None
     
     @staticmethod
     def _extract_line_items(text: str) -> List[Dict[str, Any]]:
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.services.validation_service import validation_service, VALIDATION_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class RevalidationService:
+    """
+    Admin-triggered job that re-validates every invoice, e.g. after the
+    risk tier settings change.
+
+    The job walks the invoices in `_id` order: a producer reads the next
+    REVALIDATION_BATCH_SIZE IDs (an index-only scan) and hands the range to
+    one of REVALIDATION_WORKERS workers, which load, validate and bulk
+    write it. Batches finish out of order, so the checkpoint only advances
+    over the contiguous prefix of finished batches; it is persisted on the
+    job document together with the counters, so a job interrupted by a
+    crash resumes after the last checkpoint. The node running a job holds
+    a lease on it, renewed at every checkpoint, and at most one job runs
+    at a time (unique index on running jobs).
+    """
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start_job(self, user_id: str) -> Dict[str, Any]:
+        """
+        Create a revalidation job and start running it in the background
+
+        Raises:
+            ValueError: If a job is already running
+        """
+        now = datetime.utcnow()
+        job = {
+            "status": JobStatus.RUNNING,
+            "created_by": user_id,
+            "created_at": now,
+            "updated_at": now,
+            "total": await get_collection("invoices").estimated_document_count(),
+            "processed": 0,
+            "passed": 0,
+            "rejected": 0,
+            "rescored": 0,
+            "checkpoint": None,
+            "owner": self.node_id,
+            "lease_until": now + timedelta(seconds=settings.REVALIDATION_LEASE_SECONDS),
+            "cancel_requested": False,
+            "error": None,
+        }
+        try:
+            result = await get_collection("revalidation_jobs").insert_one(job)
+        except DuplicateKeyError:
+            raise ValueError("A revalidation job is already running")
+
+        job_id = str(result.inserted_id)
+        self._launch(job_id)
+        return await self.get_job(job_id)
+
+    async def resume_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Continue a failed job, or take over a running job whose owner stopped
+        renewing its lease, from the job's checkpoint
+
+        Raises:
+            ValueError: If the job cannot be resumed
+        """
+        now = datetime.utcnow()
+        try:
+            job = await get_collection("revalidation_jobs").find_one_and_update(
+                {
+                    "_id": ObjectId(job_id),
+                    "$or": [
+                        {"status": JobStatus.FAILED},
+                        {"status": JobStatus.RUNNING, "owner": self.node_id},
+                        {"status": JobStatus.RUNNING, "lease_until": {"$lt": now}}
+                    ]
+                },
+                {"$set": {
+                    "status": JobStatus.RUNNING,
+                    "error": None,
+                    "owner": self.node_id,
+                    "lease_until": now + timedelta(seconds=settings.REVALIDATION_LEASE_SECONDS),
+                    "updated_at": now
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise ValueError("Another revalidation job is running")
+        if not job:
+            raise ValueError("Job is not failed or interrupted, or is still owned by a live node")
+        if job_id not in self._tasks:
+            self._launch(job_id)
+        return await self.get_job(job_id)
+
+    async def resume_interrupted(self) -> Optional[str]:
+        """
+        Resume the running job if its owner's lease expired (called on startup)
+        """
+        job = await get_collection("revalidation_jobs").find_one({
+            "status": JobStatus.RUNNING,
+            "lease_until": {"$lt": datetime.utcnow()}
+        })
+        if not job:
+            return None
+        try:
+            await self.resume_job(str(job["_id"]))
+        except ValueError:
+            # Another node took it over first
+            return None
+        logger.info(f"Resumed revalidation job {job['_id']} from checkpoint {job.get('checkpoint')}")
+        return str(job["_id"])
+
+    async def cancel_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Ask a running job to stop at its next checkpoint
+        """
+        result = await get_collection("revalidation_jobs").update_one(
+            {"_id": ObjectId(job_id), "status": JobStatus.RUNNING},
+            {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}}
+        )
+        if result.matched_count == 0:
+            raise ValueError("Job is not running")
+        return await self.get_job(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job with its progress, throughput and ETA
+        """
+        job = await get_collection("revalidation_jobs").find_one({"_id": ObjectId(job_id)})
+        return self._serialize_job(job) if job else None
+
+    async def list_jobs(self, skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        List jobs, newest first
+        """
+        cursor = get_collection("revalidation_jobs").find().sort("created_at", -1).skip(skip).limit(limit)
+        return [self._serialize_job(job) async for job in cursor]
+
+    async def stop(self) -> None:
+        """
+        Stop this node's jobs at shutdown and release their leases so they
+        can be resumed elsewhere right away
+        """
+        for job_id, task in list(self._tasks.items()):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await get_collection("revalidation_jobs").update_one(
+                {"_id": ObjectId(job_id), "owner": self.node_id, "status": JobStatus.RUNNING},
+                {"$set": {"lease_until": datetime.utcnow()}}
+            )
+
+    @staticmethod
+    def _serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+        job["id"] = str(job["_id"])
+        del job["_id"]
+        if job.get("checkpoint"):
+            job["checkpoint"] = str(job["checkpoint"])
+
+        throughput = job.get("throughput") or 0
+        remaining = max(job["total"] - job["processed"], 0)
+        job["progress"] = min(round(job["processed"] / job["total"] * 100, 1), 100.0) if job["total"] else 100.0
+        job["eta_seconds"] = int(remaining / throughput) if throughput and job["status"] == JobStatus.RUNNING else None
+        return job
+
+    def _launch(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str) -> None:
+        jobs_collection = get_collection("revalidation_jobs")
+        job = await jobs_collection.find_one({"_id": ObjectId(job_id)})
+        progress = {key: job[key] for key in ("processed", "passed", "rejected", "rescored")}
+        checkpoint = job.get("checkpoint")
+        started = time.monotonic()
+        processed_at_start = job["processed"]
+
+        slots = asyncio.Semaphore(settings.REVALIDATION_WORKERS)
+        # (last _id of the batch, task) in _id order
+        in_flight: deque = deque()
+        cursor = checkpoint
+        status, error = JobStatus.COMPLETED, None
+
+        try:
+            while True:
+                query = {"_id": {"$gt": cursor}} if cursor else {}
+                batch = await get_collection("invoices").find(query, {"_id": 1}).sort("_id", 1) \
+                    .limit(settings.REVALIDATION_BATCH_SIZE).to_list(length=None)
+                if not batch:
+                    break
+
+                await slots.acquire()
+                first_id, cursor = batch[0]["_id"], batch[-1]["_id"]
+                task = asyncio.create_task(self._process_range(first_id, cursor, slots))
+                in_flight.append((cursor, task))
+
+                checkpoint = self._advance(in_flight, progress, checkpoint)
+                self._raise_failed(in_flight)
+                if not await self._save_progress(job_id, progress, checkpoint, started, processed_at_start):
+                    status = JobStatus.CANCELLED
+                    break
+
+            if status == JobStatus.COMPLETED:
+                while in_flight:
+                    await asyncio.wait([in_flight[0][1]])
+                    checkpoint = self._advance(in_flight, progress, checkpoint)
+                    self._raise_failed(in_flight)
+                    await self._save_progress(job_id, progress, checkpoint, started, processed_at_start)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running so it resumes from the checkpoint
+            for _, task in in_flight:
+                task.cancel()
+            raise
+        except Exception as e:
+            status, error = JobStatus.FAILED, str(e)
+            logger.error(f"Revalidation job {job_id} failed at checkpoint {checkpoint}: {error}")
+
+        for _, task in in_flight:
+            task.cancel()
+
+        await jobs_collection.update_one(
+            {"_id": ObjectId(job_id), "owner": self.node_id},
+            {"$set": {
+                **progress,
+                "checkpoint": checkpoint,
+                "status": status,
+                "error": error,
+                "finished_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        logger.info(f"Revalidation job {job_id} {status} after {progress['processed']} invoices")
+
+    @staticmethod
+    async def _process_range(first_id: ObjectId, last_id: ObjectId, slots: asyncio.Semaphore) -> Dict[str, int]:
+        try:
+            invoices = await get_collection("invoices").find(
+                {"_id": {"$gte": first_id, "$lte": last_id}},
+                VALIDATION_PROJECTION
+            ).to_list(length=None)
+            counts = await validation_service.apply_batch(invoices)
+            counts["processed"] = len(invoices)
+            return counts
+        finally:
+            slots.release()
+
+    @staticmethod
+    def _advance(in_flight: deque, progress: Dict[str, int], checkpoint: Optional[ObjectId]) -> Optional[ObjectId]:
+        """
+        Fold finished batches at the head of the queue into the progress and
+        return the new checkpoint; stops at a failed batch
+        """
+        while in_flight and in_flight[0][1].done() and not in_flight[0][1].exception():
+            last_id, task = in_flight.popleft()
+            for key, value in task.result().items():
+                progress[key] += value
+            checkpoint = last_id
+        return checkpoint
+
+    @staticmethod
+    def _raise_failed(in_flight: deque) -> None:
+        # The batch after the checkpoint failed: the job cannot advance past it
+        if in_flight and in_flight[0][1].done():
+            in_flight[0][1].result()
+
+    async def _save_progress(
+        self,
+        job_id: str,
+        progress: Dict[str, int],
+        checkpoint: Optional[ObjectId],
+        started: float,
+        processed_at_start: int
+    ) -> bool:
+        """
+        Persist progress and renew the lease; False if the job was cancelled or taken over
+        """
+        now = datetime.utcnow()
+        elapsed = time.monotonic() - started
+        job = await get_collection("revalidation_jobs").find_one_and_update(
+            {"_id": ObjectId(job_id), "owner": self.node_id, "status": JobStatus.RUNNING},
+            {"$set": {
+                **progress,
+                "checkpoint": checkpoint,
+                "throughput": round((progress["processed"] - processed_at_start) / elapsed, 1) if elapsed else None,
+                "lease_until": now + timedelta(seconds=settings.REVALIDATION_LEASE_SECONDS),
+                "updated_at": now
+            }},
+            projection={"cancel_requested": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return bool(job) and not job.get("cancel_requested")
+
+revalidation_service = RevalidationService()
@@ -0,0 +1,525 @@
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.models.invoice import ValidationResult
+from app.services.gstin_validator import gstin_validator, normalize_gstin, VALID as GSTIN_VALID
+from app.services.field_correction import field_corrector
+from app.services.anomaly_engine import anomaly_engine
+from app.services.settings_service import settings_service
+
+logger = logging.getLogger(__name__)
+
+# Outcome codes of a rule for one invoice
+ABSENT, PASS, WARNING, FAIL, MISSING = 0, 1, 2, 3, 4
+
+OUTCOME_RESULTS = {
+    PASS: ValidationResult.PASS,
+    WARNING: ValidationResult.WARNING,
+    FAIL: ValidationResult.FAIL,
+    MISSING: ValidationResult.FAIL,
+}
+
+SEVERITIES = {"warning": WARNING, "fail": FAIL}
+
+# Trust score categories, weighted by the `riskTier` settings; a rule
+# counts toward documentQuality unless it names another category
+SCORE_CATEGORIES = ["gstVerification", "buyerHistory", "sellerHistory", "documentQuality"]
+DEFAULT_SCORE_CATEGORY = "documentQuality"
+# Outcome when the value a rule reads is missing ("fail" is reported as missing)
+MISSING_OUTCOMES = {"skip": ABSENT, "pass": PASS, "warning": WARNING, "fail": MISSING}
+
+# Comparisons a "compare" rule can require of a column; the rule passes when it holds
+OPERATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+    "multiple_of": lambda values, value: np.mod(values, value) == 0,
+    "not_multiple_of": lambda values, value: np.mod(values, value) != 0,
+}
+
+# Columns "compare" rules can read, with their evaluation cost. Expensive
+# rules only run on invoices the cheap rules have not already rejected.
+COLUMN_COSTS = {
+    "amount": "low",
+    "payment_term_days": "low",
+    "line_items_difference": "high",
+    "max_unit_price": "high",
+    "seller_amount_zscore": "low",
+    "seller_terms_zscore": "low",
+    "seller_sequence_gap": "low",
+    "seller_burst_ratio": "low",
+    "population_amount_zscore": "low",
+    "population_terms_zscore": "low",
+    "population_unit_price_zscore": "high",
+}
+
+MICROSECONDS_PER_DAY = 86400 * 10**6
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    # Dates are datetimes from MongoDB, or ISO strings on older documents
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class InvoiceBatch:
+    """
+    Column views over a batch of invoice documents, each computed on first use
+
+    Every column is a (values, present) pair of arrays with one entry per invoice.
+    """
+
+    def __init__(self, invoices: List[Dict[str, Any]]):
+        self.invoices = invoices
+        self.size = len(invoices)
+        self._columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._dates: Optional[Tuple[list, list]] = None
+        self._items: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        # The anomaly tables current when the batch was built, and per metric
+        # the values scored against them with their z-scores, table rows and owners
+        self._tables = anomaly_engine.tables
+        self._population: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]] = {}
+
+    def column(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        if name not in self._columns:
+            self._columns[name] = getattr(self, f"_column_{name}")()
+        return self._columns[name]
+
+    def field(self, name: str) -> List[Any]:
+        return [invoice.get(name) for invoice in self.invoices]
+
+    def dates(self) -> Tuple[list, list]:
+        if self._dates is None:
+            self._dates = (
+                [_as_datetime(invoice.get("invoice_date")) for invoice in self.invoices],
+                [_as_datetime(invoice.get("due_date")) for invoice in self.invoices],
+            )
+        return self._dates
+
+    def _line_items(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Line items flattened, with the index of the invoice each belongs to
+        if self._items is None:
+            line_items = [invoice.get("line_items") or [] for invoice in self.invoices]
+            counts = np.array([len(items) for items in line_items], dtype=np.int64)
+            owners = np.repeat(np.arange(self.size), counts)
+            amounts = np.array([item.get("amount", 0) for items in line_items for item in items], dtype=float)
+            prices = np.array([item.get("unit_price", 0) for items in line_items for item in items], dtype=float)
+            self._items = (owners, amounts, prices)
+        return self._items
+
+    def _column_amount(self) -> Tuple[np.ndarray, np.ndarray]:
+        amounts = np.nan_to_num(np.array(
+            [float(amount) if amount is not None else np.nan for amount in self.field("amount")], dtype=float
+        ))
+        return amounts, amounts != 0
+
+    def _column_payment_term_days(self) -> Tuple[np.ndarray, np.ndarray]:
+        invoice_dates, due_dates = self.dates()
+        present = np.array([a is not None and b is not None for a, b in zip(invoice_dates, due_dates)], dtype=bool)
+        deltas = (
+            np.array(due_dates, dtype="datetime64[us]") - np.array(invoice_dates, dtype="datetime64[us]")
+        ).astype(np.int64)
+        return np.where(present, deltas, 0) / MICROSECONDS_PER_DAY, present
+
+    def _column_line_items_difference(self) -> Tuple[np.ndarray, np.ndarray]:
+        owners, amounts, _ = self._line_items()
+        totals = np.bincount(owners, weights=amounts, minlength=self.size)
+        present = np.bincount(owners, minlength=self.size) > 0
+        self._columns["line_items_total"] = (totals, present)
+        return np.abs(totals - self.column("amount")[0]), present
+
+    def _profile_column(self, key: str, absolute: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        # A value of the seller profile computed when the invoice was created
+        values = [(invoice.get("seller_profile") or {}).get(key) for invoice in self.invoices]
+        present = np.array([value is not None for value in values], dtype=bool)
+        column = np.array([value if value is not None else 0 for value in values], dtype=float)
+        return (np.abs(column) if absolute else column), present
+
+    def _column_seller_amount_zscore(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._profile_column("amount_zscore")
+
+    def _column_seller_terms_zscore(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._profile_column("terms_zscore", absolute=True)
+
+    def _column_seller_sequence_gap(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._profile_column("sequence_gap", absolute=True)
+
+    def _column_seller_burst_ratio(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._profile_column("burst_ratio")
+
+    def _population_column(
+        self,
+        metric: str,
+        values: np.ndarray,
+        present: np.ndarray,
+        owners: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Robust z-scores against the invoice's buyer, seller segment or the whole population
+        if self._tables is None:
+            return np.zeros(self.size), np.zeros(self.size, dtype=bool)
+        sellers, buyers = self.field("seller_id"), self.field("buyer_id")
+        if owners is not None:
+            sellers, buyers = [sellers[owner] for owner in owners], [buyers[owner] for owner in owners]
+        zscores, rows = self._tables.score(metric, values, sellers, buyers)
+        present = present & (rows >= 0)
+        self._population[metric] = (values, np.where(present, zscores, -np.inf), rows, owners)
+        return np.where(present, zscores, 0), present
+
+    def population_details(self, metric: str, row: int) -> Dict[str, Any]:
+        """
+        The value of an invoice scored for a population column, with the group it was scored against
+        """
+        values, zscores, rows, owners = self._population.get(metric, (None, None, None, None))
+        position = row
+        if owners is not None:
+            # The invoice's line item with the highest z-score
+            positions = np.flatnonzero(owners == row)
+            position = positions[np.argmax(zscores[positions])] if len(positions) else -1
+        if values is None or position < 0 or rows[position] < 0:
+            return {}
+        return {
+            metric: round(float(values[position]), 2),
+            "zscore": round(float(zscores[position]), 2),
+            **self._tables.describe(metric, int(rows[position])),
+        }
+
+    def _column_population_amount_zscore(self) -> Tuple[np.ndarray, np.ndarray]:
+        amounts, present = self.column("amount")
+        return self._population_column("amount", amounts, present & (amounts > 0))
+
+    def _column_population_terms_zscore(self) -> Tuple[np.ndarray, np.ndarray]:
+        zscores, present = self._population_column("terms", *self.column("payment_term_days"))
+        return np.abs(zscores), present
+
+    def _column_population_unit_price_zscore(self) -> Tuple[np.ndarray, np.ndarray]:
+        owners, _, prices = self._line_items()
+        zscores, present = self._population_column("unit_price", prices, prices > 0, owners)
+        maxima = np.full(self.size, -np.inf)
+        np.maximum.at(maxima, owners, np.where(present, zscores, -np.inf))
+        present = np.isfinite(maxima)
+        return np.where(present, maxima, 0), present
+
+    def _column_max_unit_price(self) -> Tuple[np.ndarray, np.ndarray]:
+        owners, _, prices = self._line_items()
+        maxima = np.full(self.size, -np.inf)
+        np.maximum.at(maxima, owners, prices)
+        present = np.bincount(owners, minlength=self.size) > 0
+        return np.where(present, maxima, 0), present
+
+
+class CompiledRule:
+    """
+    One validation rule, ready to evaluate over an InvoiceBatch
+    """
+
+    def __init__(self, definition: Dict[str, Any]):
+        self.name = definition["name"]
+        self.kind = definition["kind"]
+        self.severity = SEVERITIES[definition.get("severity", "warning")]
+        self.missing = MISSING_OUTCOMES[definition.get("missing", "skip")]
+        self.messages = definition["messages"]
+        self.field = definition.get("field")
+        self.column = definition.get("column")
+        self.op = definition.get("op")
+        self.value = definition.get("value")
+        self.detail_key = definition.get("detail_key", self.field)
+        self.category = definition.get("category", DEFAULT_SCORE_CATEGORY)
+
+        if self.kind == "compare":
+            self.cost = COLUMN_COSTS[self.column]
+            self._compare = OPERATORS[self.op]
+        elif self.kind == "pattern":
+            self.cost = "high"
+            self._pattern = re.compile(definition["pattern"])
+        else:
+            # "gstin" checks are table lookups over the whole batch
+            self.cost = "low"
+
+        # Per-rule statistics for this worker
+        self.evaluations = 0
+        self.hits = 0
+        self.time_ns = 0
+
+    def evaluate(self, batch: InvoiceBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate the rule for every invoice of the batch
+
+        Returns:
+            Outcome codes, and the mask of invoices the rule's value was missing for
+        """
+        if self.kind == "compare":
+            values, present = batch.column(self.column)
+            holds = self._compare(values, self.value)
+            outcomes = np.where(present, np.where(holds, PASS, self.severity), self.missing)
+            return outcomes.astype(np.int8), ~present
+
+        values = batch.field(self.field)
+        if self.kind == "pattern":
+            outcomes = [
+                self.missing if not value else PASS if self._pattern.match(value) else self.severity
+                for value in values
+            ]
+            return np.array(outcomes, dtype=np.int8), np.array([not value for value in values], dtype=bool)
+        if self.kind == "gstin":
+            present = np.array([bool(value) for value in values], dtype=bool)
+            valid = gstin_validator.check([normalize_gstin(value) for value in values]) == GSTIN_VALID
+            outcomes = np.where(present, np.where(valid, PASS, self.severity), self.missing)
+            return outcomes.astype(np.int8), ~present
+
+        # "present": the field must be set; "absent": it must not be
+        expected = self.kind == "present"
+        return np.array([PASS if bool(value) == expected else self.severity for value in values], dtype=np.int8), \
+            np.zeros(batch.size, dtype=bool)
+
+    def message(self, outcome: int, missing: bool) -> str:
+        if missing and "missing" in self.messages:
+            return self.messages["missing"]
+        return self.messages["pass" if outcome == PASS else "violation"]
+
+    def details(self, batch: InvoiceBatch, row: int, outcome: int, missing: bool) -> Dict[str, Any]:
+        invoice = batch.invoices[row]
+        if missing and outcome != PASS:
+            return {}
+        if self.kind == "pattern":
+            return {self.detail_key: invoice.get(self.field)}
+        if self.kind == "gstin":
+            decoded = gstin_validator.decode(normalize_gstin(invoice.get(self.field)))
+            details = {self.detail_key: decoded["gstin"], "state": decoded.get("state"), "pan": decoded.get("pan")}
+            if outcome != PASS:
+                details["reason"] = decoded["reason"]
+                details["candidates"] = field_corrector.gstin_candidates(decoded["gstin"])
+            return details
+        if self.kind == "absent":
+            return {} if outcome == PASS else {self.detail_key: invoice.get(self.field)}
+        if self.kind == "present":
+            value = invoice.get(self.field)
+            if outcome != PASS:
+                return {}
+            return {"count": len(value)} if isinstance(value, list) else {self.detail_key: value}
+        if self.column == "amount":
+            return {"amount": invoice.get("amount")}
+        if self.column == "payment_term_days":
+            invoice_dates, due_dates = batch.dates()
+            return {
+                "invoice_date": invoice_dates[row],
+                "due_date": due_dates[row],
+                "days": int(np.floor(batch.column("payment_term_days")[0][row])),
+            }
+        if self.column == "line_items_difference":
+            return {
+                "line_items_total": float(batch.column("line_items_total")[0][row]),
+                "invoice_amount": invoice.get("amount")
+            }
+        if self.column.startswith("seller_"):
+            profile = invoice.get("seller_profile") or {}
+            key = self.column[len("seller_"):]
+            details = {key: profile.get(key), "history": profile.get("history")}
+            typical = {"amount_zscore": "typical_amount", "terms_zscore": "typical_terms_days"}.get(key)
+            if typical in profile:
+                details[typical] = profile[typical]
+            return details
+        if self.column.startswith("population_"):
+            return batch.population_details(self.column[len("population_"):-len("_zscore")], row)
+        if self.column == "max_unit_price" and outcome != PASS:
+            return {"items": [
+                item for item in invoice.get("line_items") or [] if item.get("unit_price", 0) > self.value
+            ]}
+        return {}
+
+
+class RulePlan:
+    """
+    A compiled rule set
+
+    Cheap rules run first over the whole batch; expensive rules (regular
+    expressions, line item scans) then run only over the invoices no cheap
+    rule has failed, since those are rejected whatever else is found.
+    """
+
+    def __init__(self, rules: List[CompiledRule], fingerprint: str):
+        self.rules = rules
+        self.fingerprint = fingerprint
+        self.compiled_at = datetime.utcnow()
+        # Score category index of each rule, one per matrix column
+        self.categories = np.array([SCORE_CATEGORIES.index(rule.category) for rule in rules], dtype=np.int64)
+        self._cheap = [index for index, rule in enumerate(rules) if rule.cost == "low"]
+        self._expensive = [index for index, rule in enumerate(rules) if rule.cost != "low"]
+        self._stats_lock = threading.Lock()
+
+    def evaluate(self, invoices: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[List[Dict[str, Any]]]]:
+        """
+        Evaluate the rules over a batch of invoice documents
+
+        Returns:
+            The outcome matrix (one row per invoice, one column per rule) and
+            the validation results to store on each invoice
+        """
+        count = len(invoices)
+        matrix = np.zeros((count, len(self.rules)), dtype=np.int8)
+        missing = np.zeros((count, len(self.rules)), dtype=bool)
+        batch = InvoiceBatch(invoices)
+        self._run(self._cheap, batch, np.arange(count), matrix, missing)
+
+        survivors = np.flatnonzero(~np.isin(matrix, (FAIL, MISSING)).any(axis=1))
+        sub_batch = batch if len(survivors) == count else InvoiceBatch([invoices[row] for row in survivors])
+        if len(survivors):
+            self._run(self._expensive, sub_batch, survivors, matrix, missing)
+
+        # Row of each invoice within the batch its expensive rules ran on
+        sub_rows = np.full(count, -1)
+        sub_rows[survivors] = np.arange(len(survivors))
+
+        results = []
+        for row in range(count):
+            validation_results = []
+            for index, rule in enumerate(self.rules):
+                outcome = int(matrix[row, index])
+                if outcome == ABSENT:
+                    continue
+                rule_batch, rule_row = (batch, row) if rule.cost == "low" else (sub_batch, sub_rows[row])
+                validation_results.append({
+                    "check_name": rule.name,
+                    "result": OUTCOME_RESULTS[outcome],
+                    "message": rule.message(outcome, missing[row, index]),
+                    "details": rule.details(rule_batch, rule_row, outcome, missing[row, index]),
+                })
+            results.append(validation_results)
+        return matrix, results
+
+    def _run(
+        self,
+        indexes: List[int],
+        batch: InvoiceBatch,
+        rows: np.ndarray,
+        matrix: np.ndarray,
+        missing: np.ndarray
+    ) -> None:
+        for index in indexes:
+            rule = self.rules[index]
+            started = time.perf_counter_ns()
+            outcomes, rule_missing = rule.evaluate(batch)
+            elapsed = time.perf_counter_ns() - started
+            matrix[rows, index] = outcomes
+            missing[rows, index] = rule_missing
+            hits = int(np.count_nonzero((outcomes != PASS) & (outcomes != ABSENT)))
+            with self._stats_lock:
+                rule.evaluations += batch.size
+                rule.hits += hits
+                rule.time_ns += elapsed
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """
+        Get per-rule evaluation counts, hits (warnings and failures) and time
+        """
+        return [
+            {
+                "name": rule.name,
+                "cost": rule.cost,
+                "evaluations": rule.evaluations,
+                "hits": rule.hits,
+                "hit_rate": round(rule.hits / rule.evaluations, 4) if rule.evaluations else None,
+                "total_ms": round(rule.time_ns / 1e6, 3),
+                "avg_us_per_invoice": round(rule.time_ns / 1e3 / rule.evaluations, 3) if rule.evaluations else None,
+            }
+            for rule in self.rules
+        ]
+
+
+def compile_rules(definitions: List[Dict[str, Any]]) -> RulePlan:
+    """
+    Compile rule definitions into a plan
+
+    Raises:
+        ValueError: If a definition is invalid
+    """
+    rules, names = [], set()
+    for position, definition in enumerate(definitions):
+        label = definition.get("name") or f"rule {position}"
+        if not definition.get("name"):
+            raise ValueError(f"{label}: name is required")
+        if definition["name"] in names:
+            raise ValueError(f"{label}: duplicate rule name")
+        names.add(definition["name"])
+        if not definition.get("enabled", True):
+            continue
+
+        kind = definition.get("kind")
+        if kind not in ("compare", "pattern", "gstin", "present", "absent"):
+            raise ValueError(f"{label}: kind must be compare, pattern, gstin, present or absent")
+        if definition.get("severity", "warning") not in SEVERITIES:
+            raise ValueError(f"{label}: severity must be warning or fail")
+        if definition.get("category", DEFAULT_SCORE_CATEGORY) not in SCORE_CATEGORIES:
+            raise ValueError(f"{label}: category must be one of {', '.join(SCORE_CATEGORIES)}")
+        if definition.get("missing", "skip") not in MISSING_OUTCOMES:
+            raise ValueError(f"{label}: missing must be one of {', '.join(MISSING_OUTCOMES)}")
+        messages = definition.get("messages") or {}
+        if "pass" not in messages or "violation" not in messages:
+            raise ValueError(f"{label}: messages.pass and messages.violation are required")
+        if kind == "compare":
+            if definition.get("column") not in COLUMN_COSTS:
+                raise ValueError(f"{label}: column must be one of {', '.join(COLUMN_COSTS)}")
+            if definition.get("op") not in OPERATORS:
+                raise ValueError(f"{label}: op must be one of {', '.join(OPERATORS)}")
+            if not isinstance(definition.get("value"), (int, float)):
+                raise ValueError(f"{label}: value must be a number")
+        else:
+            if not definition.get("field"):
+                raise ValueError(f"{label}: field is required")
+        if kind == "pattern":
+            try:
+                re.compile(definition.get("pattern") or "")
+            except re.error as e:
+                raise ValueError(f"{label}: invalid pattern: {e}")
+
+        rules.append(CompiledRule(definition))
+
+    return RulePlan(rules, json.dumps(definitions, sort_keys=True, default=str))
+
+
+class RuleEngine:
+    """
+    Keeps the validation rule plan compiled from the `validationRules`
+    system settings, recompiling it only when the rules change.
+    """
+
+    def __init__(self):
+        self._plan: Optional[RulePlan] = None
+        self._source: Optional[List[Dict[str, Any]]] = None
+
+    async def get_plan(self) -> RulePlan:
+        """
+        Get the current rule plan
+
+        Settings are served from the settings cache, so this costs no
+        database read on the hot path; a settings change is picked up as
+        soon as the cache is invalidated.
+        """
+        definitions = (await settings_service.get_category("validationRules")).get("rules") or []
+        if self._plan is not None and definitions is self._source:
+            return self._plan
+
+        fingerprint = json.dumps(definitions, sort_keys=True, default=str)
+        if self._plan is None or fingerprint != self._plan.fingerprint:
+            try:
+                self._plan = compile_rules(definitions)
+                logger.info(f"Compiled {len(self._plan.rules)} validation rules")
+            except ValueError as e:
+                if self._plan is None:
+                    raise
+                # Keep validating with the last good plan
+                logger.error(f"Invalid validation rules, keeping the previous plan: {str(e)}")
+        self._source = definitions
+        return self._plan
+
+rule_engine = RuleEngine()
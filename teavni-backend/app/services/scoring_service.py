@@ -0,0 +1,130 @@
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.models.invoice import RiskTier
+from app.services.rule_engine import SCORE_CATEGORIES, DEFAULT_SCORE_CATEGORY, ABSENT, PASS, WARNING, FAIL
+from app.services.settings_service import settings_service
+
+# Outcome codes of stored or admin-submitted check results
+RESULT_OUTCOMES = {"pass": PASS, "warning": WARNING, "fail": FAIL}
+
+# Categories of the checks on the admin validation page, by check name
+REVIEW_CHECK_CATEGORIES = {
+    "GST Validation": "gstVerification",
+    "Buyer Verification": "buyerHistory",
+}
+
+RISK_TIER_KEYS = [
+    "tierAThreshold", "tierBThreshold", "tierCThreshold",
+    "gstVerificationWeight", "buyerHistoryWeight", "sellerHistoryWeight", "documentQualityWeight",
+]
+
+
+class ScoringModel:
+    """
+    Trust score weights and tier thresholds from one version of the
+    `riskTier` settings
+
+    A check is worth 1 point on PASS, 0.5 on WARNING and 0 otherwise. The
+    points are averaged per category, and the trust score is the average
+    of the categories that have checks, weighted by their `...Weight`
+    settings, on a 0-100 scale.
+    """
+
+    def __init__(self, risk_tier: Dict[str, Any]):
+        self.version: Tuple = tuple(risk_tier.get(key) for key in RISK_TIER_KEYS)
+        self.thresholds = [float(risk_tier[f"tier{tier}Threshold"]) for tier in ("A", "B", "C")]
+        self.weights = np.array([float(risk_tier[f"{category}Weight"]) for category in SCORE_CATEGORIES])
+
+    def score(self, matrix: np.ndarray, categories: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a batch of invoices
+
+        Args:
+            matrix: Outcome codes, one row per invoice and one column per check
+            categories: Score category index of each column
+
+        Returns:
+            Trust scores and risk tier values, one per invoice
+        """
+        membership = np.zeros((len(categories), len(SCORE_CATEGORIES)))
+        membership[np.arange(len(categories)), categories] = 1
+
+        points = (matrix == PASS) + 0.5 * (matrix == WARNING)
+        category_points = points @ membership
+        category_checks = (matrix != ABSENT) @ membership
+
+        weights = np.where(category_checks > 0, self.weights, 0)
+        total_weight = weights.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages = np.where(category_checks > 0, category_points / category_checks, 0)
+            trust_scores = np.where(
+                total_weight > 0,
+                np.floor((averages * weights).sum(axis=1) / total_weight * 100 + 1e-9),
+                0
+            ).astype(int)
+
+        tier_a, tier_b, tier_c = self.thresholds
+        risk_tiers = np.select(
+            [trust_scores >= tier_a, trust_scores >= tier_b, trust_scores >= tier_c],
+            [RiskTier.A.value, RiskTier.B.value, RiskTier.C.value],
+            RiskTier.D.value
+        )
+        return trust_scores, risk_tiers
+
+
+class ScoringService:
+    """
+    Service for trust scores and risk tiers, shared by automatic and admin validation
+
+    The scoring model is rebuilt only when the `riskTier` settings change;
+    settings are read from the settings cache, so scoring costs no
+    database read per invoice.
+    """
+
+    def __init__(self):
+        self._model: Optional[ScoringModel] = None
+
+    async def get_model(self) -> ScoringModel:
+        """
+        Get the scoring model for the current settings
+        """
+        risk_tier = await settings_service.get_category("riskTier")
+        if self._model is None or tuple(risk_tier.get(key) for key in RISK_TIER_KEYS) != self._model.version:
+            self._model = ScoringModel(risk_tier)
+        return self._model
+
+    async def score_results(
+        self,
+        results: List[List[Dict[str, Any]]],
+        check_categories: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, RiskTier]]:
+        """
+        Rescore invoices from their stored validation results, without
+        re-running the rules
+
+        Args:
+            results: Validation results (check_name, result) of each invoice
+            check_categories: Score category of each check name; unknown
+                checks count toward documentQuality
+
+        Returns:
+            (trust score, risk tier) per invoice
+        """
+        model = await self.get_model()
+        check_categories = check_categories or {}
+
+        names = list(dict.fromkeys(result["check_name"] for invoice_results in results for result in invoice_results))
+        columns = {name: index for index, name in enumerate(names)}
+        matrix = np.zeros((len(results), len(names)), dtype=np.int8)
+        for row, invoice_results in enumerate(results):
+            for result in invoice_results:
+                outcome = RESULT_OUTCOMES.get(str(getattr(result["result"], "value", result["result"])), ABSENT)
+                matrix[row, columns[result["check_name"]]] = outcome
+
+        categories = np.array([
+            SCORE_CATEGORIES.index(check_categories.get(name, DEFAULT_SCORE_CATEGORY)) for name in names
+        ], dtype=np.int64)
+        trust_scores, risk_tiers = model.score(matrix, categories)
+        return [(int(score), RiskTier(tier)) for score, tier in zip(trust_scores, risk_tiers)]
+
+scoring_service = ScoringService()
@@ -0,0 +1,212 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+
+# Trailing number of an invoice number, and the prefix before it
+SEQUENCE_NUMBER = re.compile(r"^(.*?)(\d{1,15})\D*$")
+PREFIX_NOISE = re.compile(r"[^A-Z0-9]")
+
+# Floors on the spread of a seller's history, so a seller who always
+# invoices the same amount or terms is not flagged for every change
+MIN_LOG_AMOUNT_STD = 0.1
+MIN_TERMS_STD_DAYS = 5.0
+
+MONTH_FIELDS = ["n", "amount_n", "amount_sum", "amount_sumsq", "terms_n", "terms_sum", "terms_sumsq"]
+
+
+def invoice_sequence(invoice_number: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Split an invoice number into its prefix and trailing sequence number,
+    so "INV/2024/0042" is number 42 of series "INV2024"
+    """
+    match = SEQUENCE_NUMBER.match((invoice_number or "").upper())
+    if not match:
+        return None
+    return PREFIX_NOISE.sub("", match.group(1)) or "_", int(match.group(2))
+
+
+def _month_key(moment: datetime) -> str:
+    return f"{moment.year:04d}{moment.month:02d}"
+
+
+def _window(moment: datetime) -> List[str]:
+    # Month keys of the feature window, latest first
+    year, month = moment.year, moment.month
+    keys = []
+    for _ in range(settings.SELLER_FEATURES_WINDOW_MONTHS):
+        keys.append(f"{year:04d}{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys
+
+
+def _payment_terms(invoice: Dict[str, Any]) -> Optional[float]:
+    invoice_date, due_date = invoice.get("invoice_date"), invoice.get("due_date")
+    if not isinstance(invoice_date, datetime) or not isinstance(due_date, datetime):
+        return None
+    return (due_date - invoice_date).total_seconds() / 86400
+
+
+def _zscore(value: float, count: float, total: float, total_squares: float, floor: float) -> Tuple[float, float]:
+    # z-score of value against the mean and standard deviation of the sums
+    mean = total / count
+    std = max(math.sqrt(max(total_squares / count - mean * mean, 0.0)), floor)
+    return (value - mean) / std, mean
+
+
+class SellerFeatureService:
+    """
+    Service for per-seller behavioural features
+
+    Each seller has one `seller_features` document holding, per month,
+    the count and the sums and sums of squares of their invoices' log
+    amounts and payment terms, plus the highest sequence number of each
+    invoice number series. Recording an invoice is one atomic `$inc`, and
+    the mean and spread over the window are a handful of sums, so
+    screening an invoice never reads the seller's invoice history.
+
+    Documents are cached in memory for SELLER_FEATURES_CACHE_SECONDS, so
+    invoices recorded by other workers are seen within that time, and
+    refreshed by this worker's own writes; a new
+    invoice is screened before it is recorded, so it is never compared
+    with itself. The screening result is stored on the invoice as
+    `seller_profile` for the seller rules to read.
+    """
+
+    def __init__(self):
+        # Seller ID -> (monotonic time read, features document)
+        self._features: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def screen(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Compare an invoice with its seller's history
+
+        Returns:
+            Dict[str, Any]: The history size and, where there is enough
+            history, the amount and payment terms z-scores, the gap to the
+            invoice number sequence and this month's invoice rate against
+            the seller's usual one
+        """
+        features = await self._get(invoice["seller_id"])
+        window = _window(invoice.get("created_at") or datetime.utcnow())
+        months = features.get("months") or {}
+        totals = {field: sum((months.get(key) or {}).get(field, 0) for key in window) for field in MONTH_FIELDS}
+
+        profile: Dict[str, Any] = {
+            "history": totals["n"],
+            "amount_zscore": None,
+            "terms_zscore": None,
+            "sequence_gap": None,
+            "burst_ratio": None,
+        }
+        if totals["n"] < settings.SELLER_FEATURES_MIN_HISTORY:
+            return profile
+
+        amount = float(invoice.get("amount") or 0)
+        if amount > 0 and totals["amount_n"]:
+            zscore, mean = _zscore(
+                math.log1p(amount), totals["amount_n"], totals["amount_sum"], totals["amount_sumsq"], MIN_LOG_AMOUNT_STD
+            )
+            profile["amount_zscore"] = round(zscore, 2)
+            profile["typical_amount"] = round(math.expm1(mean), 2)
+
+        terms = _payment_terms(invoice)
+        if terms is not None and totals["terms_n"] >= settings.SELLER_FEATURES_MIN_HISTORY:
+            zscore, mean = _zscore(terms, totals["terms_n"], totals["terms_sum"], totals["terms_sumsq"], MIN_TERMS_STD_DAYS)
+            profile["terms_zscore"] = round(zscore, 2)
+            profile["typical_terms_days"] = round(mean, 1)
+
+        sequence = invoice_sequence(invoice.get("invoice_number"))
+        last = (features.get("sequences") or {}).get(sequence[0]) if sequence else None
+        if last is not None:
+            profile["sequence_gap"] = sequence[1] - last
+
+        # This month so far (with the new invoice) against the seller's earlier active months
+        earlier = [months[key]["n"] for key in window[1:] if (months.get(key) or {}).get("n")]
+        if earlier:
+            current = (months.get(window[0]) or {}).get("n", 0) + 1
+            profile["burst_ratio"] = round(current / (sum(earlier) / len(earlier)), 2)
+
+        return profile
+
+    async def record(self, invoice: Dict[str, Any]) -> None:
+        """
+        Add a created invoice to its seller's features
+        """
+        created_at = invoice.get("created_at") or datetime.utcnow()
+        month = f"months.{_month_key(created_at)}"
+        increments: Dict[str, Any] = {"invoice_count": 1, f"{month}.n": 1}
+
+        amount = float(invoice.get("amount") or 0)
+        if amount > 0:
+            log_amount = math.log1p(amount)
+            increments.update({
+                f"{month}.amount_n": 1,
+                f"{month}.amount_sum": log_amount,
+                f"{month}.amount_sumsq": log_amount * log_amount,
+            })
+        terms = _payment_terms(invoice)
+        if terms is not None:
+            increments.update({
+                f"{month}.terms_n": 1,
+                f"{month}.terms_sum": terms,
+                f"{month}.terms_sumsq": terms * terms,
+            })
+
+        update: Dict[str, Any] = {
+            "$inc": increments,
+            "$min": {"first_invoice_at": created_at},
+            "$max": {"last_invoice_at": created_at},
+            "$set": {"updated_at": datetime.utcnow()},
+        }
+        sequence = invoice_sequence(invoice.get("invoice_number"))
+        if sequence:
+            update["$max"][f"sequences.{sequence[0]}"] = sequence[1]
+
+        seller_id = ObjectId(invoice["seller_id"])
+        features_collection = get_collection("seller_features")
+        try:
+            features = await features_collection.find_one_and_update(
+                {"seller_id": seller_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # First invoice of the seller recorded concurrently; the document exists now
+            features = await features_collection.find_one_and_update(
+                {"seller_id": seller_id}, update, return_document=ReturnDocument.AFTER
+            )
+
+        # Drop months that left the window
+        oldest = _window(created_at)[-1]
+        stale = [key for key in features.get("months") or {} if key < oldest]
+        if stale:
+            await features_collection.update_one(
+                {"seller_id": seller_id}, {"$unset": {f"months.{key}": "" for key in stale}}
+            )
+            for key in stale:
+                features["months"].pop(key)
+        self._cache(str(seller_id), features)
+
+    async def _get(self, seller_id: Any) -> Dict[str, Any]:
+        key = str(seller_id)
+        cached = self._features.get(key)
+        if cached and time.monotonic() - cached[0] < settings.SELLER_FEATURES_CACHE_SECONDS:
+            self._features.move_to_end(key)
+            return cached[1]
+        features = await get_collection("seller_features").find_one({"seller_id": ObjectId(key)}) or {}
+        self._cache(key, features)
+        return features
+
+    def _cache(self, key: str, features: Dict[str, Any]) -> None:
+        self._features[key] = (time.monotonic(), features)
+        self._features.move_to_end(key)
+        if len(self._features) > settings.SELLER_FEATURES_CACHE_SIZE:
+            self._features.popitem(last=False)
+
+seller_feature_service = SellerFeatureService()
@@ -0,0 +1,453 @@
+import asyncio
+import copy
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_collection
+from app.services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Default system settings, created on first read of the settings document (except
+# the validation rules, which are merged with the stored ones on every read)
+DEFAULT_SYSTEM_SETTINGS: Dict[str, Any] = {
+    "general": {
+        "platformName": "TEVANI",
+        "supportEmail": "support@tevani.com",
+        "supportPhone": "+91 9876543210",
+        "maintenanceMode": False
+    },
+    "security": {
+        "passwordMinLength": 8,
+        "passwordRequireSpecialChar": True,
+        "passwordRequireNumber": True,
+        "passwordRequireUppercase": True,
+        "twoFactorAuthRequired": True,
+        "sessionTimeout": 30,
+        "maxLoginAttempts": 5
+    },
+    "riskTier": {
+        "tierAThreshold": 90,
+        "tierBThreshold": 80,
+        "tierCThreshold": 70,
+        "tierDThreshold": 0,
+        "gstVerificationWeight": 30,
+        "buyerHistoryWeight": 25,
+        "sellerHistoryWeight": 25,
+        "documentQualityWeight": 20
+    },
+    "trrf": {
+        "defaultCoveragePercent": 20,
+        "maxCoveragePercent": 40,
+        "tierAMultiplier": 0.5,
+        "tierBMultiplier": 1.0,
+        "tierCMultiplier": 1.5,
+        "tierDMultiplier": 2.0
+    },
+    "notifications": {
+        "emailEnabled": True,
+        "whatsappEnabled": True,
+        "smsEnabled": False,
+        "reminderFrequency": 3,
+        "maxReminders": 3
+    },
+    # Invoice validation rules, compiled by the rule engine (app/services/rule_engine.py)
+    "validationRules": {
+        "rules": [
+            {
+                "name": "invoice_number_format",
+                "kind": "pattern",
+                "field": "invoice_number",
+                "pattern": r"^[A-Za-z0-9\-/]+$",
+                "severity": "warning",
+                "missing": "fail",
+                "messages": {
+                    "pass": "Invoice number format is valid",
+                    "violation": "Invoice number format is unusual",
+                    "missing": "Invoice number is missing"
+                }
+            },
+            {
+                "name": "invoice_amount",
+                "kind": "compare",
+                "column": "amount",
+                "op": "gt",
+                "value": 0,
+                "severity": "fail",
+                "missing": "fail",
+                "messages": {
+                    "pass": "Invoice amount is valid",
+                    "violation": "Invoice amount must be positive",
+                    "missing": "Invoice amount is missing"
+                }
+            },
+            {
+                "name": "date_sequence",
+                "kind": "compare",
+                "column": "payment_term_days",
+                "op": "ge",
+                "value": 0,
+                "severity": "fail",
+                "messages": {
+                    "pass": "Date sequence is valid",
+                    "violation": "Due date cannot be before invoice date"
+                }
+            },
+            {
+                "name": "gstin_format",
+                "kind": "gstin",
+                "field": "buyer_gstin",
+                "detail_key": "gstin",
+                "category": "gstVerification",
+                "severity": "warning",
+                "messages": {
+                    "pass": "GSTIN is valid",
+                    "violation": "GSTIN format, state code or check digit is invalid"
+                }
+            },
+            {
+                "name": "line_items_total",
+                "kind": "compare",
+                "column": "line_items_difference",
+                "op": "le",
+                "value": 0.01,
+                "severity": "warning",
+                "messages": {
+                    "pass": "Line items total matches invoice amount",
+                    "violation": "Line items total does not match invoice amount"
+                }
+            },
+            {
+                "name": "supporting_documents",
+                "kind": "present",
+                "field": "supporting_documents",
+                "severity": "warning",
+                "messages": {
+                    "pass": "Supporting documents are present",
+                    "violation": "No supporting documents provided"
+                }
+            },
+            {
+                "name": "file_hash",
+                "kind": "present",
+                "field": "hash",
+                "severity": "warning",
+                "messages": {
+                    "pass": "File hash is present for tamper detection",
+                    "violation": "No file hash available for tamper detection"
+                }
+            },
+            {
+                "name": "duplicate_invoice",
+                "kind": "absent",
+                "field": "possible_duplicates",
+                "severity": "warning",
+                "messages": {
+                    "pass": "No similar invoices found",
+                    "violation": "Similar invoices were already submitted"
+                }
+            },
+            {
+                "name": "near_duplicate",
+                "kind": "absent",
+                "field": "near_duplicates",
+                "severity": "warning",
+                "messages": {
+                    "pass": "No similar invoice images found",
+                    "violation": "An invoice with a similar image was already submitted"
+                }
+            },
+            {
+                "name": "round_amount",
+                "kind": "compare",
+                "column": "amount",
+                "op": "not_multiple_of",
+                "value": 1000,
+                "severity": "warning",
+                "missing": "pass",
+                "messages": {
+                    "pass": "Invoice amount is not suspiciously round",
+                    "violation": "Invoice amount is suspiciously round"
+                }
+            },
+            {
+                "name": "short_payment_terms",
+                "kind": "compare",
+                "column": "payment_term_days",
+                "op": "ge",
+                "value": 7,
+                "severity": "warning",
+                "messages": {
+                    "pass": "Payment terms are reasonable",
+                    "violation": "Payment terms are unusually short"
+                }
+            },
+            {
+                "name": "high_unit_prices",
+                "kind": "compare",
+                "column": "max_unit_price",
+                "op": "le",
+                "value": 10000,
+                "severity": "warning",
+                "messages": {
+                    "pass": "Line item unit prices are within reasonable ranges",
+                    "violation": "Some line items have unusually high unit prices"
+                }
+            },
+            {
+                "name": "seller_amount_outlier",
+                "kind": "compare",
+                "column": "seller_amount_zscore",
+                "op": "le",
+                "value": 5,
+                "severity": "warning",
+                "category": "sellerHistory",
+                "messages": {
+                    "pass": "Amount is in line with the seller's history",
+                    "violation": "Amount is far above the seller's usual invoices"
+                }
+            },
+            {
+                "name": "seller_payment_terms",
+                "kind": "compare",
+                "column": "seller_terms_zscore",
+                "op": "le",
+                "value": 5,
+                "severity": "warning",
+                "category": "sellerHistory",
+                "messages": {
+                    "pass": "Payment terms are in line with the seller's history",
+                    "violation": "Payment terms are unusual for this seller"
+                }
+            },
+            {
+                "name": "invoice_sequence",
+                "kind": "compare",
+                "column": "seller_sequence_gap",
+                "op": "le",
+                "value": 500,
+                "severity": "warning",
+                "category": "sellerHistory",
+                "messages": {
+                    "pass": "Invoice number follows the seller's sequence",
+                    "violation": "Invoice number is out of the seller's sequence"
+                }
+            },
+            {
+                "name": "seller_invoice_burst",
+                "kind": "compare",
+                "column": "seller_burst_ratio",
+                "op": "le",
+                "value": 5,
+                "severity": "warning",
+                "category": "sellerHistory",
+                "messages": {
+                    "pass": "Invoice volume is in line with the seller's history",
+                    "violation": "Seller is invoicing far more often than usual this month"
+                }
+            },
+            {
+                "name": "population_amount",
+                "kind": "compare",
+                "column": "population_amount_zscore",
+                "op": "le",
+                "value": 6,
+                "severity": "warning",
+                "category": "buyerHistory",
+                "messages": {
+                    "pass": "Amount is in line with similar invoices",
+                    "violation": "Amount is far above invoices to this buyer or from similar sellers"
+                }
+            },
+            {
+                "name": "population_payment_terms",
+                "kind": "compare",
+                "column": "population_terms_zscore",
+                "op": "le",
+                "value": 6,
+                "severity": "warning",
+                "category": "buyerHistory",
+                "messages": {
+                    "pass": "Payment terms are in line with similar invoices",
+                    "violation": "Payment terms are far from those of invoices to this buyer or from similar sellers"
+                }
+            },
+            {
+                "name": "population_unit_price",
+                "kind": "compare",
+                "column": "population_unit_price_zscore",
+                "op": "le",
+                "value": 6,
+                "severity": "warning",
+                "category": "documentQuality",
+                "messages": {
+                    "pass": "Line item prices are in line with similar invoices",
+                    "violation": "A line item price is far above those on invoices to this buyer or from similar sellers"
+                }
+            },
+        ]
+    },
+}
+
+
+def merge_rules(defaults: List[Dict[str, Any]], stored: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge stored validation rules over the default ones by name
+
+    A stored rule replaces the default of the same name (`"enabled": false`
+    disables it); other stored rules follow the defaults. Defaults added in
+    later releases apply to existing deployments.
+    """
+    overrides = {rule.get("name"): rule for rule in stored}
+    merged = [overrides.pop(rule["name"], rule) for rule in defaults]
+    return merged + [rule for rule in stored if rule.get("name") in overrides]
+
+
+class SettingsService:
+    """
+    Service for reading the admin-managed system settings document
+
+    The document is cached in memory and stamped with a `version` that
+    every update increments. While the watcher runs (started with the
+    app), the cache is kept until the version changes: the event bus
+    reports settings changes from the change stream, and without a live
+    change stream the watcher polls the version every
+    SETTINGS_VERSION_POLL_SECONDS. Without the watcher (scripts) cached
+    reads expire after SETTINGS_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._cached: Optional[Dict[str, Any]] = None
+        self._categories: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: float = 0.0
+        self._stale = True
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> int:
+        """
+        Version of the cached settings document (0 before the first load)
+        """
+        return self._cached.get("version", 0) if self._cached is not None else 0
+
+    async def get_settings(self, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get the system settings document, creating the defaults if missing.
+
+        Reads are served from memory so hot paths do not pay a database
+        round trip per call.
+        """
+        if use_cache and self._is_fresh():
+            return self._cached
+
+        settings_collection = get_collection("system_settings")
+        settings_doc = await settings_collection.find_one({"_id": "main"})
+
+        if not settings_doc:
+            defaults = {
+                category: values for category, values in DEFAULT_SYSTEM_SETTINGS.items()
+                if category != "validationRules"
+            }
+            settings_doc = {
+                "_id": "main",
+                **copy.deepcopy(defaults),
+                "version": 1,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }
+            try:
+                await settings_collection.insert_one(settings_doc)
+            except DuplicateKeyError:
+                # Another worker created it first
+                settings_doc = await settings_collection.find_one({"_id": "main"})
+
+        if self._cached is None or settings_doc.get("version", 0) != self.version:
+            self._categories = {}
+        self._cached = settings_doc
+        self._loaded_at = time.monotonic()
+        self._stale = False
+        return settings_doc
+
+    async def get_category(self, category: str) -> Dict[str, Any]:
+        """
+        Get one settings category, falling back to the defaults for missing keys
+
+        The merged category is built once per settings version; callers
+        must not modify it.
+        """
+        if not self._is_fresh():
+            await self.get_settings()
+        return self.get_cached_category(category)
+
+    def get_cached_category(self, category: str) -> Dict[str, Any]:
+        """
+        Get one settings category from memory without awaiting, for hot
+        paths; the defaults until the settings are first loaded
+        """
+        merged = self._categories.get(category)
+        if merged is None:
+            stored = (self._cached or {}).get(category) or {}
+            merged = {**DEFAULT_SYSTEM_SETTINGS.get(category, {}), **stored}
+            if category == "validationRules":
+                merged["rules"] = merge_rules(DEFAULT_SYSTEM_SETTINGS[category]["rules"], stored.get("rules") or [])
+            if self._cached is not None:
+                self._categories[category] = merged
+        return merged
+
+    def invalidate(self) -> None:
+        """
+        Mark the cached settings stale so the next read goes to the database
+
+        Synchronous readers keep the last loaded values until then.
+        """
+        self._stale = True
+
+    async def start(self) -> None:
+        """
+        Load the settings and start watching their version in the background
+        """
+        await self.get_settings(use_cache=False)
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        """
+        Stop watching the settings version
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _is_fresh(self) -> bool:
+        if self._cached is None or self._stale:
+            return False
+        return self._task is not None or time.monotonic() - self._loaded_at < settings.SETTINGS_CACHE_TTL_SECONDS
+
+    async def _watch(self) -> None:
+        """
+        Reload the settings when they change
+        """
+        while True:
+            await asyncio.sleep(settings.SETTINGS_VERSION_POLL_SECONDS)
+            try:
+                if self._stale:
+                    await self.get_settings(use_cache=False)
+                elif not event_bus.streaming:
+                    # No change stream to report updates: poll the version
+                    current = await get_collection("system_settings").find_one({"_id": "main"}, {"version": 1})
+                    if current and current.get("version", 0) != self.version:
+                        await self.get_settings(use_cache=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to refresh system settings: {str(e)}")
+
+settings_service = SettingsService()
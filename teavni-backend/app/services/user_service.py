@@ -66,9 +66,12 @@ async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any
         return None
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+async def get_user_from_token(token: str, scope: Optional[str] = None) -> Dict[str, Any]:
     """
-    Get the current user from the token
+    Get the user a token was issued to, requiring the token's scope to match
+
+    Session tokens carry no scope, so a scoped token such as an event stream
+    ticket cannot be used as a session token and vice versa.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -81,7 +84,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
@@ -97,6 +100,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
     
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    """
+    Get the current user from the token
+    """
+    return await get_user_from_token(token)
+
+async def get_investor_user(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    Get the current user, requiring an investor
+    """
+    if current_user.get("type") != UserType.INVESTOR:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Investor access required"
+        )
+    return current_user
+
 async def list_users(skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
     """
     List users with pagination
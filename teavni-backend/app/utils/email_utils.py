@@ -1,5 +1,7 @@
+import asyncio
 import smtplib
-from typing import Optional
+import time
+from typing import Optional, List, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.core.config import settings
@@ -7,6 +9,234 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# (from address, recipients, serialized message)
+OutgoingMessage = Tuple[str, List[str], str]
+
+
+class SMTPConnectionPool:
+    """
+    Pool of persistent, authenticated SMTP connections.
+
+    smtplib is blocking, so connecting and sending run in worker threads;
+    the event loop only awaits the result. Connections are reused across
+    messages (STARTTLS and login happen once per connection), checked with
+    NOOP after sitting idle, and re-established once if the server dropped them.
+    A batch of messages is sent back-to-back on one connection, and the
+    outcome of each message is reported separately.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _ensure_started(self) -> None:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self._size)
+
+    @staticmethod
+    def _connect() -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT, timeout=settings.EMAIL_TIMEOUT_SECONDS)
+        try:
+            if settings.EMAIL_USE_TLS:
+                server.starttls()
+            if settings.EMAIL_PASSWORD:
+                server.login(settings.EMAIL_USERNAME, settings.EMAIL_PASSWORD)
+        except Exception:
+            SMTPConnectionPool._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except OSError:
+            return False
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        # SMTPException subclasses OSError; only socket-level failures warrant a reconnect
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    def _deliver(
+        self,
+        server: Optional[smtplib.SMTP],
+        idle_since: float,
+        messages: List[OutgoingMessage]
+    ) -> Tuple[Optional[smtplib.SMTP], List[Optional[str]]]:
+        """
+        Send messages on one connection (runs in a worker thread)
+
+        A message the server refuses is reported and the connection moves on
+        to the next one. A dropped connection is re-established once and
+        sending resumes from the first undelivered message; if that fails
+        too, the undelivered messages are reported with the error. Failing
+        to connect before anything was sent raises.
+
+        Returns:
+            The connection to pool (None if it was lost) and the error of
+            each message, None for a delivered one
+        """
+        if server is not None and time.monotonic() - idle_since > settings.EMAIL_POOL_IDLE_CHECK_SECONDS:
+            if not self._is_alive(server):
+                self._close(server)
+                server = None
+
+        if server is None:
+            server = self._connect()
+
+        errors: List[Optional[str]] = []
+        reconnected = False
+        while len(errors) < len(messages):
+            from_addr, recipients, message = messages[len(errors)]
+            try:
+                server.sendmail(from_addr, recipients, message)
+                errors.append(None)
+            except Exception as e:
+                if not self._is_connection_error(e):
+                    # smtplib resets the transaction, so the connection stays usable
+                    errors.append(str(e) or type(e).__name__)
+                    continue
+                self._close(server)
+                server = None
+                if not reconnected:
+                    reconnected = True
+                    try:
+                        server = self._connect()
+                        continue
+                    except Exception as connect_error:
+                        e = connect_error
+                errors.extend([str(e) or type(e).__name__] * (len(messages) - len(errors)))
+        return server, errors
+
+    async def send(self, messages: List[OutgoingMessage]) -> List[Optional[str]]:
+        """
+        Send a batch of messages back-to-back over a single pooled connection
+
+        Returns:
+            List[Optional[str]]: The error of each message, None for a delivered one
+        """
+        self._ensure_started()
+        async with self._slots:
+            try:
+                server, idle_since = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                server, idle_since = None, 0.0
+
+            server, errors = await asyncio.to_thread(self._deliver, server, idle_since, messages)
+            if server is not None:
+                self._idle.put_nowait((server, time.monotonic()))
+            return errors
+
+    async def close(self) -> None:
+        """
+        Close all idle connections
+        """
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            server, _ = self._idle.get_nowait()
+            await asyncio.to_thread(self._close, server)
+
+
+class LocalMailTransport:
+    """
+    In-process stand-in for the SMTP server, used in development and tests.
+
+    Messages are kept in `outbox` instead of being delivered.
+    """
+
+    def __init__(self):
+        self.outbox: List[OutgoingMessage] = []
+
+    async def send(self, messages: List[OutgoingMessage]) -> List[Optional[str]]:
+        self.outbox.extend(messages)
+        return [None] * len(messages)
+
+    async def close(self) -> None:
+        pass
+
+
+_transport = None
+
+
+def get_mail_transport():
+    """
+    Get the process-wide mail transport, creating it from settings on first use
+    """
+    global _transport
+    if _transport is None:
+        if settings.EMAIL_TRANSPORT == "local":
+            _transport = LocalMailTransport()
+        else:
+            _transport = SMTPConnectionPool(settings.EMAIL_POOL_SIZE)
+    return _transport
+
+
+def set_mail_transport(transport) -> None:
+    """
+    Replace the mail transport (e.g. with a LocalMailTransport in tests)
+    """
+    global _transport
+    _transport = transport
+
+
+async def close_mail_transport() -> None:
+    """
+    Close pooled mail connections on shutdown
+    """
+    if _transport is not None:
+        await _transport.close()
+
+
+def build_email(
+    subject: str,
+    body: str,
+    to_email: str,
+    cc_email: Optional[str] = None,
+    from_name: str = "TEVANI Invoice Financing"
+) -> OutgoingMessage:
+    """
+    Build an HTML email ready for the mail transport
+    """
+    message = MIMEMultipart()
+    message["From"] = f"{from_name} <{settings.EMAIL_USERNAME}>"
+    message["To"] = to_email
+    message["Subject"] = subject
+
+    if cc_email:
+        message["Cc"] = cc_email
+
+    message.attach(MIMEText(body, "html"))
+
+    recipients = [to_email]
+    if cc_email:
+        recipients.append(cc_email)
+
+    return settings.EMAIL_USERNAME, recipients, message.as_string()
+
+
+def _log_authentication_error() -> None:
+    logger.error(
+        "Gmail authentication failed. Please ensure you're using an App Password, not your regular password. "
+        "To generate an App Password: "
+        "1. Go to your Google Account > Security > 2-Step Verification > App passwords "
+        "2. Select 'Mail' and 'Other (Custom name)' and enter 'TEVANI' "
+        "3. Copy the generated 16-character password and set it as EMAIL_PASSWORD environment variable"
+    )
+
+
 async def send_email(
     subject: str,
     body: str,
@@ -15,15 +245,15 @@ async def send_email(
     from_name: str = "TEVANI Invoice Financing"
 ):
     """
-    Send an email using SMTP
-    
+    Send an email through the pooled mail transport
+
     Args:
         subject: Email subject
         body: Email body (HTML)
         to_email: Recipient email address
         cc_email: CC email address (optional)
         from_name: Sender name (optional)
-    
+
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
@@ -31,52 +261,60 @@ async def send_email(
     if not settings.EMAIL_SENDING_ENABLED:
         logger.info(f"Email sending is disabled. Would have sent to {to_email} with subject '{subject}'")
         return True
-    
+
     # Check if email password is set
-    if not settings.EMAIL_PASSWORD:
+    if settings.EMAIL_TRANSPORT != "local" and not settings.EMAIL_PASSWORD:
         logger.warning("Email password not set. Please set EMAIL_PASSWORD environment variable.")
         return False
-    
+
     try:
-        # Create message
-        message = MIMEMultipart()
-        message["From"] = f"{from_name} <{settings.EMAIL_USERNAME}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        
-        if cc_email:
-            message["Cc"] = cc_email
-        
-        # Attach body
-        message.attach(MIMEText(body, "html"))
-        
-        # Connect to SMTP server
-        with smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
-            if settings.EMAIL_USE_TLS:
-                server.starttls()
-            
-            # Login
-            server.login(settings.EMAIL_USERNAME, settings.EMAIL_PASSWORD)
-            
-            # Send email
-            recipients = [to_email]
-            if cc_email:
-                recipients.append(cc_email)
-                
-            server.sendmail(settings.EMAIL_USERNAME, recipients, message.as_string())
-            
-            logger.info(f"Email sent to {to_email} with subject '{subject}'")
-            return True
-            
+        [error] = await get_mail_transport().send([build_email(subject, body, to_email, cc_email, from_name)])
+        if error:
+            logger.error(f"Failed to send email to {to_email}: {error}")
+            return False
+        logger.info(f"Email sent to {to_email} with subject '{subject}'")
+        return True
+
     except smtplib.SMTPAuthenticationError:
-        logger.error(
-            "Gmail authentication failed. Please ensure you're using an App Password, not your regular password. "
-            "To generate an App Password: "
-            "1. Go to your Google Account > Security > 2-Step Verification > App passwords "
-            "2. Select 'Mail' and 'Other (Custom name)' and enter 'TEVANI' "
-            "3. Copy the generated 16-character password and set it as EMAIL_PASSWORD environment variable"
-        )
+        _log_authentication_error()
         return False
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
         return False
+
+
+async def send_emails(messages: List[OutgoingMessage]) -> List[Optional[str]]:
+    """
+    Send several prepared emails back-to-back over one pooled connection
+
+    Args:
+        messages: Messages built with build_email
+
+    Returns:
+        List[Optional[str]]: The error of each message, None for a sent one;
+            messages are only reported failed if they were not delivered
+    """
+    if not messages:
+        return []
+
+    if not settings.EMAIL_SENDING_ENABLED:
+        logger.info(f"Email sending is disabled. Would have sent {len(messages)} emails")
+        return [None] * len(messages)
+
+    if settings.EMAIL_TRANSPORT != "local" and not settings.EMAIL_PASSWORD:
+        logger.warning("Email password not set. Please set EMAIL_PASSWORD environment variable.")
+        return ["Email password not set"] * len(messages)
+
+    try:
+        errors = await get_mail_transport().send(messages)
+    except smtplib.SMTPAuthenticationError as e:
+        # Raised before anything was sent
+        _log_authentication_error()
+        return [str(e)] * len(messages)
+    except Exception as e:
+        logger.error(f"Failed to send emails: {str(e)}")
+        return [str(e)] * len(messages)
+
+    failed = sum(1 for error in errors if error)
+    logger.info(f"Sent {len(messages) - failed} of {len(messages)} emails")
+    return errors
@@ -0,0 +1,37 @@
+import ipaddress
+from typing import Optional
+from fastapi import Request
+from app.core.config import settings
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in settings.TRUSTED_PROXIES)
+
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """
+    Get the address of the client that made a request
+
+    Behind a trusted proxy (TRUSTED_PROXIES) the client is the last address
+    in X-Forwarded-For that is not itself a trusted proxy; the header is
+    ignored on direct connections, where any client could forge it.
+    """
+    client_ip = request.client.host if request.client else None
+    if not client_ip or not _is_trusted(client_ip):
+        return client_ip
+
+    forwarded = [
+        address.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for address in header.split(",")
+        if address.strip()
+    ]
+    for address in reversed(forwarded):
+        if not _is_trusted(address):
+            return address
+        client_ip = address
+    return client_ip
@@ -0,0 +1,64 @@
+"""
+Resolve the buyer of invoices created before the buyer registry existed.
+
+Walks invoices without a `buyer_id` in `_id` order, resolves each to a
+registry entry (creating buyers as needed) and updates the buyers'
+invoice aggregates. Buyers without a GSTIN registered twice under the
+same name are merged and the buyer name trigram counts are rebuilt
+first; run it with the API stopped, as workers cache resolved buyers.
+Safe to re-run: resolved invoices are skipped.
+
+Usage:
+    python -m scripts.backfill_buyers
+"""
+
+import asyncio
+import sys
+import os
+import logging
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import connect_to_mongo, close_mongo_connection, get_collection, setup_collections
+from app.services.buyer_service import buyer_service
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Main function."""
+    await connect_to_mongo()
+    invoices_collection = get_collection("invoices")
+    resolved = 0
+    try:
+        merged = await buyer_service.merge_duplicate_names()
+        if merged:
+            logger.info(f"Merged {merged} duplicate buyers")
+            # Indexes that failed while the duplicates existed can now be built
+            await setup_collections()
+        await buyer_service.rebuild_trigram_counts()
+        cursor = invoices_collection.find(
+            {"buyer_id": {"$exists": False}},
+            {"buyer_name": 1, "buyer_gstin": 1, "amount": 1, "invoice_date": 1}
+        ).sort("_id", 1)
+        async for invoice in cursor:
+            buyer_id = await buyer_service.resolve_buyer(invoice.get("buyer_name"), invoice.get("buyer_gstin"))
+            await invoices_collection.update_one({"_id": invoice["_id"]}, {"$set": {"buyer_id": buyer_id}})
+            if buyer_id:
+                await buyer_service.record_invoice(buyer_id, invoice.get("amount"), invoice.get("invoice_date"))
+            resolved += 1
+            if resolved % 1000 == 0:
+                logger.info(f"Resolved {resolved} invoices")
+        logger.info(f"Backfill complete: {resolved} invoices resolved")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Rebuild the seller feature store from existing invoices.
+
+Clears `seller_features`, then records every invoice created within the
+feature window (SELLER_FEATURES_WINDOW_MONTHS) in creation order. Run it
+once after deploying the seller features, or whenever they drift; new
+invoices are recorded as they are created.
+
+Usage:
+    python -m scripts.backfill_seller_features
+"""
+
+import asyncio
+import sys
+import os
+import logging
+from datetime import datetime
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.services.seller_feature_service import seller_feature_service
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Main function."""
+    await connect_to_mongo()
+    recorded = 0
+    try:
+        await get_collection("seller_features").delete_many({})
+
+        now = datetime.utcnow()
+        months_back = now.year * 12 + now.month - 1 - (settings.SELLER_FEATURES_WINDOW_MONTHS - 1)
+        since = datetime(months_back // 12, months_back % 12 + 1, 1)
+        cursor = get_collection("invoices").find(
+            {"created_at": {"$gte": since}},
+            {"seller_id": 1, "amount": 1, "invoice_number": 1, "invoice_date": 1, "due_date": 1, "created_at": 1}
+        ).sort("created_at", 1)
+        async for invoice in cursor:
+            await seller_feature_service.record(invoice)
+            recorded += 1
+            if recorded % 1000 == 0:
+                logger.info(f"Recorded {recorded} invoices")
+        logger.info(f"Backfill complete: {recorded} invoices recorded")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
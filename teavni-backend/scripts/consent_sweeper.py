@@ -0,0 +1,46 @@
+"""
+Standalone worker for the periodic LegalBot passive consent sweep.
+
+Runs the same leader-elected scheduler as the API process, for
+deployments that set CONSENT_SWEEP_ENABLED=False on the API nodes and
+run the sweep as a separate worker instead.
+
+Usage:
+    python -m scripts.consent_sweeper
+"""
+
+import asyncio
+import sys
+import os
+import logging
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.services.consent_scheduler import consent_sweep_scheduler
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Main function."""
+    await connect_to_mongo()
+    logger.info(f"Consent sweeper running as {consent_sweep_scheduler.node_id}")
+    try:
+        await consent_sweep_scheduler.run_forever()
+    finally:
+        await consent_sweep_scheduler.stop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Consent sweeper stopped")
@@ -160,7 +160,9 @@ async def insert_test_data():
                             "consent_window_start": datetime.utcnow(),
                             "consent_window_end": datetime.utcnow() + timedelta(days=2),
                             "notifications": [],
-                            "logs": []
+                            "logs": [],
+                            "notification_count": 0,
+                            "log_count": 0
                         }
                         consent_result = await consent_records_collection.insert_one(consent_record)
                         logger.info("Inserted test consent record")
@@ -176,6 +178,7 @@ async def insert_test_data():
                             # Create test notification
                             notification = {
                                 "invoice_id": invoice["_id"],
+                                "consent_id": consent_result.inserted_id,
                                 "type": "email",
                                 "recipient": "buyer@techsolutions.com",
                                 "status": "sent",
@@ -191,7 +194,10 @@ async def insert_test_data():
                             # Update consent record with notification ID
                             await consent_records_collection.update_one(
                                 {"_id": consent_result.inserted_id},
-                                {"$push": {"notifications": notification_result.inserted_id}}
+                                {
+                                    "$push": {"notifications": notification_result.inserted_id},
+                                    "$inc": {"notification_count": 1}
+                                }
                             )
                            
                             # Create test consent log
@@ -204,6 +210,7 @@ async def insert_test_data():
                             else:
                                 # Create test consent log
                                 consent_log = {
+                                    "consent_id": consent_result.inserted_id,
                                     "invoice_id": invoice["_id"],
                                     "event": "notification_sent",
                                     "timestamp": datetime.utcnow(),
@@ -218,7 +225,10 @@ async def insert_test_data():
                                 # Update consent record with log ID
                                 await consent_records_collection.update_one(
                                     {"_id": consent_result.inserted_id},
-                                    {"$push": {"logs": log_result.inserted_id}}
+                                    {
+                                        "$push": {"logs": log_result.inserted_id},
+                                        "$inc": {"log_count": 1}
+                                    }
                                 )
        
         logger.info("Test data insertion completed")
@@ -0,0 +1,132 @@
+"""
+Stress the funding engine against oversubscription.
+
+Creates a scratch validated invoice, then has many investors fund it at
+once with random amounts, some partial, some retrying with the same
+idempotency key. Checks that the active investments add up to exactly the
+invoice's funded amount, that nothing was funded beyond the invoice amount
+or twice under one key, and that the invoice ended up FUNDED. The scratch
+invoice and its investments are removed afterwards.
+
+Run it against a development database only.
+
+Usage:
+    python -m scripts.stress_funding [--investors 2000] [--amount 5000000]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import os
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from app.core.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.models.investment import InvestmentStatus
+from app.models.invoice import InvoiceStatus
+from app.services.funding_service import funding_service, HALF_PAISA
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+async def invest(invoice_id: str, investor_id: str, key: str, amount: float, allow_partial: bool):
+    try:
+        return await funding_service.fund(investor_id, invoice_id, amount, key, allow_partial=allow_partial)
+    except ValueError:
+        return None
+
+
+async def main(investors: int, amount: float):
+    """Main function."""
+    await connect_to_mongo()
+    invoices_collection = get_collection("invoices")
+    investments_collection = get_collection("investments")
+    now = datetime.utcnow()
+    invoice_id = (await invoices_collection.insert_one({
+        "invoice_number": f"STRESS-{uuid.uuid4().hex[:8]}",
+        "seller_id": ObjectId(),
+        "buyer_name": "Stress Test Buyer",
+        "amount": float(amount),
+        "invoice_date": now,
+        "due_date": now + timedelta(days=60),
+        "status": InvoiceStatus.VALIDATED.value,
+        "risk_tier": "B",
+        "funded_amount": 0.0,
+        "available_amount": float(amount),
+        "created_at": now,
+        "updated_at": now,
+    })).inserted_id
+    try:
+        requests = []
+        for _ in range(investors):
+            investor_id = str(ObjectId())
+            key = str(uuid.uuid4())
+            request = (str(invoice_id), investor_id, key, round(random.uniform(1000, 50000), 2), random.random() < 0.5)
+            requests.append(request)
+            # Some clients retry the same request
+            if random.random() < 0.1:
+                requests.append(request)
+        random.shuffle(requests)
+
+        started = datetime.utcnow()
+        results = await asyncio.gather(*(invest(*request) for request in requests))
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        logger.info(
+            f"{len(requests)} requests in {elapsed:.1f}s: "
+            f"{sum(1 for result in results if result and result['status'] == InvestmentStatus.ACTIVE.value)} active, "
+            f"{sum(1 for result in results if result and result['status'] == InvestmentStatus.PENDING.value)} "
+            f"retries answered while the first attempt was pending, "
+            f"{sum(1 for result in results if not result)} refused"
+        )
+
+        invoice = await invoices_collection.find_one({"_id": invoice_id})
+        investments = await investments_collection.find({"invoice_id": invoice_id}).to_list(length=None)
+        active = [investment for investment in investments if investment["status"] == InvestmentStatus.ACTIVE.value]
+        invested = sum(investment["amount"] for investment in active)
+        problems = []
+        if abs(invested - invoice["funded_amount"]) >= HALF_PAISA:
+            problems.append(f"invested {invested:,.2f}, funded {invoice['funded_amount']:,.2f}")
+        if invoice.get("reservations"):
+            problems.append(f"{len(invoice['reservations'])} reservations left on the invoice")
+        if invoice["funded_amount"] > amount + HALF_PAISA or invoice["available_amount"] < 0:
+            problems.append(
+                f"oversubscribed: funded {invoice['funded_amount']:,.2f}, available {invoice['available_amount']:,.2f}"
+            )
+        if len({(investment["investor_id"], investment["idempotency_key"]) for investment in investments}) != len(investments):
+            problems.append("an idempotency key was funded twice")
+        if any(investment["status"] == InvestmentStatus.PENDING.value for investment in investments):
+            problems.append("investments left pending")
+        if invoice["status"] != InvoiceStatus.FUNDED.value:
+            problems.append(f"invoice is {invoice['status']}, not funded")
+
+        for problem in problems:
+            logger.error(problem)
+        if not problems:
+            logger.info(
+                f"OK: {len(active)} investments fund {invested:,.2f} of {amount:,.2f}, "
+                f"{len(investments) - len(active)} failed"
+            )
+        return not problems
+    finally:
+        await investments_collection.delete_many({"invoice_id": invoice_id})
+        await invoices_collection.delete_one({"_id": invoice_id})
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress the funding engine against oversubscription")
+    parser.add_argument("--investors", type=int, default=2000)
+    parser.add_argument("--amount", type=float, default=5000000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.investors, args.amount)) else 1)
@@ -0,0 +1,91 @@
+import asyncio
+import random
+from types import SimpleNamespace
+import pytest
+from pymongo import InsertOne, UpdateOne
+from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+from app.core import database
+from app.core.config import settings
+from app.services.event_bus import event_bus
+from app.utils.email_utils import LocalMailTransport, set_mail_transport
+
+
+@pytest.fixture
+def db():
+    """
+    An empty in-memory database in place of MongoDB, with the indexes the tests rely on
+    """
+    database.db.db = AsyncMongoMockClient()["tevani_test"]
+    asyncio.run(database.get_collection("investments").create_index(
+        [("investor_id", 1), ("idempotency_key", 1)], unique=True
+    ))
+    yield database.db.db
+    database.db.db = None
+
+
+@pytest.fixture
+def handlers():
+    """
+    Event bus subscriptions made by a test, dropped afterwards
+    """
+    saved = {event_type: list(subscribed) for event_type, subscribed in event_bus._handlers.items()}
+    yield event_bus
+    event_bus._handlers.clear()
+    event_bus._handlers.update(saved)
+
+
+@pytest.fixture
+def mail(monkeypatch):
+    """
+    Keep sent mail in memory instead of delivering it
+    """
+    monkeypatch.setattr(settings, "EMAIL_SENDING_ENABLED", True)
+    monkeypatch.setattr(settings, "EMAIL_TRANSPORT", "local")
+    transport = LocalMailTransport()
+    set_mail_transport(transport)
+    yield transport
+    set_mail_transport(None)
+
+
+@pytest.fixture
+def interleaved(monkeypatch):
+    """
+    Yield to other tasks around every database call, as a real server would,
+    so concurrent requests actually race
+    """
+    rng = random.Random(7)
+    for name in ("insert_one", "find_one", "find_one_and_update", "update_one"):
+        call = getattr(AsyncMongoMockCollection, name)
+
+        def racing(call):
+            async def wrapper(self, *args, **kwargs):
+                await asyncio.sleep(0)
+                result = await call(self, *args, **kwargs)
+                for _ in range(rng.randint(0, 3)):
+                    await asyncio.sleep(0)
+                return result
+            return wrapper
+
+        monkeypatch.setattr(AsyncMongoMockCollection, name, racing(call))
+
+
+@pytest.fixture
+def bulk_writes(monkeypatch):
+    """
+    Run bulk_write operations one at a time: mongomock's own bulk_write does
+    not work with the installed pymongo
+    """
+    async def bulk_write(self, operations, ordered=True, **kwargs):
+        matched = modified = 0
+        for operation in operations:
+            if isinstance(operation, UpdateOne):
+                result = await self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+                matched += result.matched_count
+                modified += result.modified_count
+            elif isinstance(operation, InsertOne):
+                await self.insert_one(operation._doc)
+            else:
+                raise NotImplementedError(type(operation).__name__)
+        return SimpleNamespace(matched_count=matched, modified_count=modified)
+
+    monkeypatch.setattr(AsyncMongoMockCollection, "bulk_write", bulk_write)
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from app.core.database import get_collection
+from app.core.schemas import buyer_indexes
+from app.services.buyer_service import BuyerService
+
+
+def create_buyer_indexes():
+    return get_collection("buyers").create_indexes(buyer_indexes)
+
+
+def test_concurrent_new_buyer_is_registered_once(db, interleaved, bulk_writes, monkeypatch):
+    async def run():
+        await create_buyer_indexes()
+
+        async def no_match(normalized_name):
+            return None
+
+        # Every request misses the lookup, as concurrent first invoices do
+        monkeypatch.setattr(BuyerService, "_match_by_name", staticmethod(no_match))
+        services = [BuyerService() for _ in range(10)]
+        buyer_ids = await asyncio.gather(*(service.resolve_buyer("Acme Steel Pvt Ltd") for service in services))
+
+        assert len(set(buyer_ids)) == 1
+        buyer = await get_collection("buyers").find_one({})
+        assert buyer["aliases"] == ["Acme Steel Pvt Ltd"]
+        assert await get_collection("buyers").count_documents({}) == 1
+        counts = await get_collection("buyer_trigrams").distinct("buyers")
+        assert counts == [1]
+
+    asyncio.run(run())
+
+
+def test_duplicate_names_are_merged(db):
+    async def run():
+        buyers = get_collection("buyers")
+        ids = [ObjectId() for _ in range(3)]
+        for index, buyer_id in enumerate(ids):
+            await buyers.insert_one({
+                "_id": buyer_id, "gstin": None, "name": f"Acme Steel {index}", "normalized_name": "acme steel",
+                "trigrams": [], "aliases": [f"Acme Steel {index}"], "invoice_count": index + 1,
+                "total_invoiced": 1000.0 * (index + 1), "last_invoice_at": datetime(2026, 1, index + 1),
+            })
+            await get_collection("invoices").insert_one({"buyer_id": buyer_id, "amount": 1000.0})
+        await buyers.insert_one({"gstin": "27AAPFU0939F1ZV", "normalized_name": "acme steel", "invoice_count": 0})
+
+        assert await BuyerService().merge_duplicate_names() == 2
+
+        kept = await buyers.find_one({"_id": ids[0]})
+        assert kept["invoice_count"] == 6
+        assert kept["total_invoiced"] == 6000.0
+        assert kept["last_invoice_at"] == datetime(2026, 1, 3)
+        assert sorted(kept["aliases"]) == ["Acme Steel 0", "Acme Steel 1", "Acme Steel 2"]
+        assert await get_collection("invoices").distinct("buyer_id") == [ids[0]]
+        assert await buyers.count_documents({}) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,164 @@
+import asyncio
+import smtplib
+import pytest
+from app.core.config import settings
+from app.utils import email_utils
+from app.utils.email_utils import SMTPConnectionPool
+
+
+class FakeSMTP:
+    """
+    SMTP connection that records what it was asked to do and can be made to drop
+    """
+
+    connections = []
+
+    def __init__(self, host, port, timeout=None):
+        self.logins = 0
+        self.noops = 0
+        self.sent = []
+        self.alive = True
+        self.drop_on_send = 0
+        self.refuse = set()
+        self.closed = False
+        FakeSMTP.connections.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        self.logins += 1
+
+    def noop(self):
+        self.noops += 1
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return 250, b"OK"
+
+    def sendmail(self, from_addr, recipients, message):
+        if message in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({recipients[0]: (550, b"No such user")})
+        if self.drop_on_send:
+            self.drop_on_send -= 1
+            self.alive = False
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(message)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    FakeSMTP.connections = []
+    monkeypatch.setattr(email_utils.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(settings, "EMAIL_PASSWORD", "app-password")
+    monkeypatch.setattr(settings, "EMAIL_POOL_IDLE_CHECK_SECONDS", 60)
+    return FakeSMTP
+
+
+def messages(*bodies):
+    return [("tevani@example.com", ["buyer@example.com"], body) for body in bodies]
+
+
+def test_connection_is_reused(smtp):
+    async def run():
+        pool = SMTPConnectionPool(1)
+        await pool.send(messages("first"))
+        await pool.send(messages("second"))
+
+        [server] = smtp.connections
+        assert server.sent == ["first", "second"]
+        assert server.logins == 1
+        assert server.noops == 0
+
+    asyncio.run(run())
+
+
+def test_idle_connection_is_checked_with_noop(smtp, monkeypatch):
+    async def run():
+        monkeypatch.setattr(settings, "EMAIL_POOL_IDLE_CHECK_SECONDS", -1)
+        pool = SMTPConnectionPool(1)
+        await pool.send(messages("first"))
+        await pool.send(messages("second"))
+
+        [server] = smtp.connections
+        assert server.noops == 1
+        assert server.sent == ["first", "second"]
+
+        # The server dropped the idle connection: reconnect before sending
+        server.alive = False
+        await pool.send(messages("third"))
+        assert server.closed
+        assert smtp.connections[1].sent == ["third"]
+
+    asyncio.run(run())
+
+
+def test_dropped_connection_is_reestablished_once(smtp):
+    async def run():
+        pool = SMTPConnectionPool(1)
+        await pool.send(messages("warm-up"))
+        server = smtp.connections[0]
+        server.drop_on_send = 1
+        await pool.send(messages("a", "b"))
+
+        # Sending resumes from the first undelivered message on a new connection
+        assert server.sent == ["warm-up"]
+        assert smtp.connections[1].sent == ["a", "b"]
+        assert smtp.connections[1].logins == 1
+
+    asyncio.run(run())
+
+
+def test_second_drop_fails_the_undelivered_messages(smtp, monkeypatch):
+    async def run():
+        connect = SMTPConnectionPool._connect
+
+        def dropping_connect():
+            server = connect()
+            server.drop_on_send = 1
+            return server
+
+        monkeypatch.setattr(SMTPConnectionPool, "_connect", staticmethod(dropping_connect))
+        pool = SMTPConnectionPool(1)
+        errors = await pool.send(messages("a", "b"))
+
+        assert errors[0] and errors[1]
+        assert len(smtp.connections) == 2
+        assert all(server.closed for server in smtp.connections)
+
+    asyncio.run(run())
+
+
+def test_failed_connect_is_raised(smtp, monkeypatch):
+    async def run():
+        def refusing_connect():
+            raise ConnectionRefusedError("connection refused")
+
+        monkeypatch.setattr(SMTPConnectionPool, "_connect", staticmethod(refusing_connect))
+        pool = SMTPConnectionPool(1)
+        with pytest.raises(ConnectionRefusedError):
+            await pool.send(messages("a"))
+
+    asyncio.run(run())
+
+
+def test_refused_message_is_reported_and_the_batch_continues(smtp):
+    async def run():
+        pool = SMTPConnectionPool(1)
+        await pool.send(messages("warm-up"))
+        smtp.connections[0].refuse = {"b"}
+        errors = await pool.send(messages("a", "b", "c"))
+
+        assert errors[0] is None and errors[2] is None
+        assert "No such user" in errors[1]
+        # A refused recipient does not cost the connection
+        assert len(smtp.connections) == 1
+        assert not smtp.connections[0].closed
+        assert smtp.connections[0].sent == ["warm-up", "a", "c"]
+
+    asyncio.run(run())
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.events import DomainEventType
+from app.models.legalbot import ConsentStatus
+from app.services.event_bus import EventBus, LocalChangeStream, change_to_event
+from app.services.legalbot_service import legalbot_service
+
+
+def change(collection, document, updated_fields=None):
+    return {
+        "ns": {"coll": collection},
+        "operationType": "insert" if updated_fields is None else "update",
+        "documentKey": {"_id": document["_id"]},
+        "updateDescription": {"updatedFields": updated_fields or {}},
+        "fullDocument": document,
+    }
+
+
+def test_changes_become_domain_events():
+    invoice = {"_id": ObjectId(), "seller_id": ObjectId(), "status": "validated", "ocr_data": {"text": "..."}}
+
+    created = change_to_event(change("invoices", invoice))
+    assert created.type == DomainEventType.INVOICE_CREATED
+    assert created.entity_id == created.invoice_id == str(invoice["_id"])
+    assert created.seller_id == str(invoice["seller_id"])
+    assert "ocr_data" not in created.document
+
+    moved = change_to_event(change("invoices", invoice, {"status": "validated", "updated_at": datetime.utcnow()}))
+    assert moved.type == DomainEventType.INVOICE_STATUS_CHANGED
+    assert moved.status == "validated"
+    assert moved.changed_fields == ["status", "updated_at"]
+
+    rescored = change_to_event(change("invoices", invoice, {"risk_tier": "C"}))
+    assert rescored.type == DomainEventType.INVOICE_UPDATED
+
+    consent = {"_id": ObjectId(), "invoice_id": invoice["_id"], "status": "acknowledged"}
+    decided = change_to_event(change("consent_records", consent, {"status": "acknowledged"}))
+    assert decided.type == DomainEventType.CONSENT_STATUS_CHANGED
+    assert decided.invoice_id == str(invoice["_id"])
+    # Other consent record updates are not events
+    assert change_to_event(change("consent_records", consent, {"log_count": 2})) is None
+    assert change_to_event(change("users", {"_id": ObjectId()})) is None
+
+
+async def run_bus(bus, stream, changes):
+    bus.start(lambda resume_after: stream)
+    for item in changes:
+        stream.push(item)
+    while bus.metrics["events"] < len(changes):
+        await asyncio.sleep(0.01)
+    await bus.stop()
+
+
+def test_events_are_dispatched_in_stream_order(db):
+    async def run():
+        bus = EventBus()
+        handled = []
+
+        async def record(event):
+            # Later events must wait for slower earlier ones
+            await asyncio.sleep(0.01 if len(handled) % 2 == 0 else 0)
+            handled.append(event.entity_id)
+
+        async def broken(event):
+            raise RuntimeError("handler failed")
+
+        bus.subscribe(record, DomainEventType.INVOICE_CREATED, DomainEventType.INVOICE_UPDATED)
+        bus.subscribe(broken, DomainEventType.INVOICE_UPDATED)
+        invoices = [{"_id": ObjectId(), "status": "pending_validation"} for _ in range(5)]
+        changes = [change("invoices", invoice) for invoice in invoices]
+        changes += [change("invoices", invoices[0], {"risk_tier": "A"})]
+        await run_bus(bus, LocalChangeStream(), changes)
+
+        assert handled == [str(invoice["_id"]) for invoice in invoices] + [str(invoices[0]["_id"])]
+        assert bus.metrics["handler_failures"] == 1
+
+    asyncio.run(run())
+
+
+def test_leader_resumes_after_the_last_processed_change(db):
+    async def run():
+        first = EventBus()
+        stream = LocalChangeStream()
+        await run_bus(first, stream, [change("invoices", {"_id": ObjectId()}) for _ in range(3)])
+        offset = await get_collection("event_bus_offsets").find_one({"_id": settings.EVENT_BUS_CONSUMER})
+        assert offset["token"] == stream.resume_token
+
+        resumed_from = []
+        second = EventBus()
+
+        def factory(resume_after):
+            resumed_from.append(resume_after)
+            return LocalChangeStream()
+
+        second.start(factory)
+        while not resumed_from:
+            await asyncio.sleep(0.01)
+        await second.stop()
+        assert resumed_from == [stream.resume_token]
+        assert second.is_leader is False
+
+    asyncio.run(run())
+
+
+def test_follower_does_not_save_its_position(db):
+    async def run():
+        leader, follower = EventBus(), EventBus()
+        leader_stream = LocalChangeStream()
+        leader.start(lambda resume_after: leader_stream)
+        while not leader.is_leader:
+            await asyncio.sleep(0.01)
+
+        resumed_from = []
+        follower_stream = LocalChangeStream()
+        follower.start(lambda resume_after: resumed_from.append(resume_after) or follower_stream)
+        follower_stream.push(change("invoices", {"_id": ObjectId()}))
+        while follower.metrics["events"] < 1:
+            await asyncio.sleep(0.01)
+        await follower.stop()
+        await leader.stop()
+
+        assert resumed_from[-1] is None
+        assert await get_collection("event_bus_offsets").count_documents({}) == 0
+
+    asyncio.run(run())
+
+
+def test_consent_decision_moves_the_invoice_without_the_bus(db, handlers):
+    async def run():
+        handlers._handlers.clear()
+        invoice_id = (await get_collection("invoices").insert_one({
+            "amount": 1000.0, "status": "pending_consent", "seller_id": ObjectId()
+        })).inserted_id
+        consent_id = (await get_collection("consent_records").insert_one({
+            "invoice_id": invoice_id, "status": "pending",
+            "consent_window_end": datetime.utcnow() + timedelta(hours=1),
+        })).inserted_id
+
+        await legalbot_service.update_consent_status(str(consent_id), ConsentStatus.ACKNOWLEDGED)
+
+        invoice = await get_collection("invoices").find_one({"_id": invoice_id})
+        assert invoice["status"] == "validated"
+        assert invoice["available_amount"] == 1000.0
+
+    asyncio.run(run())
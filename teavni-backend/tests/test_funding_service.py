@@ -0,0 +1,180 @@
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.core.database import get_collection
+from app.models.events import DomainEventType
+from app.services.event_handlers import update_marketplace_snapshot
+from app.services.funding_service import funding_service, HALF_PAISA
+from app.services.marketplace_service import marketplace_snapshot
+
+ALL_TIERS = ["A", "B", "C", "D"]
+
+
+async def create_invoice(amount=100000.0, due_in_days=60, **fields):
+    invoice = {
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}",
+        "seller_id": ObjectId(),
+        "buyer_name": "Buyer Ltd",
+        "amount": amount,
+        "due_date": datetime.utcnow() + timedelta(days=due_in_days),
+        "status": "validated",
+        "risk_tier": "B",
+        "funded_amount": 0.0,
+        "available_amount": amount,
+        **fields,
+    }
+    invoice["_id"] = (await get_collection("invoices").insert_one(invoice)).inserted_id
+    return invoice
+
+
+async def try_fund(*args, **kwargs):
+    try:
+        return await funding_service.fund(*args, **kwargs)
+    except ValueError:
+        return None
+
+
+def test_concurrent_investors_never_oversubscribe(db, interleaved):
+    async def run():
+        invoice = await create_invoice(amount=250000.37)
+        rng = random.Random(11)
+        requests = []
+        for _ in range(200):
+            request = (str(ObjectId()), str(invoice["_id"]), round(rng.uniform(1000, 20000), 2), str(uuid.uuid4()))
+            requests.append((request, rng.random() < 0.5))
+        await asyncio.gather(*(
+            try_fund(*request, allow_partial=allow_partial) for request, allow_partial in requests
+        ))
+
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        active = await get_collection("investments").find(
+            {"invoice_id": invoice["_id"], "status": "active"}
+        ).to_list(length=None)
+        invested = sum(investment["amount"] for investment in active)
+        assert abs(invested - (invoice["amount"] - invoice["available_amount"])) < HALF_PAISA
+        assert abs(invested - invoice["funded_amount"]) < HALF_PAISA
+        assert invoice["available_amount"] >= 0
+        assert invoice["status"] == "funded"
+        assert not invoice.get("reservations")
+        assert await get_collection("investments").count_documents({"status": "pending"}) == 0
+
+    asyncio.run(run())
+
+
+def test_replays_return_the_same_investment(db, interleaved):
+    async def run():
+        invoice = await create_invoice(amount=50000.0)
+        investor_id = str(ObjectId())
+        first = await funding_service.fund(investor_id, str(invoice["_id"]), 10000, "key-1")
+        replays = await asyncio.gather(*(
+            funding_service.fund(investor_id, str(invoice["_id"]), 10000, "key-1") for _ in range(20)
+        ))
+
+        assert {replay["id"] for replay in replays} == {first["id"]}
+        assert await get_collection("investments").count_documents({"investor_id": ObjectId(investor_id)}) == 1
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        assert invoice["funded_amount"] == 10000.0
+        with pytest.raises(ValueError):
+            await funding_service.fund(investor_id, str(invoice["_id"]), 20000, "key-1")
+
+    asyncio.run(run())
+
+
+def test_concurrent_replays_invest_once(db, interleaved):
+    async def run():
+        invoice = await create_invoice(amount=50000.0)
+        investor_id = str(ObjectId())
+        results = await asyncio.gather(*(
+            funding_service.fund(investor_id, str(invoice["_id"]), 10000, "key-1") for _ in range(20)
+        ))
+
+        assert len({result["id"] for result in results}) == 1
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        assert invoice["funded_amount"] == 10000.0
+
+    asyncio.run(run())
+
+
+def test_partial_fill_takes_what_is_left(db):
+    async def run():
+        invoice = await create_invoice(amount=15000.0)
+        await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 10000, "a")
+        with pytest.raises(ValueError):
+            await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 10000, "b")
+        rest = await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 10000, "c", allow_partial=True)
+
+        assert rest["amount"] == 5000.0
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        assert invoice["status"] == "funded"
+        assert invoice["available_amount"] == 0.0
+
+    asyncio.run(run())
+
+
+def test_past_due_invoice_is_not_funded(db):
+    async def run():
+        invoice = await create_invoice(due_in_days=-1)
+        with pytest.raises(ValueError):
+            await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 10000, "a")
+
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        assert invoice["funded_amount"] == 0.0
+
+    asyncio.run(run())
+
+
+def test_partial_funding_updates_the_marketplace_snapshot(db, handlers):
+    async def run():
+        handlers.subscribe(
+            update_marketplace_snapshot, DomainEventType.INVOICE_STATUS_CHANGED, DomainEventType.INVOICE_UPDATED
+        )
+        invoice = await create_invoice(amount=50000.0)
+        await marketplace_snapshot.reload()
+        try:
+            await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 10000, "a")
+            _, listings = marketplace_snapshot.query(ALL_TIERS, datetime.utcnow(), None, None, None, "return_desc", 0, 10)
+            assert listings[0]["available_amount"] == 40000.0
+
+            await funding_service.fund(str(ObjectId()), str(invoice["_id"]), 40000, "b")
+            total, _ = marketplace_snapshot.query(ALL_TIERS, datetime.utcnow(), None, None, None, "return_desc", 0, 10)
+            assert total == 0
+        finally:
+            marketplace_snapshot.ready = False
+
+    asyncio.run(run())
+
+
+def test_recovery_settles_interrupted_investments(db, monkeypatch):
+    async def run():
+        invoice = await create_invoice(amount=50000.0)
+        investor_id = ObjectId()
+        long_ago = datetime.utcnow() - timedelta(hours=1)
+        reserved, unreserved = ObjectId(), ObjectId()
+        for investment_id, key in ((reserved, "a"), (unreserved, "b")):
+            await get_collection("investments").insert_one({
+                "_id": investment_id, "investor_id": investor_id, "invoice_id": invoice["_id"],
+                "requested_amount": 5000.0, "allow_partial": False, "amount": 0.0, "status": "pending",
+                "idempotency_key": key, "created_at": long_ago, "updated_at": long_ago,
+            })
+        await get_collection("invoices").update_one(
+            {"_id": invoice["_id"]},
+            {
+                "$inc": {"available_amount": -5000.0, "funded_amount": 5000.0},
+                "$push": {"reservations": {"investment_id": reserved, "amount": 5000.0, "at": long_ago}},
+            }
+        )
+
+        assert await funding_service.recover_pending() == 2
+        statuses = {
+            investment["_id"]: investment["status"]
+            async for investment in get_collection("investments").find({})
+        }
+        assert statuses == {reserved: "active", unreserved: "failed"}
+        invoice = await get_collection("invoices").find_one({"_id": invoice["_id"]})
+        assert invoice["funded_amount"] == 5000.0
+        assert not invoice.get("reservations")
+
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+import pytest
+from app.services.gstin_validator import (
+    GSTIN_CHARSET,
+    MALFORMED,
+    UNKNOWN_STATE,
+    BAD_CHECK_DIGIT,
+    VALID,
+    gstin_validator,
+    normalize_gstin,
+)
+
+# Published GSTINs, the last with the check digit "Z"
+VALID_GSTINS = [
+    "27AAPFU0939F1ZV",
+    "29AAGCB7383J1Z4",
+    "33AAACH7409R1Z8",
+    "24AAACC1206D1ZM",
+    "09AAACH7409R1ZZ",
+]
+
+
+def reference_check_digit(prefix):
+    """
+    The GSTN check digit, computed without the validator's lookup tables
+    """
+    total = 0
+    for position, char in enumerate(prefix[:14]):
+        product = GSTIN_CHARSET.index(char) * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARSET[(36 - total % 36) % 36]
+
+
+def with_check_digit(prefix):
+    return prefix + reference_check_digit(prefix)
+
+
+@pytest.mark.parametrize("gstin", VALID_GSTINS)
+def test_known_gstins_are_valid(gstin):
+    assert reference_check_digit(gstin) == gstin[-1]
+    assert gstin_validator.check_digit(gstin) == gstin[-1]
+    assert gstin_validator.is_valid(gstin)
+
+
+@pytest.mark.parametrize("gstin", VALID_GSTINS)
+def test_single_character_corruptions_are_caught(gstin):
+    corruptions = [
+        gstin[:position] + char + gstin[position + 1:]
+        for position in range(len(gstin))
+        for char in GSTIN_CHARSET
+        if char != gstin[position]
+    ]
+    outcomes = gstin_validator.check(corruptions)
+    assert len(corruptions) == 15 * 35
+    assert not any(outcome == VALID for outcome in outcomes)
+
+
+@pytest.mark.parametrize("gstin", VALID_GSTINS)
+def test_adjacent_transpositions_are_caught(gstin):
+    transpositions = [
+        gstin[:position] + gstin[position + 1] + gstin[position] + gstin[position + 2:]
+        for position in range(len(gstin) - 1)
+        # Swapping "0" and "Z" keeps the mod-36 sum, as 09 <-> 90 does for Luhn
+        if gstin[position] != gstin[position + 1] and {gstin[position], gstin[position + 1]} != {"0", "Z"}
+    ]
+    assert transpositions
+    assert not any(outcome == VALID for outcome in gstin_validator.check(transpositions))
+
+
+@pytest.mark.parametrize("state_code", ["00", "39", "40", "96", "98"])
+def test_unknown_state_codes_are_rejected(state_code):
+    gstin = with_check_digit(state_code + "AAPFU0939F1Z")
+    assert gstin_validator.check([gstin])[0] == UNKNOWN_STATE
+    assert gstin_validator.decode(gstin)["reason"] == "unknown_state"
+
+
+@pytest.mark.parametrize("gstin, outcome", [
+    ("27AAPFU0939F1ZV", VALID),
+    ("27AAPFU0939F1ZW", BAD_CHECK_DIGIT),
+    ("27aapfu0939f1zv", MALFORMED),
+    ("27AAPFU0939F1Z", MALFORMED),
+    ("27AAPFU0939F1ZVX", MALFORMED),
+    # Holder type "X" is not a PAN holder type
+    (with_check_digit("27AAPXU0939F1Z"), MALFORMED),
+    # Entity number is never 0
+    (with_check_digit("27AAPFU0939F0Z"), MALFORMED),
+    ("27AAPFU0939F1ZÉ", MALFORMED),
+    (None, MALFORMED),
+    ("", MALFORMED),
+])
+def test_outcomes(gstin, outcome):
+    assert gstin_validator.check([gstin])[0] == outcome
+
+
+def test_batch_outcomes_keep_their_order():
+    gstins = ["27AAPFU0939F1ZV", None, "27AAPFU0939F1ZW", with_check_digit("00AAPFU0939F1Z"), "33AAACH7409R1Z8"]
+    assert list(gstin_validator.check(gstins)) == [VALID, MALFORMED, BAD_CHECK_DIGIT, UNKNOWN_STATE, VALID]
+
+
+def test_decode_extracts_the_pan():
+    decoded = gstin_validator.decode(normalize_gstin(" 27 aapfu-0939f 1zv "))
+    assert decoded == {
+        "gstin": "27AAPFU0939F1ZV",
+        "valid": True,
+        "reason": "valid",
+        "state_code": "27",
+        "state": "Maharashtra",
+        "pan": "AAPFU0939F",
+        "holder_type": "Firm",
+        "entity_number": "1",
+    }
+    assert gstin_validator.decode("27AAPFU0939F1Z") == {"gstin": "27AAPFU0939F1Z", "valid": False, "reason": "malformed"}
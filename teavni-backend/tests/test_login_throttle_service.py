@@ -0,0 +1,81 @@
+import asyncio
+import ipaddress
+import pytest
+from starlette.requests import Request
+from pydantic import ValidationError
+from app.core.config import Settings, settings
+from app.services.login_throttle_service import LoginThrottleService
+from app.utils.request_utils import get_client_ip
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def throttle(request, db, interleaved, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_THROTTLE_BACKEND", request.param)
+    monkeypatch.setattr(settings, "LOGIN_THROTTLE_IP_MULTIPLIER", 2)
+
+    async def max_attempts():
+        await asyncio.sleep(0)
+        return 3
+
+    monkeypatch.setattr(LoginThrottleService, "_max_attempts", staticmethod(max_attempts))
+    return LoginThrottleService()
+
+
+def test_concurrent_attempts_are_capped(throttle):
+    async def run():
+        results = await asyncio.gather(*(throttle.reserve("User@Example.com", "10.0.0.1") for _ in range(20)))
+        allowed = [attempt_id for retry_after, attempt_id in results if not retry_after]
+        assert len(allowed) == 3
+        assert all(retry_after > 0 for retry_after, attempt_id in results if attempt_id is None)
+
+    asyncio.run(run())
+
+
+def test_ip_limit_spans_emails(throttle):
+    async def run():
+        results = await asyncio.gather(*(throttle.reserve(f"user{i}@example.com", "10.0.0.1") for i in range(20)))
+        assert sum(1 for retry_after, _ in results if not retry_after) == 6
+
+        # Refused attempts were not counted against their email
+        retry_after, _ = await throttle.reserve("user19@example.com", "10.0.0.2")
+        assert retry_after == 0
+
+    asyncio.run(run())
+
+
+def test_successful_login_clears_its_attempts(throttle):
+    async def run():
+        for _ in range(2):
+            await throttle.reserve("user@example.com", "10.0.0.1")
+        retry_after, attempt_id = await throttle.reserve("user@example.com", "10.0.0.1")
+        assert retry_after == 0
+        await throttle.reset("user@example.com", "10.0.0.1", attempt_id)
+
+        results = [await throttle.reserve("user@example.com", "10.0.0.1") for _ in range(4)]
+        # The email starts over; the IP keeps its two failures plus three more
+        assert [retry_after == 0 for retry_after, _ in results] == [True, True, True, False]
+
+    asyncio.run(run())
+
+
+def request_from(client, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "client": (client, 12345), "headers": headers})
+
+
+def test_forwarded_for_is_only_trusted_from_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+    assert get_client_ip(request_from("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+    assert get_client_ip(request_from("10.0.0.5", "198.51.100.1")) == "198.51.100.1"
+    # A client-supplied entry in front of the proxies' is ignored
+    assert get_client_ip(request_from("10.0.0.5", "1.2.3.4, 198.51.100.1, 10.0.0.9")) == "198.51.100.1"
+    assert get_client_ip(request_from("10.0.0.5")) == "10.0.0.5"
+
+
+def test_malformed_trusted_proxy_fails_settings():
+    with pytest.raises(ValidationError, match="TRUSTED_PROXIES entry '10.0.0.0/33'"):
+        Settings(TRUSTED_PROXIES=["10.0.0.1", "10.0.0.0/33"])
+
+    parsed = Settings(TRUSTED_PROXIES=["10.0.0.1", "fd00::/8"]).TRUSTED_PROXIES
+    assert parsed == [ipaddress.ip_network("10.0.0.1/32"), ipaddress.ip_network("fd00::/8")]
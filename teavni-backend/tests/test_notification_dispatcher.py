@@ -0,0 +1,207 @@
+import asyncio
+import time
+from bson import ObjectId
+import pytest
+from app.core.config import settings
+from app.core.database import get_collection
+from app.models.legalbot import NotificationCreate, NotificationStatus, NotificationType
+from app.services.legalbot_service import legalbot_service
+from app.services.notification_dispatcher import NotificationDispatcher, _RateLimiter
+from app.utils.email_utils import LocalMailTransport, set_mail_transport
+
+
+class FlakyMailTransport(LocalMailTransport):
+    """
+    Local transport whose first `failures` sends raise
+    """
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.sends = 0
+
+    async def send(self, messages):
+        self.sends += 1
+        if self.sends <= self.failures:
+            raise ConnectionResetError("connection reset by peer")
+        return await super().send(messages)
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFICATION_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 3)
+
+
+async def queue_notification(notification_type=NotificationType.EMAIL, recipient="buyer@example.com"):
+    notification = await legalbot_service.send_notification(NotificationCreate(
+        invoice_id=str(ObjectId()), type=notification_type, recipient=recipient, content="Please confirm the invoice"
+    ))
+    return ObjectId(notification["id"])
+
+
+async def wait_until_settled(notification_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        notification = await get_collection("notifications").find_one({"_id": notification_id})
+        if notification["status"] != NotificationStatus.QUEUED:
+            return notification
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Notification {notification_id} still queued after {timeout}s")
+
+
+async def dispatch(notification_id):
+    dispatcher = NotificationDispatcher()
+    dispatcher.start()
+    try:
+        return await wait_until_settled(notification_id)
+    finally:
+        await dispatcher.stop()
+
+
+def test_queued_email_is_sent(db, mail):
+    async def run():
+        notification = await dispatch(await queue_notification())
+
+        assert notification["status"] == NotificationStatus.SENT
+        assert notification["attempts"] == 1
+        assert notification["message_id"] == f"email_{notification['_id']}"
+        [(_, recipients, message)] = mail.outbox
+        assert recipients == ["buyer@example.com"]
+        assert "Please confirm the invoice" in message
+
+    asyncio.run(run())
+
+
+def test_failed_delivery_is_retried(db, mail, fast_retries):
+    async def run():
+        transport = FlakyMailTransport(failures=2)
+        set_mail_transport(transport)
+        notification = await dispatch(await queue_notification())
+
+        assert notification["status"] == NotificationStatus.SENT
+        assert notification["attempts"] == 3
+        assert notification["last_error"] is None
+        assert transport.sends == 3
+        assert len(transport.outbox) == 1
+
+    asyncio.run(run())
+
+
+def test_delivery_is_dead_lettered_after_max_attempts(db, mail, fast_retries):
+    async def run():
+        transport = FlakyMailTransport(failures=10)
+        set_mail_transport(transport)
+        notification = await dispatch(await queue_notification())
+
+        assert notification["status"] == NotificationStatus.FAILED
+        assert notification["attempts"] == settings.NOTIFICATION_MAX_ATTEMPTS
+        assert notification["last_error"]
+        assert notification["dead_lettered_at"]
+        assert transport.sends == settings.NOTIFICATION_MAX_ATTEMPTS
+        assert not transport.outbox
+
+    asyncio.run(run())
+
+
+def test_failed_delivery_backs_off(db, mail):
+    async def run():
+        set_mail_transport(FlakyMailTransport(failures=1))
+        notification_id = await queue_notification()
+        dispatcher = NotificationDispatcher()
+        dispatcher.start()
+        try:
+            deadline = time.monotonic() + 5
+            notification = None
+            while time.monotonic() < deadline and not (notification and notification["last_error"]):
+                await asyncio.sleep(0.01)
+                notification = await get_collection("notifications").find_one({"_id": notification_id})
+        finally:
+            await dispatcher.stop()
+
+        assert notification["status"] == NotificationStatus.QUEUED
+        assert notification["attempts"] == 1
+        backoff = (notification["next_attempt_at"] - notification["created_at"]).total_seconds()
+        assert 0.8 * settings.NOTIFICATION_RETRY_BASE_SECONDS <= backoff <= 1.2 * settings.NOTIFICATION_RETRY_BASE_SECONDS + 1
+
+    asyncio.run(run())
+
+
+def test_notification_without_provider_is_not_retried(db, mail, fast_retries):
+    async def run():
+        notification_id = await queue_notification(NotificationType.SMS, "+919800000000")
+        notification = await get_collection("notifications").find_one({"_id": notification_id})
+        assert notification["status"] == NotificationStatus.FAILED
+        assert notification["attempts"] == 0
+
+        # Left queued from before unsupported types were refused
+        await get_collection("notifications").update_one(
+            {"_id": notification_id},
+            {"$set": {"status": NotificationStatus.QUEUED, "next_attempt_at": notification["created_at"]}}
+        )
+        notification = await dispatch(notification_id)
+        assert notification["status"] == NotificationStatus.FAILED
+        assert notification["attempts"] == 1
+        assert not mail.outbox
+
+    asyncio.run(run())
+
+
+class CountingMailTransport(LocalMailTransport):
+    """
+    Local transport that counts batches and refuses some recipients
+    """
+
+    def __init__(self, refused=()):
+        super().__init__()
+        self.refused = set(refused)
+        self.batches = []
+
+    async def send(self, messages):
+        self.batches.append(len(messages))
+        self.outbox.extend(message for message in messages if message[1][0] not in self.refused)
+        return [
+            "550 No such user" if recipients[0] in self.refused else None
+            for _, recipients, _ in messages
+        ]
+
+
+def test_queued_emails_are_sent_in_one_batch(db, mail, fast_retries, monkeypatch):
+    async def run():
+        monkeypatch.setattr(settings, "NOTIFICATION_RATE_LIMITS", {"email": 100.0})
+        transport = CountingMailTransport(refused={"buyer2@example.com"})
+        set_mail_transport(transport)
+        notification_ids = [await queue_notification(recipient=f"buyer{i}@example.com") for i in range(5)]
+
+        dispatcher = NotificationDispatcher()
+        dispatcher.start()
+        try:
+            notifications = [await wait_until_settled(notification_id) for notification_id in notification_ids]
+        finally:
+            await dispatcher.stop()
+
+        # One connection carries the whole queue; a refused recipient fails only its own notification
+        assert transport.batches == [5] + [1] * (settings.NOTIFICATION_MAX_ATTEMPTS - 1)
+        assert [notification["status"] for notification in notifications] == [
+            NotificationStatus.SENT, NotificationStatus.SENT, NotificationStatus.FAILED,
+            NotificationStatus.SENT, NotificationStatus.SENT
+        ]
+        assert notifications[2]["last_error"] == "550 No such user"
+        assert all(notification["attempts"] == 1 for i, notification in enumerate(notifications) if i != 2)
+        assert len(transport.outbox) == 4
+
+    asyncio.run(run())
+
+
+def test_rate_limit_below_one_per_second_still_delivers():
+    async def run():
+        limiter = _RateLimiter(0.5)
+        await limiter.acquire()
+        started = time.monotonic()
+        await asyncio.wait_for(limiter.acquire(), timeout=5)
+        assert 1.5 < time.monotonic() - started < 2.5
+
+    with pytest.raises(ValueError):
+        _RateLimiter(0)
+    asyncio.run(run())
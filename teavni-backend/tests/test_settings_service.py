@@ -0,0 +1,50 @@
+import asyncio
+from app.core.database import get_collection
+from app.services.rule_engine import compile_rules
+from app.services.settings_service import DEFAULT_SYSTEM_SETTINGS, SettingsService, merge_rules
+
+DEFAULT_RULES = DEFAULT_SYSTEM_SETTINGS["validationRules"]["rules"]
+
+
+def rule_names(rules):
+    return [rule["name"] for rule in rules]
+
+
+def test_stored_rules_override_defaults_by_name():
+    first, second = DEFAULT_RULES[0], DEFAULT_RULES[1]
+    custom = {**first, "name": "custom_rule"}
+    stored = [custom, {**second, "severity": "fail"}, {"name": first["name"], "enabled": False}]
+
+    merged = merge_rules(DEFAULT_RULES, stored)
+
+    assert rule_names(merged) == rule_names(DEFAULT_RULES) + ["custom_rule"]
+    assert merged[0] == {"name": first["name"], "enabled": False}
+    assert merged[1]["severity"] == "fail"
+    assert merged[2:-1] == DEFAULT_RULES[2:]
+    compile_rules(merged)
+
+
+def test_new_default_rules_apply_to_existing_settings(db):
+    async def run():
+        # Saved before the last default rule existed
+        await get_collection("system_settings").insert_one({
+            "_id": "main", "version": 3, "validationRules": {"rules": DEFAULT_RULES[:-1]}
+        })
+        service = SettingsService()
+        rules = (await service.get_category("validationRules"))["rules"]
+        assert rule_names(rules) == rule_names(DEFAULT_RULES)
+
+    asyncio.run(run())
+
+
+def test_default_rules_are_not_persisted(db):
+    async def run():
+        service = SettingsService()
+        rules = (await service.get_category("validationRules"))["rules"]
+        assert rule_names(rules) == rule_names(DEFAULT_RULES)
+
+        stored = await get_collection("system_settings").find_one({"_id": "main"})
+        assert "validationRules" not in stored
+        assert stored["security"] == DEFAULT_SYSTEM_SETTINGS["security"]
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from app.core.config import settings
+from app.api.routes.events import get_stream_user
+from app.core.database import get_collection
+from app.core.security import create_access_token, create_stream_ticket
+from app.services.user_service import get_current_user
+
+
+async def create_user():
+    result = await get_collection("users").insert_one({
+        "email": "seller@example.com", "hashed_password": "x", "type": "msme"
+    })
+    return str(result.inserted_id)
+
+
+def stream_request(authorization=None):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "method": "GET", "path": "/api/events/stream", "headers": headers})
+
+
+def test_ticket_opens_the_stream(db):
+    async def run():
+        user_id = await create_user()
+        user = await get_stream_user(stream_request(), ticket=create_stream_ticket(user_id))
+        assert user["id"] == user_id
+
+    asyncio.run(run())
+
+
+def test_session_token_is_not_a_ticket(db):
+    async def run():
+        user_id = await create_user()
+        with pytest.raises(HTTPException) as error:
+            await get_stream_user(stream_request(), ticket=create_access_token(user_id))
+        assert error.value.status_code == 401
+
+        # Non-browser clients can still send the session token as a header
+        user = await get_stream_user(stream_request(f"Bearer {create_access_token(user_id)}"), ticket=None)
+        assert user["id"] == user_id
+
+    asyncio.run(run())
+
+
+def test_ticket_is_not_a_session_token(db):
+    async def run():
+        user_id = await create_user()
+        with pytest.raises(HTTPException) as error:
+            await get_current_user(create_stream_ticket(user_id))
+        assert error.value.status_code == 401
+
+    asyncio.run(run())
+
+
+def test_expired_ticket_is_refused(db, monkeypatch):
+    async def run():
+        user_id = await create_user()
+        monkeypatch.setattr(settings, "EVENT_STREAM_TICKET_SECONDS", -1)
+        with pytest.raises(HTTPException) as error:
+            await get_stream_user(stream_request(), ticket=create_stream_ticket(user_id))
+        assert error.value.status_code == 401
+
+    asyncio.run(run())
@@ -8,7 +8,7 @@ import { Button } from '../../../../components/ui/button';
 import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle } from '../../../../components/ui/card';
 import { Badge } from '../../../../components/ui/badge';
 import { Separator } from '../../../../components/ui/separator';
-import { invoiceAPI } from '../../../../lib/api';
+import { eventsAPI, invoiceAPI } from '../../../../lib/api';
 import ConsentStatus from '../../../../components/invoice/ConsentStatus';
 
 export default function InvoiceDetailPage() {
@@ -48,6 +48,16 @@ export default function InvoiceDetailPage() {
     }
   }, [invoiceId]);
 
+  // Apply status, validation and funding updates pushed by the server
+  useEffect(() => {
+    if (!invoiceId) return;
+    return eventsAPI.subscribe((event) => {
+      if (event.type !== 'consent_status_changed') {
+        setInvoice((current: any) => current && { ...current, ...event.data });
+      }
+    }, invoiceId);
+  }, [invoiceId]);
+
   const getStatusBadge = () => {
     if (!invoice) return null;
 
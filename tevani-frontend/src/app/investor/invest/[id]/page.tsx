@@ -1,6 +1,6 @@
 'use client';
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useParams, useRouter } from "next/navigation";
 import Link from "next/link";
 import { useAuth } from "../../../../contexts/AuthContext";
@@ -17,7 +17,7 @@ import { Input } from "../../../../components/ui/input";
 import { Label } from "../../../../components/ui/label";
 import { Separator } from "../../../../components/ui/separator";
 import { formatCurrency, formatDate } from "../../../../lib/utils";
-import { invoiceAPI } from "../../../../lib/api";
+import { invoiceAPI, investmentAPI } from "../../../../lib/api";
 
 export default function InvestPage() {
   const { user } = useAuth();
@@ -29,6 +29,8 @@ export default function InvestPage() {
   const [investmentAmount, setInvestmentAmount] = useState<string>("");
   const [submitting, setSubmitting] = useState(false);
   const [success, setSuccess] = useState(false);
+  // One key per investment, so resubmitting after a lost response cannot invest twice
+  const idempotencyKey = useRef<string>(crypto.randomUUID());
 
   useEffect(() => {
     const fetchInvoiceDetails = async () => {
@@ -90,9 +92,14 @@ export default function InvestPage() {
       setSubmitting(true);
       setError(null);
       
-      // In a real app, this would make an API call to create an investment
-      // For now, we'll simulate a successful investment
-      await new Promise(resolve => setTimeout(resolve, 1500));
+      const investment = await investmentAPI.createInvestment(
+        { invoice_id: params.id as string, amount: parseFloat(investmentAmount) },
+        idempotencyKey.current
+      );
+      if (investment.amount) {
+        // What was actually reserved, rounded to the paisa
+        setInvestmentAmount(investment.amount.toString());
+      }
       
       setSuccess(true);
       
@@ -101,9 +108,13 @@ export default function InvestPage() {
         router.push('/investor/portfolio');
       }, 2000);
       
-    } catch (error) {
+    } catch (error: any) {
       console.error("Failed to submit investment:", error);
-      setError("Failed to process your investment. Please try again later.");
+      if (error.response) {
+        // The server turned this investment down; a new attempt needs a new key
+        idempotencyKey.current = crypto.randomUUID();
+      }
+      setError(error.response?.data?.detail || "Failed to process your investment. Please try again later.");
     } finally {
       setSubmitting(false);
     }
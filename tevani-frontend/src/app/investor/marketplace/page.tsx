@@ -30,81 +30,55 @@ export default function MarketplacePage() {
   const [industryFilter, setIndustryFilter] = useState<string>("all");
   const [sortBy, setSortBy] = useState<string>("return_desc");
   const [showFilters, setShowFilters] = useState(false);
+  const [total, setTotal] = useState(0);
 
   useEffect(() => {
-    // Fetch invoices from the API
+    // Fetch invoices from the marketplace API; sorting and the risk filter run on the server
     const fetchInvoices = async () => {
       try {
         setLoading(true);
-        // For investor users, we want to get all available invoices
-        const data = await invoiceAPI.getInvoices({ status: "validated" });
-        
-        // Process the data to add marketplace-specific fields
-        const processedData = data.map((invoice: any) => {
-          // Calculate days to maturity
-          const dueDate = new Date(invoice.due_date);
-          const today = new Date();
-          const daysToMaturity = Math.max(0, Math.ceil((dueDate.getTime() - today.getTime()) / (1000 * 60 * 60 * 24)));
-          
-          // Calculate return rate based on risk tier
-          let returnRate = 12.0; // Base rate
-          if (invoice.risk_tier === 'B') returnRate = 14.0;
-          if (invoice.risk_tier === 'C') returnRate = 15.5;
-          if (invoice.risk_tier === 'D') returnRate = 17.0;
-          
-          // Check if invoice is starred by this investor
-          const starredInvoices = JSON.parse(localStorage.getItem('starredInvoices') || '[]');
-          const starred = starredInvoices.includes(invoice.id);
-          
-          return {
-            ...invoice,
-            company_name: invoice.seller_name || "Unknown Company",
-            industry: invoice.industry || "Miscellaneous",
-            days_to_maturity: daysToMaturity,
-            return_rate: returnRate,
-            starred
-          };
+        const data = await invoiceAPI.getMarketplaceInvoices({
+          sort: sortBy,
+          risk_tier: riskFilter === "all" ? undefined : riskFilter,
+          limit: 100
         });
         
-        setInvoices(processedData);
+        setInvoices(data.invoices.map((invoice: any) => ({
+          ...invoice,
+          company_name: invoice.seller_name || "Unknown Company",
+          industry: invoice.industry || "Miscellaneous"
+        })));
+        setTotal(data.total);
       } catch (error) {
         console.error("Failed to fetch invoices:", error);
-        // Fallback to localStorage if API fails
-        const storedInvoices = JSON.parse(localStorage.getItem('marketplaceInvoices') || '[]');
-        setInvoices(storedInvoices);
       } finally {
         setLoading(false);
       }
     };
     
     fetchInvoices();
-  }, []);
+  }, [sortBy, riskFilter]);
 
   // Toggle star status
-  const toggleStar = (id: string) => {
-    // Update local state
-    setInvoices(invoices.map(invoice =>
-      invoice.id === id ? { ...invoice, starred: !invoice.starred } : invoice
-    ));
-    
-    // Update localStorage
-    const starredInvoices = JSON.parse(localStorage.getItem('starredInvoices') || '[]');
-    const isStarred = starredInvoices.includes(id);
+  const toggleStar = async (id: string) => {
+    const invoice = invoices.find(invoice => invoice.id === id);
+    if (!invoice) return;
     
-    if (isStarred) {
-      // Remove from starred
-      const updatedStarred = starredInvoices.filter((invoiceId: string) => invoiceId !== id);
-      localStorage.setItem('starredInvoices', JSON.stringify(updatedStarred));
-    } else {
-      // Add to starred
-      starredInvoices.push(id);
-      localStorage.setItem('starredInvoices', JSON.stringify(starredInvoices));
+    try {
+      if (invoice.starred) {
+        await invoiceAPI.unstarInvoice(id);
+      } else {
+        await invoiceAPI.starInvoice(id);
+      }
+      setInvoices(invoices.map(invoice =>
+        invoice.id === id ? { ...invoice, starred: !invoice.starred } : invoice
+      ));
+    } catch (error) {
+      console.error("Failed to update starred invoice:", error);
     }
-    
-    // In a real app, you would also make an API call to update the starred status on the server
   };
 
-  // Filter and sort invoices
+  // Filter invoices by search term and industry
   const filteredInvoices = invoices
     .filter(invoice => {
       // Apply search filter
@@ -117,36 +91,10 @@ export default function MarketplacePage() {
       }
       return true;
     })
-    .filter(invoice => {
-      // Apply risk filter
-      if (riskFilter === "all") return true;
-      return invoice.risk_tier === riskFilter;
-    })
     .filter(invoice => {
       // Apply industry filter
       if (industryFilter === "all") return true;
       return invoice.industry.toLowerCase() === industryFilter.toLowerCase();
-    })
-    .sort((a, b) => {
-      // Apply sorting
-      switch (sortBy) {
-        case "amount_asc":
-          return a.amount - b.amount;
-        case "amount_desc":
-          return b.amount - a.amount;
-        case "return_asc":
-          return a.return_rate - b.return_rate;
-        case "return_desc":
-          return b.return_rate - a.return_rate;
-        case "maturity_asc":
-          return a.days_to_maturity - b.days_to_maturity;
-        case "maturity_desc":
-          return b.days_to_maturity - a.days_to_maturity;
-        case "trust_desc":
-          return b.trust_score - a.trust_score;
-        default:
-          return 0;
-      }
     });
 
   // Get unique industries for filter
@@ -325,7 +273,7 @@ export default function MarketplacePage() {
         </CardContent>
         <CardFooter className="border-t px-6 py-3">
           <div className="text-xs text-muted-foreground">
-            Showing {filteredInvoices.length} of {invoices.length} invoices
+            Showing {filteredInvoices.length} of {total} invoices
           </div>
         </CardFooter>
       </Card>
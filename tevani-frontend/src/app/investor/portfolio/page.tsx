@@ -21,38 +21,7 @@ import { Label } from "../../../components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "../../../components/ui/select";
 import { Separator } from "../../../components/ui/separator";
 import { formatCurrency, formatDate } from "../../../lib/utils";
-
-// Mock data for portfolio investments
-const mockInvestments = [
-  {
-    id: "inv-001",
-    invoice_number: "INV-2025-001",
-    amount: 25000,
-    investment_date: "2025-10-05",
-    due_date: "2025-11-05",
-    company_name: "Tech Solutions Ltd",
-    industry: "Technology",
-    risk_tier: "A",
-    return_rate: 12.5,
-    days_to_maturity: 25,
-    status: "active",
-    expected_return: 25000 * 0.125 * (30 / 365),
-  },
-  {
-    id: "inv-003",
-    invoice_number: "INV-2025-003",
-    amount: 40000,
-    investment_date: "2025-10-01",
-    due_date: "2025-10-31",
-    company_name: "Green Energy Co",
-    industry: "Renewable Energy",
-    risk_tier: "B",
-    return_rate: 14.2,
-    days_to_maturity: 20,
-    status: "active",
-    expected_return: 40000 * 0.142 * (30 / 365),
-  },
-];
+import { investmentAPI } from "../../../lib/api";
 
 export default function PortfolioPage() {
   const { user } = useAuth();
@@ -63,12 +32,26 @@ export default function PortfolioPage() {
   const [sortBy, setSortBy] = useState<string>("date_desc");
 
   useEffect(() => {
-    // In a real app, this would fetch investments from the API
-    // For now, we'll use the mock data
-    setTimeout(() => {
-      setInvestments(mockInvestments);
-      setLoading(false);
-    }, 1000);
+    const fetchInvestments = async () => {
+      try {
+        setLoading(true);
+        const data = await investmentAPI.getInvestments();
+        
+        setInvestments(data.map((investment: any) => ({
+          ...investment,
+          company_name: investment.company_name || "Unknown Company",
+          industry: investment.industry || "Miscellaneous",
+          // Still pending investments have no return yet
+          expected_return: investment.expected_return || 0
+        })));
+      } catch (error) {
+        console.error("Failed to fetch investments:", error);
+      } finally {
+        setLoading(false);
+      }
+    };
+    
+    fetchInvestments();
   }, []);
 
   // Calculate portfolio stats
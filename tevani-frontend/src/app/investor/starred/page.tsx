@@ -26,42 +26,17 @@ export default function StarredInvoicesPage() {
   const [sortBy, setSortBy] = useState<string>("return_desc");
 
   useEffect(() => {
-    // Fetch invoices from the API and filter starred ones
+    // Fetch the investor's starred invoices
     const fetchStarredInvoices = async () => {
       try {
         setLoading(true);
-        // Get all validated invoices
-        const data = await invoiceAPI.getInvoices({ status: "validated" });
+        const data = await invoiceAPI.getStarredInvoices();
         
-        // Get starred invoice IDs from localStorage
-        const starredInvoiceIds = JSON.parse(localStorage.getItem('starredInvoices') || '[]');
-        
-        // Filter to only include starred invoices
-        const starredInvoices = data
-          .filter((invoice: any) => starredInvoiceIds.includes(invoice.id))
-          .map((invoice: any) => {
-            // Calculate days to maturity
-            const dueDate = new Date(invoice.due_date);
-            const today = new Date();
-            const daysToMaturity = Math.max(0, Math.ceil((dueDate.getTime() - today.getTime()) / (1000 * 60 * 60 * 24)));
-            
-            // Calculate return rate based on risk tier
-            let returnRate = 12.0; // Base rate
-            if (invoice.risk_tier === 'B') returnRate = 14.0;
-            if (invoice.risk_tier === 'C') returnRate = 15.5;
-            if (invoice.risk_tier === 'D') returnRate = 17.0;
-            
-            return {
-              ...invoice,
-              company_name: invoice.seller_name || "Unknown Company",
-              industry: invoice.industry || "Miscellaneous",
-              days_to_maturity: daysToMaturity,
-              return_rate: returnRate,
-              starred: true
-            };
-          });
-        
-        setInvoices(starredInvoices);
+        setInvoices(data.map((invoice: any) => ({
+          ...invoice,
+          company_name: invoice.seller_name || "Unknown Company",
+          industry: invoice.industry || "Miscellaneous"
+        })));
       } catch (error) {
         console.error("Failed to fetch starred invoices:", error);
       } finally {
@@ -73,16 +48,13 @@ export default function StarredInvoicesPage() {
   }, []);
 
   // Remove from starred
-  const removeFromStarred = (id: string) => {
-    // Update local state
-    setInvoices(invoices.filter(invoice => invoice.id !== id));
-    
-    // Update localStorage
-    const starredInvoices = JSON.parse(localStorage.getItem('starredInvoices') || '[]');
-    const updatedStarred = starredInvoices.filter((invoiceId: string) => invoiceId !== id);
-    localStorage.setItem('starredInvoices', JSON.stringify(updatedStarred));
-    
-    // In a real app, you would also make an API call to update the starred status on the server
+  const removeFromStarred = async (id: string) => {
+    try {
+      await invoiceAPI.unstarInvoice(id);
+      setInvoices(invoices.filter(invoice => invoice.id !== id));
+    } catch (error) {
+      console.error("Failed to remove starred invoice:", error);
+    }
   };
 
   // Filter and sort invoices
@@ -4,7 +4,7 @@ import { useState, useEffect } from 'react';
 import { Clock, CheckCircle, AlertCircle, HelpCircle, RefreshCw } from 'lucide-react';
 import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle } from '../ui/card';
 import { Button } from '../ui/button';
-import { legalbotAPI } from '../../lib/api';
+import { eventsAPI, legalbotAPI } from '../../lib/api';
 
 interface ConsentStatusProps {
   invoiceId: string;
@@ -36,6 +36,16 @@ export function ConsentStatus({ invoiceId, onRefresh }: ConsentStatusProps) {
     }
   }, [invoiceId]);
 
+  // Refresh when the server reports a consent decision instead of polling
+  useEffect(() => {
+    if (!invoiceId) return;
+    return eventsAPI.subscribe((event) => {
+      if (event.type === 'consent_status_changed') {
+        fetchConsentData();
+      }
+    }, invoiceId);
+  }, [invoiceId]);
+
   const handleRefresh = () => {
     fetchConsentData();
     if (onRefresh) onRefresh();
@@ -168,6 +168,11 @@ export const invoiceAPI = {
   deleteInvoice: async (id: string) => {
    const response = await api.delete(`/invoices/${id}`);
    return response.data;
+ },
+  // Investor marketplace: validated invoices open for funding, filtered and sorted on the server
+ getMarketplaceInvoices: async (params?: any) => {
+   const response = await api.get('/invoices/marketplace', { params });
+   return response.data;
  },
   // Starred invoices
  getStarredInvoices: async () => {
@@ -185,6 +190,26 @@ export const invoiceAPI = {
 };
 
 
+// Investment API
+export const investmentAPI = {
+ // Reusing an idempotency key returns the investment it first made instead of investing again
+ createInvestment: async (data: { invoice_id: string; amount: number; allow_partial?: boolean }, idempotencyKey: string) => {
+   const response = await api.post('/investments', data, {
+     headers: { 'Idempotency-Key': idempotencyKey },
+   });
+   return response.data;
+ },
+  getInvestments: async () => {
+   const response = await api.get('/investments');
+   return response.data;
+ },
+  getInvestment: async (id: string) => {
+   const response = await api.get(`/investments/${id}`);
+   return response.data;
+ },
+};
+
+
 // Return Rate API
 export const returnRateAPI = {
  getReturnRates: async () => {
@@ -266,6 +291,56 @@ export const legalbotAPI = {
 };
 
 
+// Event stream API (server-sent events)
+const STREAM_REOPEN_DELAY_MS = 3000;
+const STREAM_EVENT_TYPES = ['invoice_created', 'invoice_status_changed', 'invoice_updated', 'consent_status_changed'];
+
+
+export const eventsAPI = {
+ // Subscribe to invoice and consent status updates; returns a function that closes the stream
+ subscribe: (onEvent: (event: any) => void, invoiceId?: string) => {
+   let source: EventSource | null = null;
+   let retry: ReturnType<typeof setTimeout> | undefined;
+   let closed = false;
+
+   // EventSource cannot set an Authorization header, so each connection opens
+   // with a short-lived stream ticket in the query string instead of the session token
+   const open = async () => {
+     try {
+       const response = await api.post('/events/ticket');
+       if (closed) return;
+       const params = new URLSearchParams({ ticket: response.data.ticket });
+       if (invoiceId) params.append('invoice_id', invoiceId);
+
+       source = new EventSource(`/api/events/stream?${params.toString()}`);
+       const handleMessage = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+       STREAM_EVENT_TYPES.forEach((type) => source!.addEventListener(type, handleMessage as EventListener));
+       source.onerror = () => {
+         // The browser reconnects with the same URL; once the ticket has expired
+         // that is refused and the stream closes, so reopen with a fresh ticket
+         if (source && source.readyState === EventSource.CLOSED) reopen();
+       };
+     } catch (error) {
+       reopen();
+     }
+   };
+
+   const reopen = () => {
+     source?.close();
+     source = null;
+     if (!closed) retry = setTimeout(open, STREAM_REOPEN_DELAY_MS);
+   };
+
+   open();
+   return () => {
+     closed = true;
+     clearTimeout(retry);
+     source?.close();
+   };
+ },
+};
+
+
 // Admin API
 export const adminAPI = {
  // Dashboard